@@ -0,0 +1,129 @@
+"""Measure CPU against bytes saved for the gzip levels of CompressionMiddleware.
+
+Runs offline, no database or Redis needed:
+
+    python -m benchmarks.compression_benchmark --levels 1 3 5 6 9
+
+Event list payloads (with embedded RSVPs) of several sizes are compressed at
+each level, as one body and as a stream of sync flushed chunks like the NDJSON
+exports. The last section serves a tiny response through a small app with and
+without the middleware to check that skipped responses keep their latency.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import zlib
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.serialization_benchmark import build
+from src.compression import CompressionMiddleware
+from src.events.service import PROJECTABLE_FIELDS
+from src.responses import dumps
+
+
+def payload(size: int, rsvps_per_event: int) -> bytes:
+    _, rows, rsvp_rows = build(size, rsvps_per_event)
+    items = []
+    for row in rows:
+        item = {name: getattr(row, name) for name in PROJECTABLE_FIELDS}
+        item["rsvps"] = rsvp_rows[row.uid]
+        items.append(item)
+    return dumps({"items": items, "next_cursor": None})
+
+
+def compress(body: bytes, level: int, chunk: int = 0) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    if not chunk:
+        return compressor.compress(body) + compressor.flush()
+    parts = [
+        compressor.compress(body[start : start + chunk])
+        + compressor.flush(zlib.Z_SYNC_FLUSH)
+        for start in range(0, len(body), chunk)
+    ]
+    return b"".join(parts) + compressor.flush()
+
+
+def measure(body: bytes, level: int, chunk: int, repeats: int) -> dict:
+    started = time.process_time()
+    for _ in range(repeats):
+        compressed = compress(body, level, chunk)
+    cpu = (time.process_time() - started) / repeats
+    return {
+        "bytes": len(compressed),
+        "ratio": round(len(body) / len(compressed), 2),
+        "cpu_ms": round(cpu * 1000, 3),
+        "mb_per_cpu_s": round(len(body) / cpu / 1e6, 1) if cpu else None,
+    }
+
+
+async def tiny_latency(requests: int) -> dict:
+    # p50/p99 of a response below the threshold, with and without the middleware
+    async def small():
+        return {"ok": True}
+
+    plain = FastAPI()
+    plain.get("/")(small)
+    wrapped = FastAPI()
+    wrapped.get("/")(small)
+    wrapped.add_middleware(CompressionMiddleware)
+
+    report = {}
+    for name, app in (("without", plain), ("with", wrapped)):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            latencies = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+                latencies.append(time.perf_counter() - started)
+            assert "content-encoding" not in response.headers
+        latencies.sort()
+        report[name] = {
+            "p50_us": round(statistics.median(latencies) * 1e6, 1),
+            "p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+        }
+    return report
+
+
+def main(args) -> None:
+    report = {"payloads": {}}
+    for size in args.sizes:
+        body = payload(size, args.rsvps_per_event)
+        repeats = max(3, args.bytes_budget // len(body))
+        report["payloads"][size] = {
+            "events": size,
+            "identity_bytes": len(body),
+            "levels": {
+                level: {
+                    "whole": measure(body, level, 0, repeats),
+                    "streamed": measure(body, level, args.chunk, repeats),
+                }
+                for level in args.levels
+            },
+        }
+    report["tiny_response"] = asyncio.run(tiny_latency(args.requests))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 3, 5, 6, 9])
+    parser.add_argument("--rsvps-per-event", type=int, default=3)
+    parser.add_argument(
+        "--chunk", type=int, default=64 * 1024, help="bytes per streamed chunk"
+    )
+    parser.add_argument(
+        "--bytes-budget",
+        type=int,
+        default=20_000_000,
+        help="bytes compressed per payload size and level",
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    main(parser.parse_args())
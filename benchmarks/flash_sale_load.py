@@ -0,0 +1,112 @@
+"""Compare RSVP throughput of the Postgres path and the flash sale mode.
+
+Point DATABASE_URL and REDIS_URL at throwaway instances migrated to head:
+
+    python -m benchmarks.flash_sale_load --users 20000 --capacity 10000
+
+Runs the same burst of RSVP attempts (every user twice) against two fresh
+events: one served by RSVPService.rsvp_event, one switched to flash sale mode
+and served by the Redis claim. The flash sale event is then disabled, which
+drains the write-behind queue, and checked like the Postgres one. Exits
+non-zero if either event ends up overbooked or with a drifting rsvp_count.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import time
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.rsvp_concurrency import seed, verify, cleanup
+from src.db.main import async_engine
+from src.rsvp.flash_sale import flash_sale
+from src.rsvp.service import RSVPService
+
+rsvp_service = RSVPService()
+
+
+async def postgres_attempt(event_uid, user_uid) -> None:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        await rsvp_service.rsvp_event(event_uid, user_uid, session)
+
+
+async def flash_attempt(event_uid, user_uid) -> None:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        await rsvp_service.reserve(event_uid, user_uid, session)
+
+
+async def burst(attempt, event_uid, user_uids, concurrency: int) -> dict:
+    gate = asyncio.Semaphore(concurrency)
+    outcomes = collections.Counter()
+
+    async def one(user_uid):
+        async with gate:
+            try:
+                await attempt(event_uid, user_uid)
+                outcomes["reserved"] += 1
+            except ValueError as error:
+                outcomes["full" if "full" in str(error) else "duplicate"] += 1
+
+    attempts = [uid for uid in user_uids for _ in range(2)]
+    started = time.perf_counter()
+    await asyncio.gather(*(one(uid) for uid in attempts))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "attempts": len(attempts),
+        "elapsed_s": round(elapsed, 3),
+        "attempts_per_s": round(len(attempts) / elapsed, 1),
+        "rsvps_per_s": round(outcomes["reserved"] / elapsed, 1),
+        "outcomes": dict(outcomes),
+    }
+
+
+async def main(args) -> int:
+    report = {}
+    ok = True
+
+    event_uid, user_uids = await seed(args.users, args.capacity)
+    report["postgres"] = await burst(
+        postgres_attempt, event_uid, user_uids, args.concurrency
+    )
+    report["postgres"]["state"] = await verify(event_uid, args.capacity)
+    if not args.keep:
+        await cleanup(event_uid, user_uids)
+
+    event_uid, user_uids = await seed(args.users, args.capacity)
+    async with AsyncSession(async_engine) as session:
+        await flash_sale.enable(event_uid, session)
+    report["flash_sale"] = await burst(
+        flash_attempt, event_uid, user_uids, args.concurrency
+    )
+    started = time.perf_counter()
+    async with AsyncSession(async_engine) as session:
+        await flash_sale.disable(event_uid, session)
+    report["flash_sale"]["drain_s"] = round(time.perf_counter() - started, 3)
+    report["flash_sale"]["state"] = await verify(event_uid, args.capacity)
+    if not args.keep:
+        await cleanup(event_uid, user_uids)
+
+    print(json.dumps(report, indent=2))
+    await async_engine.dispose()
+
+    for mode in report.values():
+        state = mode["state"]
+        ok = ok and (
+            state["rows"] == state["rsvp_count"] == mode["outcomes"].get("reserved", 0)
+            and state["rows"] <= args.capacity
+            and state["double_booked_users"] == 0
+        )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--capacity", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=15)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,113 @@
+"""Throughput and memory of the streaming bulk event import.
+
+Point DATABASE_URL at a throwaway database migrated to head, then run:
+
+    python -m benchmarks.import_benchmark --rows 100000 --batch-size 1000
+
+Synthetic NDJSON is generated on the fly in small chunks, the way an upload
+arrives, and goes through the same reader and EventService.import_events used
+by POST /events/import. Peak RSS is reported so runs with different row counts
+show whether memory stays flat. Imported rows are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import time
+import uuid
+
+from sqlalchemy import delete, insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.main import async_engine
+from src.db.models import Event, User
+from src.events.service import EventService
+from src.events.utils import iter_ndjson_records
+
+CHUNK_SIZE = 64 * 1024
+BENCH_CREATOR = "import-benchmark"
+
+
+async def generate_upload(rows: int, invalid_every: int):
+    buffer = []
+    size = 0
+    for i in range(1, rows + 1):
+        record = {
+            "title": f"Imported event {i}",
+            "creator": BENCH_CREATOR,
+            "description": "Synthetic event created by the import benchmark",
+            "location": f"City {i % 300}",
+            "category": "bench",
+            "capacity": 50 + i % 200,
+        }
+        if invalid_every and i % invalid_every == 0:
+            record["capacity"] = "lots"
+        line = json.dumps(record).encode() + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+async def main(args) -> None:
+    user_uid = uuid.uuid4()
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            insert(User).values(
+                uid=user_uid,
+                username="import_bench",
+                email=f"{user_uid.hex}@bench.local",
+                password_hash="-",
+                first_name="Import",
+                last_name="Bench",
+                is_verified=False,
+            )
+        )
+        await session.commit()
+
+    started = time.perf_counter()
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        report = await EventService().import_events(
+            iter_ndjson_records(generate_upload(args.rows, args.invalid_every)),
+            str(user_uid),
+            session,
+            batch_size=args.batch_size,
+        )
+    elapsed = time.perf_counter() - started
+
+    print(
+        json.dumps(
+            {
+                "rows": args.rows,
+                "batch_size": args.batch_size,
+                "inserted": report["inserted"],
+                "failed": report["failed"],
+                "elapsed_s": round(elapsed, 3),
+                "rows_per_s": round(args.rows / elapsed, 1),
+                "peak_rss_mb": round(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+                ),
+            },
+            indent=2,
+        )
+    )
+
+    async with AsyncSession(async_engine) as session:
+        await session.exec(delete(Event).where(Event.user_uid == user_uid))
+        await session.exec(delete(User).where(User.uid == user_uid))
+        await session.commit()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--invalid-every", type=int, default=0, help="make every Nth row invalid"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,417 @@
+"""End-to-end load run of the API routes, in process and without a network.
+
+Point DATABASE_URL at a throwaway database migrated to head and REDIS_URL at a
+local Redis (or pass --fake-redis to use the optional fakeredis package), then:
+
+    python -m benchmarks.load_suite --users 2000 --events 5000 --output run.json
+
+The real src.app is driven over ASGI with httpx, so routing, middleware,
+dependencies, caching and the database all take part; only the socket is left
+out. Synthetic users, events and RSVPs are seeded with a run tag and removed
+afterwards. Each scenario fires --requests operations at --concurrency and the
+report gives throughput and p50/p95/p99 latency per endpoint as JSON, so runs
+can be diffed across commits. Postgres is required, the schema uses its types.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import random
+import sys
+import time
+import uuid
+
+import httpx
+from sqlalchemy import text
+
+from src import app, version
+from src.auth.utils import generate_password_hash
+from src.db.main import async_engine
+from src.db.redis import ManagedRedis, redis_manager
+
+PASSWORD = "loadpass1"
+PREFIX = f"/api/{version}"
+SCENARIOS = ["login", "browse", "search", "filter", "rsvp_rush", "logout"]
+
+WORDS = (
+    "python music festival startup meetup jazz cloud design marathon workshop "
+    "database summit yoga wine hackathon poetry robotics comedy film gardening"
+).split()
+
+SEED_USERS_SQL = text("""
+    INSERT INTO users (uid, username, email, password_hash, first_name, last_name,
+                       role, is_verified, created_at, updated_at)
+    SELECT gen_random_uuid(), 'load' || i, :tag || '_' || i || '@bench.local',
+           :hash, 'Load', 'User', 'user', true, now(), now()
+    FROM generate_series(1, CAST(:users AS int)) AS i
+    """)
+
+SEED_EVENTS_SQL = text("""
+    INSERT INTO events (uid, title, creator, description, location, category,
+                        capacity, starts_at, ends_at, created_at, updated_at)
+    SELECT gen_random_uuid(),
+           initcap(w[1 + (i * 7) % 20] || ' ' || w[1 + (i * 13) % 20] || ' ' || i),
+           :tag,
+           'A ' || w[1 + (i * 3) % 20] || ' event about ' || w[1 + (i * 11) % 20],
+           'City ' || (i % 50),
+           w[1 + i % 20],
+           CAST(:capacity AS int),
+           now() + make_interval(mins => i * 10 - 600),
+           now() + make_interval(mins => i * 10 - 480),
+           now() - make_interval(secs => i),
+           now()
+    FROM generate_series(1, CAST(:events AS int)) AS i,
+         (SELECT CAST(:words AS text[]) AS w) AS words
+    """)
+
+# Every event gets the same number of attendees, drawn round robin from the users
+SEED_RSVPS_SQL = text("""
+    WITH e AS (
+        SELECT uid, row_number() OVER (ORDER BY uid) AS n
+        FROM events WHERE creator = :tag
+    ), u AS (
+        SELECT uid, row_number() OVER (ORDER BY uid) - 1 AS n, count(*) OVER () AS total
+        FROM users WHERE email LIKE :tag || '\\_%'
+    )
+    INSERT INTO rsvps (uid, event_uid, user_uid, rsvp_date)
+    SELECT gen_random_uuid(), e.uid, u.uid, now()
+    FROM e, generate_series(0, CAST(:per_event AS int) - 1) AS k, u
+    WHERE u.n = (e.n + k) % u.total
+    ON CONFLICT DO NOTHING
+    """)
+
+SYNC_COUNTS_SQL = text("""
+    UPDATE events SET rsvp_count = counted.n
+    FROM (SELECT event_uid, count(*) AS n FROM rsvps GROUP BY event_uid) AS counted
+    WHERE events.uid = counted.event_uid AND events.creator = :tag
+    """)
+
+CLEANUP_SQL = [
+    "DELETE FROM waitlist_entries WHERE event_uid IN "
+    "(SELECT uid FROM events WHERE creator = :tag)",
+    "DELETE FROM rsvps WHERE event_uid IN (SELECT uid FROM events WHERE creator = :tag)"
+    " OR user_uid IN (SELECT uid FROM users WHERE email LIKE :tag || '\\_%')",
+    "DELETE FROM events WHERE creator = :tag",
+    "DELETE FROM users WHERE email LIKE :tag || '\\_%'",
+]
+
+
+async def seed(tag: str, args) -> dict:
+    started = time.perf_counter()
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            SEED_USERS_SQL,
+            {"tag": tag, "users": args.users, "hash": generate_password_hash(PASSWORD)},
+        )
+        await conn.execute(
+            SEED_EVENTS_SQL,
+            {"tag": tag, "events": args.events, "capacity": 10**6, "words": WORDS},
+        )
+        if args.rsvps_per_event:
+            await conn.execute(
+                SEED_RSVPS_SQL, {"tag": tag, "per_event": args.rsvps_per_event}
+            )
+            await conn.execute(SYNC_COUNTS_SQL, {"tag": tag})
+
+        # The RSVP rush targets one small event everybody wants
+        result = await conn.execute(
+            text(
+                "INSERT INTO events (uid, title, creator, description, location,"
+                " category, capacity, created_at, updated_at)"
+                " VALUES (gen_random_uuid(), 'Headline show', :tag, 'Sold out soon',"
+                " 'City 0', 'music', :capacity, now(), now()) RETURNING uid"
+            ),
+            {"tag": tag, "capacity": args.hot_capacity},
+        )
+        hot_event = result.scalar_one()
+
+        result = await conn.execute(
+            text("SELECT uid FROM events WHERE creator = :tag"), {"tag": tag}
+        )
+        event_uids = [str(uid) for uid in result.scalars()]
+        await conn.execute(text("ANALYZE users, events, rsvps"))
+
+    return {
+        "hot_event": str(hot_event),
+        "event_uids": event_uids,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+async def cleanup(tag: str) -> None:
+    async with async_engine.begin() as conn:
+        for statement in CLEANUP_SQL:
+            await conn.execute(text(statement), {"tag": tag})
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+    # Latencies and status codes per named endpoint
+    def __init__(self) -> None:
+        self.latencies = collections.defaultdict(list)
+        self.statuses = collections.defaultdict(collections.Counter)
+        self.elapsed = collections.defaultdict(float)
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method, url, **kw):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kw)
+            status = response.status_code
+        except Exception as error:
+            # An exception escaping the app counts as a failed request
+            response, status = None, type(error).__name__
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        self.statuses[endpoint][status] += 1
+        return response
+
+    def report(self) -> dict:
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            statuses = self.statuses[endpoint]
+            errors = sum(
+                count
+                for status, count in statuses.items()
+                if not isinstance(status, int) or status >= 500
+            )
+            elapsed = self.elapsed[endpoint] or sum(ordered)
+            endpoints[endpoint] = {
+                "requests": len(ordered),
+                "errors": errors,
+                "statuses": {str(status): n for status, n in statuses.items()},
+                "rps": round(len(ordered) / elapsed, 1) if elapsed else None,
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return endpoints
+
+
+class LoadSuite:
+    def __init__(self, client: httpx.AsyncClient, seeded: dict, args) -> None:
+        self.client = client
+        self.args = args
+        self.hot_event = seeded["hot_event"]
+        self.event_uids = seeded["event_uids"]
+        self.recorder = Recorder()
+        self.tokens = []
+        self.random = random.Random(args.seed)
+
+    def headers(self, index: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[index % len(self.tokens)]}"}
+
+    async def login(self, index: int) -> None:
+        user = index % self.args.users + 1
+        response = await self.recorder.call(
+            self.client,
+            "POST /auth/login",
+            "POST",
+            f"{PREFIX}/auth/login",
+            json={"email": f"{self.args.tag}_{user}@bench.local", "password": PASSWORD},
+        )
+        if response is not None and response.status_code == 200:
+            self.tokens.append(response.json()["access_token"])
+
+    async def browse(self, index: int) -> None:
+        # First page, one page further, then open one of the listed events
+        headers = self.headers(index)
+        response = await self.recorder.call(
+            self.client,
+            "GET /events/",
+            "GET",
+            f"{PREFIX}/events/",
+            params={"limit": 20},
+            headers=headers,
+        )
+        if response is None or response.status_code != 200:
+            return
+        page = response.json()
+        if page.get("next_cursor"):
+            await self.recorder.call(
+                self.client,
+                "GET /events/ (next page)",
+                "GET",
+                f"{PREFIX}/events/",
+                params={"limit": 20, "cursor": page["next_cursor"]},
+                headers=headers,
+            )
+        await self.recorder.call(
+            self.client,
+            "GET /events/{event_uid}",
+            "GET",
+            f"{PREFIX}/events/{self.random.choice(self.event_uids)}",
+            headers=headers,
+        )
+
+    async def search(self, index: int) -> None:
+        query = " ".join(self.random.sample(WORDS, self.random.choice((1, 2))))
+        await self.recorder.call(
+            self.client,
+            "GET /events/search/",
+            "GET",
+            f"{PREFIX}/events/search/",
+            params={"query": query, "size": 20},
+            headers=self.headers(index),
+        )
+
+    async def filter(self, index: int) -> None:
+        await self.recorder.call(
+            self.client,
+            "GET /events/filter/",
+            "GET",
+            f"{PREFIX}/events/filter/",
+            params={
+                "when": self.random.choice(("upcoming", "now")),
+                "location": f"City {self.random.randrange(50)}",
+                "category": self.random.choice(WORDS),
+            },
+            headers=self.headers(index),
+        )
+
+    async def rsvp_rush(self, index: int) -> None:
+        # Every token tries once, the overflow lands on the waitlist
+        await self.recorder.call(
+            self.client,
+            "POST /rsvp/{event_uid}",
+            "POST",
+            f"{PREFIX}/rsvp/{self.hot_event}",
+            headers=self.headers(index),
+        )
+
+    async def logout(self, index: int) -> None:
+        await self.recorder.call(
+            self.client,
+            "GET /auth/logout",
+            "GET",
+            f"{PREFIX}/auth/logout",
+            headers=self.headers(index),
+        )
+
+    def operations(self, scenario: str) -> int:
+        # Token bound scenarios use every token exactly once
+        if scenario in ("rsvp_rush", "logout"):
+            return len(self.tokens)
+        if scenario == "login":
+            return min(self.args.requests, self.args.users)
+        return self.args.requests
+
+    async def run(self, scenario: str) -> dict:
+        if scenario != "login" and not self.tokens:
+            raise RuntimeError(f"{scenario} needs tokens, run the login scenario first")
+
+        operation = getattr(self, scenario)
+        total = self.operations(scenario)
+        gate = asyncio.Semaphore(self.args.concurrency)
+        before = {name: len(lats) for name, lats in self.recorder.latencies.items()}
+
+        async def one(index: int) -> None:
+            async with gate:
+                await operation(index)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(total)))
+        elapsed = time.perf_counter() - started
+
+        # Wall clock throughput for the endpoints this scenario touched
+        for name, latencies in self.recorder.latencies.items():
+            if len(latencies) != before.get(name, 0):
+                self.recorder.elapsed[name] += elapsed
+        return {
+            "operations": total,
+            "seconds": round(elapsed, 3),
+            "ops_per_s": round(total / elapsed, 1) if elapsed else None,
+        }
+
+
+def use_fake_redis() -> None:
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("--fake-redis needs the fakeredis package: pip install fakeredis[lua]")
+    # Borrow its in-memory pool so commands still pass through the breaker
+    fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_manager._client = ManagedRedis(
+        redis_manager, connection_pool=fake.connection_pool
+    )
+
+
+async def main(args) -> int:
+    if args.fake_redis:
+        use_fake_redis()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    # Everything after the login needs its tokens
+    if "login" not in args.scenarios:
+        args.scenarios.insert(0, "login")
+
+    seeded = await seed(args.tag, args)
+    scenarios = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        # Runs the lifespan too, so the background tasks are part of the load
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://localhost", timeout=60
+            ) as client:
+                suite = LoadSuite(client, seeded, args)
+                for scenario in SCENARIOS:
+                    if scenario in args.scenarios:
+                        scenarios[scenario] = await suite.run(scenario)
+    finally:
+        if not args.keep:
+            await cleanup(args.tag)
+        await async_engine.dispose()
+
+    report = {
+        "config": {
+            "users": args.users,
+            "events": args.events,
+            "rsvps_per_event": args.rsvps_per_event,
+            "hot_capacity": args.hot_capacity,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "fake_redis": args.fake_redis,
+            "seed_seconds": seeded["seconds"],
+        },
+        "scenarios": scenarios,
+        "endpoints": suite.recorder.report(),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+
+    failed = sum(stats["errors"] for stats in report["endpoints"].values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--rsvps-per-event", type=int, default=5)
+    parser.add_argument("--hot-capacity", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="operations per scenario"
+    )
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    parser.add_argument(
+        "--fake-redis", action="store_true", help="use fakeredis instead of REDIS_URL"
+    )
+    parser.add_argument(
+        "--tag", default=f"load{uuid.uuid4().hex[:8]}", help="marks the seeded rows"
+    )
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,93 @@
+"""Measure how a login storm affects unrelated requests on the same worker.
+
+    python -m benchmarks.login_storm --logins 200 --rounds 12
+
+A probe coroutine stands in for a cheap unrelated endpoint: it repeatedly
+sleeps for a few milliseconds and records how late it wakes up. The storm runs
+bcrypt verification either inline on the event loop (the old behaviour) or on
+the bounded password hashing pool, and the probe latency percentiles of both
+runs are printed as JSON. Logins rejected by admission control are counted as
+503s.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+from src.auth.utils import PasswordHasher, PasswordHasherBusy
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe(stop: asyncio.Event, latencies: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        latencies.append((time.perf_counter() - started - PROBE_INTERVAL) * 1000)
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 2)
+
+
+async def storm(mode: str, args, context: CryptContext, stored_hash: str) -> dict:
+    hasher = PasswordHasher("thread", args.workers, args.queue_size)
+    rejected = 0
+
+    async def login() -> None:
+        nonlocal rejected
+        if mode == "inline":
+            context.verify("secret-password", stored_hash)
+            await asyncio.sleep(0)
+            return
+        try:
+            await hasher.run(context.verify, "secret-password", stored_hash)
+        except PasswordHasherBusy:
+            rejected += 1
+
+    latencies = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, latencies))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    hasher.shutdown()
+
+    return {
+        "mode": mode,
+        "logins": args.logins,
+        "rejected_503": rejected,
+        "storm_s": round(elapsed, 3),
+        "probe_samples": len(latencies),
+        "probe_p50_ms": percentile(latencies, 0.50),
+        "probe_p99_ms": percentile(latencies, 0.99),
+        "probe_max_ms": round(max(latencies), 2),
+        "probe_mean_ms": round(statistics.fmean(latencies), 2),
+    }
+
+
+async def main(args) -> None:
+    context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=args.rounds)
+    stored_hash = context.hash("secret-password")
+
+    report = [
+        await storm("inline", args, context, stored_hash),
+        await storm("pool", args, context, stored_hash),
+    ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
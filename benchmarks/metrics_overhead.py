@@ -0,0 +1,95 @@
+"""Measure the cost of the metrics middleware on real endpoints.
+
+Point DATABASE_URL and REDIS_URL at throwaway instances migrated to head:
+
+    python -m benchmarks.metrics_overhead --requests 2000 --path /api/v1/events/?limit=10
+
+Drives src.app in process through the ASGI transport with a signed admin
+token. Requests run in alternating blocks with the metrics registry switched
+on and off, so drift in the database or the machine hits both sides equally.
+Prints latencies of both sides as JSON and exits non-zero when the median
+overhead is above --max-overhead percent.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+from src import app
+from src.auth.utils import create_access_token
+from src.db.main import async_engine
+from src.metrics import registry
+
+
+async def timed_requests(client: httpx.AsyncClient, path: str, count: int) -> list:
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = await client.get(path)
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return timings
+
+
+def summary(timings: list) -> dict:
+    ordered = sorted(timings)
+    return {
+        "requests": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95)], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+    }
+
+
+async def main(args) -> int:
+    token = create_access_token(
+        {"email": "bench@bench.local", "user_uid": uuid.uuid4(), "role": "admin"}
+    )
+    transport = httpx.ASGITransport(app=app)
+    timings = {True: [], False: []}
+
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://localhost",
+        headers={"Authorization": f"Bearer {token}"},
+    ) as client:
+        # Warm up caches, pools and prepared statements before measuring
+        await timed_requests(client, args.path, args.block)
+
+        for block in range(args.requests // args.block):
+            enabled = block % 2 == 0
+            registry.enabled = enabled
+            timings[enabled] += await timed_requests(client, args.path, args.block)
+
+    registry.enabled = True
+    await async_engine.dispose()
+
+    on, off = summary(timings[True]), summary(timings[False])
+    overhead = (on["p50_ms"] - off["p50_ms"]) / off["p50_ms"] * 100
+    print(
+        json.dumps(
+            {
+                "path": args.path,
+                "metrics_on": on,
+                "metrics_off": off,
+                "overhead_pct": round(overhead, 2),
+            },
+            indent=2,
+        )
+    )
+    return 0 if overhead <= args.max_overhead else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="/api/v1/events/?limit=10")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--block", type=int, default=50)
+    parser.add_argument("--max-overhead", type=float, default=2.0)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,136 @@
+"""Check that the SQL profiler flags N+1 selectin loads of the rsvps collections.
+
+Point DATABASE_URL at a throwaway database migrated to head, then run:
+
+    python -m benchmarks.n_plus_one_check --events 20
+
+Seeds events with a few RSVPs each and runs two request profiles. The first
+loads every event and user one by one, so each row pulls its own selectin load
+of the rsvps collection: both relationships must be flagged. The second loads
+them all with one query each, one selectin load per relationship: nothing
+may be flagged. Exits non-zero when either expectation fails.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+
+from sqlalchemy import delete, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.main import async_engine
+from src.db.models import RSVP, Event, User
+from src.db.profiler import RequestProfile, current_profile, profiler, query_observers
+
+
+async def seed(events: int, users: int):
+    event_uids = [uuid.uuid4() for _ in range(events)]
+    user_uids = [uuid.uuid4() for _ in range(users)]
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            insert(User),
+            params=[
+                {
+                    "uid": uid,
+                    "username": f"np1_{uid.hex[:10]}",
+                    "email": f"{uid.hex}@np1.local",
+                    "password_hash": "-",
+                    "first_name": "Bench",
+                    "last_name": "User",
+                    "is_verified": False,
+                }
+                for uid in user_uids
+            ],
+        )
+        await session.exec(
+            insert(Event),
+            params=[
+                {
+                    "uid": uid,
+                    "title": "N+1 check",
+                    "creator": "np1-check",
+                    "description": "-",
+                    "location": "-",
+                    "category": "bench",
+                    "capacity": users,
+                    "rsvp_count": users,
+                }
+                for uid in event_uids
+            ],
+        )
+        await session.exec(
+            insert(RSVP),
+            params=[
+                {"uid": uuid.uuid4(), "event_uid": event_uid, "user_uid": user_uid}
+                for event_uid in event_uids
+                for user_uid in user_uids
+            ],
+        )
+        await session.commit()
+    return event_uids, user_uids
+
+
+async def profiled(name: str, load) -> list:
+    profiler.n_plus_one.clear()
+    token = current_profile.set(RequestProfile(name, None))
+    try:
+        async with AsyncSession(async_engine) as session:
+            await load(session)
+    finally:
+        current_profile.reset(token)
+    return sorted(
+        {
+            entry["relationship"]
+            for entry in profiler.n_plus_one
+            if "relationship" in entry
+        }
+    )
+
+
+async def main(args) -> int:
+    # The profiler is off by default, the check needs it on
+    profiler.enabled = True
+    if profiler.after_query not in query_observers:
+        query_observers.append(profiler.after_query)
+
+    event_uids, user_uids = await seed(args.events, args.users)
+
+    async def one_by_one(session):
+        for uid in event_uids:
+            (await session.exec(select(Event).where(Event.uid == uid))).one()
+        for uid in user_uids:
+            (await session.exec(select(User).where(User.uid == uid))).one()
+
+    async def batched(session):
+        (await session.exec(select(Event).where(Event.uid.in_(event_uids)))).all()
+        (await session.exec(select(User).where(User.uid.in_(user_uids)))).all()
+
+    report = {
+        "threshold": profiler.n_plus_one_threshold,
+        "one_by_one": await profiled("one-by-one", one_by_one),
+        "batched": await profiled("batched", batched),
+    }
+    print(json.dumps(report, indent=2))
+
+    async with AsyncSession(async_engine) as session:
+        await session.exec(delete(RSVP).where(RSVP.event_uid.in_(event_uids)))
+        await session.exec(delete(Event).where(Event.uid.in_(event_uids)))
+        await session.exec(delete(User).where(User.uid.in_(user_uids)))
+        await session.commit()
+    await async_engine.dispose()
+
+    ok = (
+        report["one_by_one"] == ["Event.rsvps", "User.rsvps"]
+        and report["batched"] == []
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--users", type=int, default=10)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,215 @@
+"""Time the geohash nearby search against a full haversine scan.
+
+Point DATABASE_URL at a throwaway database migrated to head, then run:
+
+    python -m benchmarks.nearby_benchmark --seed --rows 1000000
+
+Seeded events are clustered around a few hundred city centres, like real
+venues, with the rest spread over the inhabited latitudes. For each radius the
+statement built by EventService.nearby_statement is run from random centres
+and timed. A few of those queries are repeated without the geohash cells,
+as a scan computing the distance of every event, and both must return the
+same events in the same order. The plan of one query per radius is checked
+for ix_events_geohash. Exits non-zero on a mismatch or a missing index.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from benchmarks.schedule_explain import plan_nodes
+from src.db.main import async_engine
+from src.db.models import Event
+from src.events.service import EventService, distance_km
+
+event_service = EventService()
+
+SEED_BATCH = 100_000
+CITIES = 300
+
+# City i sits at a fixed pseudo random point, 70% of the events are within
+# about 30km of one, the rest anywhere between 55S and 70N
+SEED_SQL = text("""
+    INSERT INTO events (uid, title, creator, description, location, category,
+                        capacity, latitude, longitude, created_at, updated_at)
+    SELECT gen_random_uuid(), 'Venue ' || i, 'geo-bench', '-',
+           'City ' || city, 'category' || (i % 40), 100,
+           CASE WHEN clustered
+                THEN greatest(-90, least(90, city_lat + (random() - 0.5) * 0.5))
+                ELSE -55 + random() * 125 END,
+           CASE WHEN clustered
+                THEN ((city_lon + (random() - 0.5) * 0.7 + 540)::numeric % 360 - 180)::float8
+                ELSE -180 + random() * 360 END,
+           now(), now()
+    FROM (
+        SELECT i, i % :cities AS city, random() < 0.7 AS clustered,
+               -40 + ((i % :cities) * 37 % 100) AS city_lat,
+               -170 + ((i % :cities) * 113 % 340) AS city_lon
+        FROM generate_series(CAST(:start AS int), CAST(:stop AS int)) AS i
+    ) AS seeds
+    """)
+
+
+def city_centre(city: int):
+    # Same formula as the seed, so clustered queries land where events are
+    return -40 + (city * 37 % 100), -170 + (city * 113 % 340)
+
+
+def centres(count: int, rng: random.Random) -> list:
+    points = []
+    for _ in range(count):
+        if rng.random() < 0.7:
+            lat, lon = city_centre(rng.randrange(CITIES))
+            points.append((lat + rng.uniform(-0.2, 0.2), lon + rng.uniform(-0.2, 0.2)))
+        else:
+            points.append((rng.uniform(-55, 70), rng.uniform(-180, 180)))
+    return points
+
+
+def full_scan_statement(
+    latitude: float, longitude: float, radius_km: float, limit: int
+):
+    distance = distance_km(latitude, longitude)
+    return (
+        select(Event.uid, distance.label("distance_km"))
+        .where(Event.latitude.is_not(None), distance <= radius_km)
+        .order_by(distance, Event.uid)
+        .limit(limit)
+    )
+
+
+async def seed(rows: int) -> None:
+    async with async_engine.begin() as conn:
+        await conn.execute(text("SELECT setseed(0.25)"))
+        for start in range(1, rows + 1, SEED_BATCH):
+            stop = min(start + SEED_BATCH - 1, rows)
+            await conn.execute(
+                SEED_SQL, {"start": start, "stop": stop, "cities": CITIES}
+            )
+            print(f"seeded {stop}/{rows}")
+        await conn.execute(text("ANALYZE events"))
+
+
+async def timed(conn, statement) -> tuple:
+    started = time.perf_counter()
+    result = await conn.execute(statement)
+    rows = result.all()
+    return time.perf_counter() - started, [row.uid for row in rows]
+
+
+async def explain(conn, statement) -> dict:
+    # Literal binds keep the statement self contained for EXPLAIN
+    sql = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+    plan = result.scalar_one()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def main(args) -> int:
+    if args.seed:
+        await seed(args.rows)
+
+    rng = random.Random(args.random_seed)
+    report, failed = {}, False
+    async with async_engine.connect() as conn:
+        total = (
+            await conn.execute(
+                text("SELECT count(*) FROM events WHERE geohash IS NOT NULL")
+            )
+        ).scalar_one()
+        report["events_with_coordinates"] = total
+
+        for radius in args.radii:
+            points = centres(args.queries, rng)
+            latencies, hits = [], []
+            for lat, lon in points:
+                statement = event_service.nearby_statement(
+                    [Event.uid], lat, lon, radius, args.limit
+                )
+                elapsed, uids = await timed(conn, statement)
+                latencies.append(elapsed)
+                hits.append(uids)
+
+            baseline, mismatches = [], 0
+            for (lat, lon), uids in list(zip(points, hits))[: args.baseline_queries]:
+                elapsed, expected = await timed(
+                    conn, full_scan_statement(lat, lon, radius, args.limit)
+                )
+                baseline.append(elapsed)
+                mismatches += expected != uids
+
+            lat, lon = points[0]
+            plan = await explain(
+                conn,
+                event_service.nearby_statement(
+                    [Event.uid], lat, lon, radius, args.limit
+                ),
+            )
+            nodes = list(plan_nodes(plan["Plan"]))
+            indexes = sorted(
+                {node["Index Name"] for node in nodes if "Index Name" in node}
+            )
+            ok = not mismatches and "ix_events_geohash" in indexes
+            failed = failed or not ok
+
+            p50 = statistics.median(latencies)
+            report[f"{radius:g}km"] = {
+                "ok": ok,
+                "queries": len(points),
+                "avg_hits": round(sum(map(len, hits)) / len(hits), 1),
+                "p50_ms": round(p50 * 1000, 2),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "full_scan_p50_ms": (
+                    round(statistics.median(baseline) * 1000, 2) if baseline else None
+                ),
+                "speedup": (
+                    round(statistics.median(baseline) / p50, 1) if baseline else None
+                ),
+                "mismatches": mismatches,
+                "indexes": indexes,
+            }
+
+    print(json.dumps(report, indent=2))
+
+    if args.cleanup:
+        async with async_engine.begin() as conn:
+            await conn.execute(text("DELETE FROM events WHERE creator = 'geo-bench'"))
+    await async_engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", action="store_true", help="insert the test events")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--radii", type=float, nargs="+", default=[1, 5, 25, 100], help="in km"
+    )
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200, help="per radius")
+    parser.add_argument(
+        "--baseline-queries",
+        type=int,
+        default=5,
+        help="queries per radius repeated as a full scan",
+    )
+    parser.add_argument("--random-seed", type=int, default=7)
+    parser.add_argument(
+        "--cleanup", action="store_true", help="delete the test events afterwards"
+    )
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,124 @@
+"""Payload size and latency of full event pages versus sparse projections.
+
+Point DATABASE_URL at a throwaway database migrated to head, then run:
+
+    python -m benchmarks.projection_benchmark --seed --events 10 --rsvps 5000
+
+Seeds a few popular events with many RSVPs each, then times one page of the
+listing built the old way (ORM entities with selectin-loaded RSVPs validated
+through the Event schema) against fields=title,location&include=rsvp_count.
+Seeded rows are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.main import async_engine
+from src.events.schemas import EventPage
+from src.events.service import EventService
+
+event_service = EventService()
+
+SEED_SQL = [
+    """
+    INSERT INTO users (uid, username, email, password_hash, first_name,
+                       last_name, is_verified)
+    SELECT gen_random_uuid(), 'proj_' || i, 'proj_' || i || '@' || :tag,
+           '-', 'Bench', 'User', false
+    FROM generate_series(1, :rsvps) AS i
+    """,
+    """
+    INSERT INTO events (uid, title, creator, description, location, category,
+                        capacity, rsvp_count, created_at, updated_at)
+    SELECT gen_random_uuid(), 'Popular event ' || i, :tag, 'Benchmark event',
+           'Main hall', 'bench', :rsvps, :rsvps,
+           now() + make_interval(secs => i), now()
+    FROM generate_series(1, :events) AS i
+    """,
+    """
+    INSERT INTO rsvps (uid, user_uid, event_uid, rsvp_date)
+    SELECT gen_random_uuid(), users.uid, events.uid, now()
+    FROM users CROSS JOIN events
+    WHERE users.email LIKE '%@' || :tag AND events.creator = :tag
+    """,
+]
+
+CLEANUP_SQL = [
+    "DELETE FROM rsvps WHERE event_uid IN (SELECT uid FROM events WHERE creator = :tag)",
+    "DELETE FROM events WHERE creator = :tag",
+    "DELETE FROM users WHERE email LIKE '%@' || :tag",
+]
+
+
+async def run_sql(statements: list, params: dict) -> None:
+    async with async_engine.begin() as conn:
+        for statement in statements:
+            await conn.execute(text(statement), params)
+
+
+async def full_page(size: int) -> bytes:
+    async with AsyncSession(async_engine) as session:
+        events, next_cursor = await event_service.get_events_page(session, None, size)
+        page = EventPage.model_validate(
+            {"items": events, "next_cursor": next_cursor}, from_attributes=True
+        )
+        return page.model_dump_json().encode()
+
+
+async def projected_page(size: int) -> bytes:
+    async with AsyncSession(async_engine) as session:
+        names, with_rsvps = event_service.parse_projection(
+            "title,location", "rsvp_count"
+        )
+        items, next_cursor = await event_service.get_events_projection(
+            session, names, with_rsvps, None, size
+        )
+        payload = jsonable_encoder({"items": items, "next_cursor": next_cursor})
+        return json.dumps(payload).encode()
+
+
+async def measure(build, size: int, runs: int) -> dict:
+    timings = []
+    body = b""
+    for _ in range(runs):
+        started = time.perf_counter()
+        body = await build(size)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "bytes": len(body),
+        "p50_ms": round(statistics.median(timings), 2),
+        "max_ms": round(timings[-1], 2),
+    }
+
+
+async def main(args) -> None:
+    tag = f"projection-{uuid.uuid4().hex[:8]}.bench"
+    await run_sql(SEED_SQL, {"tag": tag, "events": args.events, "rsvps": args.rsvps})
+    try:
+        report = {
+            "events": args.events,
+            "rsvps_per_event": args.rsvps,
+            "full": await measure(full_page, args.events, args.runs),
+            "projected": await measure(projected_page, args.events, args.runs),
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        await run_sql(CLEANUP_SQL, {"tag": tag})
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--rsvps", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,138 @@
+"""Fire many parallel RSVPs at a small-capacity event and check for overbooking.
+
+Point DATABASE_URL at a throwaway database migrated to head, then run:
+
+    python -m benchmarks.rsvp_concurrency --users 5000 --capacity 25
+
+Every user RSVPs twice to also exercise the duplicate path. The script exits
+non-zero if the event ends up with more RSVPs than seats, if the denormalized
+rsvp_count drifts from the real number of rows, or if a user got two seats.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import time
+import uuid
+
+from sqlalchemy import insert, delete, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.main import async_engine
+from src.db.models import User, Event, RSVP
+from src.rsvp.service import RSVPService
+
+rsvp_service = RSVPService()
+
+
+async def seed(users: int, capacity: int):
+    user_uids = [uuid.uuid4() for _ in range(users)]
+    event_uid = uuid.uuid4()
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            insert(User),
+            params=[
+                {
+                    "uid": uid,
+                    "username": f"bench_{uid.hex[:10]}",
+                    "email": f"{uid.hex}@bench.local",
+                    "password_hash": "-",
+                    "first_name": "Bench",
+                    "last_name": "User",
+                    "is_verified": False,
+                }
+                for uid in user_uids
+            ],
+        )
+        session.add(
+            Event(
+                uid=event_uid,
+                title="Concurrency bench",
+                creator="bench",
+                description="-",
+                location="-",
+                category="bench",
+                capacity=capacity,
+            )
+        )
+        await session.commit()
+    return event_uid, user_uids
+
+
+async def attempt(event_uid, user_uid, gate: asyncio.Semaphore, outcomes):
+    async with gate:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            try:
+                await rsvp_service.rsvp_event(str(event_uid), str(user_uid), session)
+                outcomes["reserved"] += 1
+            except ValueError as error:
+                key = "full" if "full" in str(error) else "duplicate"
+                outcomes[key] += 1
+
+
+async def verify(event_uid, capacity: int) -> dict:
+    async with AsyncSession(async_engine) as session:
+        rows = (
+            await session.exec(select(RSVP.user_uid).where(RSVP.event_uid == event_uid))
+        ).all()
+        event = (await session.exec(select(Event).where(Event.uid == event_uid))).one()
+        per_user = collections.Counter(rows)
+        return {
+            "rows": len(rows),
+            "rsvp_count": event.rsvp_count,
+            "capacity": capacity,
+            "double_booked_users": sum(1 for n in per_user.values() if n > 1),
+        }
+
+
+async def cleanup(event_uid, user_uids) -> None:
+    async with AsyncSession(async_engine) as session:
+        await session.exec(delete(RSVP).where(RSVP.event_uid == event_uid))
+        await session.exec(delete(Event).where(Event.uid == event_uid))
+        await session.exec(delete(User).where(User.uid.in_(user_uids)))
+        await session.commit()
+
+
+async def main(args) -> int:
+    event_uid, user_uids = await seed(args.users, args.capacity)
+    gate = asyncio.Semaphore(args.concurrency)
+    outcomes = collections.Counter()
+
+    # Every user tries twice, interleaved, so duplicates race with each other
+    attempts = [uid for uid in user_uids for _ in range(2)]
+    started = time.perf_counter()
+    await asyncio.gather(*(attempt(event_uid, uid, gate, outcomes) for uid in attempts))
+    elapsed = time.perf_counter() - started
+
+    state = await verify(event_uid, args.capacity)
+    report = {
+        "attempts": len(attempts),
+        "elapsed_s": round(elapsed, 3),
+        "attempts_per_s": round(len(attempts) / elapsed, 1),
+        "outcomes": dict(outcomes),
+        "state": state,
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.keep:
+        await cleanup(event_uid, user_uids)
+    await async_engine.dispose()
+
+    ok = (
+        state["rows"] == state["rsvp_count"] == outcomes["reserved"]
+        and state["rows"] <= args.capacity
+        and state["double_booked_users"] == 0
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--capacity", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=15)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,169 @@
+"""Check that every time filter of the events filter endpoint uses its index.
+
+Point DATABASE_URL at a throwaway database migrated to head, then run:
+
+    python -m benchmarks.schedule_explain --seed --rows 200000
+
+The statements are built by EventService.filter_statement, exactly as the
+route builds them, and run under EXPLAIN (ANALYZE, FORMAT JSON). The script
+exits non-zero if a plan does not use the expected index or scans the events
+table sequentially, or if a filter returns one of the unscheduled events the
+seed mixes in (every tenth row has no schedule).
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from src.db.main import async_engine
+from src.db.models import Event
+from src.events.service import EventService
+
+event_service = EventService()
+
+SEED_BATCH = 100_000
+
+# Events spread over two years around now, lasting one to six hours. Every
+# tenth one is unscheduled, none of the filters may return it.
+SEED_SQL = text("""
+    INSERT INTO events (uid, title, creator, description, location, category,
+                        capacity, starts_at, ends_at, timezone, created_at, updated_at)
+    SELECT gen_random_uuid(), 'Scheduled ' || i, 'schedule-bench', '-',
+           'City ' || (i % 500), 'category' || (i % 40), 100,
+           CASE WHEN i % 10 <> 0
+                THEN now() - interval '365 days' + make_interval(mins => i * 5) END,
+           CASE WHEN i % 10 <> 0
+                THEN now() - interval '365 days' + make_interval(mins => i * 5)
+                     + make_interval(hours => 1 + i % 6) END,
+           'UTC', now(), now()
+    FROM generate_series(CAST(:start AS int), CAST(:stop AS int)) AS i
+    """)
+
+
+def cases(now: datetime) -> list:
+    # (name, filter arguments, indexes of which at least one must be used)
+    week = (now + timedelta(days=7), now + timedelta(days=8))
+    return [
+        ("upcoming", {"when": "upcoming"}, {"ix_events_starts_at_uid"}),
+        (
+            "between",
+            {"when": "between", "date_start": week[0], "date_end": week[1]},
+            {"ix_events_starts_at_uid"},
+        ),
+        (
+            "overlap",
+            {"when": "overlap", "date_start": week[0], "date_end": week[1]},
+            {"ix_events_period"},
+        ),
+        ("now", {"when": "now"}, {"ix_events_period"}),
+        (
+            "upcoming_category",
+            {"when": "upcoming", "category": "category7"},
+            {"ix_events_category_starts_at"},
+        ),
+        (
+            "between_location",
+            {
+                "when": "between",
+                "date_start": now,
+                "date_end": now + timedelta(days=30),
+                "location": "City 42",
+            },
+            {"ix_events_location_starts_at"},
+        ),
+    ]
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def seed(rows: int) -> None:
+    async with async_engine.begin() as conn:
+        for start in range(1, rows + 1, SEED_BATCH):
+            stop = min(start + SEED_BATCH - 1, rows)
+            await conn.execute(SEED_SQL, {"start": start, "stop": stop})
+            print(f"seeded {stop}/{rows}")
+        await conn.execute(text("ANALYZE events"))
+
+
+async def explain(statement) -> dict:
+    # Literal binds keep the statement self contained for EXPLAIN
+    sql = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    async with async_engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+        plan = result.scalar_one()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+async def unscheduled_rows(statement) -> int:
+    async with async_engine.connect() as conn:
+        rows = (await conn.execute(statement)).all()
+    return sum(row.starts_at is None for row in rows)
+
+
+async def main(args) -> int:
+    if args.seed:
+        await seed(args.rows)
+
+    report, failed = {}, False
+    for name, filters, expected in cases(datetime.now(timezone.utc)):
+        statement = event_service.filter_statement(
+            [Event.uid, Event.starts_at],
+            filters.get("when"),
+            filters.get("date_start"),
+            filters.get("date_end"),
+            filters.get("location"),
+            filters.get("category"),
+            None,
+            None,
+            args.size,
+        )
+        plan = await explain(statement)
+        nodes = list(plan_nodes(plan["Plan"]))
+        used = {node["Index Name"] for node in nodes if "Index Name" in node}
+        seq_scan = any(
+            node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "events"
+            for node in nodes
+        )
+        unscheduled = await unscheduled_rows(statement)
+        ok = bool(used & expected) and not seq_scan and not unscheduled
+        failed = failed or not ok
+        report[name] = {
+            "ok": ok,
+            "expected": sorted(expected),
+            "indexes": sorted(used),
+            "seq_scan": seq_scan,
+            "unscheduled_rows": unscheduled,
+            "execution_ms": plan.get("Execution Time"),
+        }
+
+    print(json.dumps(report, indent=2))
+
+    if args.cleanup:
+        async with async_engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM events WHERE creator = 'schedule-bench'")
+            )
+    await async_engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", action="store_true", help="insert the test events")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--size", type=int, default=20, help="page size")
+    parser.add_argument(
+        "--cleanup", action="store_true", help="delete the test events afterwards"
+    )
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,126 @@
+"""Compare the indexed event search with the old ILIKE scan.
+
+Point DATABASE_URL at a throwaway database migrated to head, then run:
+
+    python -m benchmarks.search_benchmark --seed --rows 1000000
+
+The ILIKE baseline is run with index scans disabled for the transaction so it
+behaves like the old, unindexed query even though the trigram indexes exist.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.main import async_engine
+from src.db.models import Event
+from src.events.service import EventService
+
+WORDS = (
+    "python music festival startup meetup jazz cloud design marathon workshop "
+    "database summit yoga wine hackathon poetry robotics comedy film gardening"
+).split()
+
+QUERIES = ["jazz festival", "robotics", "hackaton", "cloud summit", "poetry night"]
+
+SEED_BATCH = 100_000
+
+SEED_SQL = text("""
+    INSERT INTO events (uid, title, creator, description, location, category,
+                        capacity, created_at, updated_at)
+    SELECT gen_random_uuid(),
+           initcap(w[1 + (i * 7) % 20] || ' ' || w[1 + (i * 13) % 20] || ' ' || i),
+           'bench',
+           'A ' || w[1 + (i * 3) % 20] || ' event about ' || w[1 + (i * 11) % 20]
+               || ' and ' || w[1 + (i * 17) % 20] || ' for everyone.',
+           'City ' || (i % 500),
+           w[1 + i % 20],
+           10 + i % 500,
+           now() - make_interval(secs => i),
+           now()
+    FROM generate_series(CAST(:start AS int), CAST(:stop AS int)) AS i,
+         (SELECT CAST(:words AS text[]) AS w) AS words
+    """)
+
+
+async def seed(rows: int) -> None:
+    async with async_engine.begin() as conn:
+        for start in range(1, rows + 1, SEED_BATCH):
+            stop = min(start + SEED_BATCH - 1, rows)
+            await conn.execute(SEED_SQL, {"start": start, "stop": stop, "words": WORDS})
+            print(f"seeded {stop}/{rows}")
+        await conn.execute(text("ANALYZE events"))
+
+
+async def time_query(run, runs: int) -> dict:
+    timings = []
+    found = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        found = await run()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "found": found,
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "max_ms": round(timings[-1], 2),
+    }
+
+
+async def ilike_search(query: str, size: int) -> int:
+    async with AsyncSession(async_engine) as session:
+        await session.exec(text("SET LOCAL enable_indexscan = off"))
+        await session.exec(text("SET LOCAL enable_bitmapscan = off"))
+        statement = (
+            select(Event.uid)
+            .where(
+                Event.title.ilike(f"%{query}%") | Event.description.ilike(f"%{query}%")
+            )
+            .limit(size)
+        )
+        result = await session.exec(statement)
+        return len(result.all())
+
+
+async def indexed_search(query: str, size: int) -> int:
+    async with AsyncSession(async_engine) as session:
+        hits, _ = await EventService().search_events(query, session, size=size)
+        return len(hits)
+
+
+async def main(args) -> None:
+    if args.seed:
+        await seed(args.rows)
+
+    report = []
+    for query in QUERIES:
+        report.append(
+            {
+                "query": query,
+                "ilike": await time_query(
+                    lambda: ilike_search(query, args.size), args.runs
+                ),
+                "indexed": await time_query(
+                    lambda: indexed_search(query, args.size), args.runs
+                ),
+            }
+        )
+
+    print(json.dumps(report, indent=2))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", action="store_true", help="insert synthetic events")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--size", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
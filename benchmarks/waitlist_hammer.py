@@ -0,0 +1,178 @@
+"""Hammer joins and cancellations of a full event and check the waitlist.
+
+Point DATABASE_URL at a throwaway database migrated to head, then run:
+
+    python -m benchmarks.waitlist_hammer --users 500 --capacity 20 --operations 5000
+
+Each worker drives its own slice of users and flips them between holding a
+seat and not: users without a seat reserve (getting a seat or a waitlist
+entry), users with one cancel, which promotes the head of the queue.
+Promotions are fed back to the worker owning the promoted user.
+
+Afterwards the capacity is raised through EventService.update_event, which
+must hand the new seats to the head of the queue, and the positions served by
+the Redis rank index are compared with positions counted in Postgres.
+
+The script exits non-zero if the event got overbooked, if rsvp_count drifted
+from the real number of rows, if a user both holds a seat and waits, if
+users are waiting while a seat is free, or if the rank index is off.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import random
+import sys
+import time
+import uuid
+
+from sqlalchemy import delete
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.rsvp_concurrency import seed
+from src.db.main import async_engine
+from src.db.models import User, Event, RSVP, WaitlistEntry
+from src.events.schemas import EventUpdateModel
+from src.events.service import EventService
+from src.rsvp.service import RSVPService
+
+rsvp_service = RSVPService()
+event_service = EventService()
+
+
+async def worker(event_uid, users, held: dict, operations: int, outcomes) -> None:
+    for _ in range(operations):
+        user_uid = random.choice(users)
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            try:
+                if user_uid in held:
+                    _, promoted = await rsvp_service.cancel_rsvp(
+                        held.pop(user_uid), session
+                    )
+                    outcomes["cancelled"] += 1
+                    if promoted is not None:
+                        held[promoted.user_uid] = promoted.uid
+                        outcomes["promoted"] += 1
+                else:
+                    rsvp, waitlisted = await rsvp_service.reserve(
+                        event_uid, user_uid, session
+                    )
+                    if rsvp is not None:
+                        held[user_uid] = rsvp.uid
+                        outcomes["reserved"] += 1
+                    else:
+                        outcomes["waitlisted"] += 1
+            except ValueError as error:
+                # A promotion raced with the owner's own request
+                outcomes[type(error).__name__] += 1
+
+
+async def verify(event_uid) -> dict:
+    async with AsyncSession(async_engine) as session:
+        seated = (
+            await session.exec(select(RSVP.user_uid).where(RSVP.event_uid == event_uid))
+        ).all()
+        waiting = (
+            await session.exec(
+                select(WaitlistEntry.user_uid).where(
+                    WaitlistEntry.event_uid == event_uid
+                )
+            )
+        ).all()
+        event = (await session.exec(select(Event).where(Event.uid == event_uid))).one()
+        index_mismatches = 0
+        for user_uid in waiting:
+            served = await rsvp_service.get_waitlist_position(
+                event_uid, user_uid, session
+            )
+            counted = await rsvp_service.count_waitlist_position(
+                event_uid, user_uid, session
+            )
+            index_mismatches += served is None or served.position != counted
+        return {
+            "rows": len(seated),
+            "rsvp_count": event.rsvp_count,
+            "capacity": event.capacity,
+            "waiting": len(waiting),
+            "double_booked_users": sum(
+                1 for n in collections.Counter(seated).values() if n > 1
+            ),
+            "seated_and_waiting": len(set(seated) & set(waiting)),
+            "index_mismatches": index_mismatches,
+        }
+
+
+async def cleanup(event_uid, user_uids) -> None:
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            delete(WaitlistEntry).where(WaitlistEntry.event_uid == event_uid)
+        )
+        await session.exec(delete(RSVP).where(RSVP.event_uid == event_uid))
+        await session.exec(delete(Event).where(Event.uid == event_uid))
+        await session.exec(delete(User).where(User.uid.in_(user_uids)))
+        await session.commit()
+
+
+async def main(args) -> int:
+    event_uid, user_uids = await seed(args.users, args.capacity)
+    held = {}
+    outcomes = collections.Counter()
+
+    slices = [user_uids[i :: args.concurrency] for i in range(args.concurrency)]
+    per_worker = args.operations // args.concurrency
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(worker(event_uid, users, held, per_worker, outcomes) for users in slices)
+    )
+    elapsed = time.perf_counter() - started
+
+    state = await verify(event_uid)
+
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        await event_service.update_event(
+            str(event_uid),
+            EventUpdateModel.model_construct(
+                capacity=args.capacity + args.raise_capacity
+            ),
+            session,
+        )
+    raised = await verify(event_uid)
+
+    report = {
+        "operations": per_worker * args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "operations_per_s": round(per_worker * args.concurrency / elapsed, 1),
+        "outcomes": dict(outcomes),
+        "state": state,
+        "after_capacity_raise": raised,
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.keep:
+        await cleanup(event_uid, user_uids)
+    await async_engine.dispose()
+
+    ok = all(
+        checked["rows"] == checked["rsvp_count"] <= checked["capacity"]
+        and checked["double_booked_users"] == 0
+        and checked["seated_and_waiting"] == 0
+        and (checked["waiting"] == 0 or checked["rows"] == checked["capacity"])
+        and checked["index_mismatches"] == 0
+        for checked in (state, raised)
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--capacity", type=int, default=20)
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=15)
+    parser.add_argument(
+        "--raise-capacity", type=int, default=10, help="seats added at the end"
+    )
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    sys.exit(asyncio.run(main(parser.parse_args())))
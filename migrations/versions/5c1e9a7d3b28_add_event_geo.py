@@ -0,0 +1,96 @@
+"""add event geo
+
+Revision ID: 5c1e9a7d3b28
+Revises: 9b4e7d2c1a05
+Create Date: 2026-10-18 17:48:12.336081
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9a7d3b28'
+down_revision: Union[str, None] = '9b4e7d2c1a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of GEOHASH_FUNCTION_SQL from src/events/geo.py
+GEOHASH_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION geohash_encode(
+    lat double precision, lon double precision, chars integer
+) RETURNS text
+LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE AS $$
+DECLARE
+    alphabet CONSTANT text := '0123456789bcdefghjkmnpqrstuvwxyz';
+    lat_lo double precision := -90;
+    lat_hi double precision := 90;
+    lon_lo double precision := -180;
+    lon_hi double precision := 180;
+    mid double precision;
+    even boolean := true;
+    bits integer := 0;
+    ch integer := 0;
+    hash text := '';
+BEGIN
+    IF lat < -90 OR lat > 90 OR lon < -180 OR lon > 180 THEN
+        RETURN NULL;
+    END IF;
+    WHILE length(hash) < chars LOOP
+        IF even THEN
+            mid := (lon_lo + lon_hi) / 2;
+            IF lon >= mid THEN
+                ch := ch * 2 + 1;
+                lon_lo := mid;
+            ELSE
+                ch := ch * 2;
+                lon_hi := mid;
+            END IF;
+        ELSE
+            mid := (lat_lo + lat_hi) / 2;
+            IF lat >= mid THEN
+                ch := ch * 2 + 1;
+                lat_lo := mid;
+            ELSE
+                ch := ch * 2;
+                lat_hi := mid;
+            END IF;
+        END IF;
+        even := NOT even;
+        bits := bits + 1;
+        IF bits = 5 THEN
+            hash := hash || substr(alphabet, ch + 1, 1);
+            bits := 0;
+            ch := 0;
+        END IF;
+    END LOOP;
+    RETURN hash;
+END;
+$$
+"""
+
+
+def upgrade() -> None:
+    op.execute(GEOHASH_FUNCTION_SQL)
+    op.add_column('events', sa.Column('latitude', postgresql.DOUBLE_PRECISION(), nullable=True))
+    op.add_column('events', sa.Column('longitude', postgresql.DOUBLE_PRECISION(), nullable=True))
+    op.add_column('events', sa.Column('geohash', sa.VARCHAR(length=12, collation='C'), sa.Computed('geohash_encode(latitude, longitude, 12)', persisted=True), nullable=True))
+    op.create_check_constraint(
+        'ck_events_coordinates',
+        'events',
+        '(latitude IS NULL) = (longitude IS NULL) AND latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180',
+    )
+    op.create_index('ix_events_geohash', 'events', ['geohash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_geohash', table_name='events')
+    op.drop_constraint('ck_events_coordinates', 'events', type_='check')
+    op.drop_column('events', 'geohash')
+    op.drop_column('events', 'longitude')
+    op.drop_column('events', 'latitude')
+    op.execute('DROP FUNCTION IF EXISTS geohash_encode(double precision, double precision, integer)')
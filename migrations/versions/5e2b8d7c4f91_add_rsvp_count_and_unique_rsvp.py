@@ -0,0 +1,53 @@
+"""add rsvp count and unique rsvp
+
+Revision ID: 5e2b8d7c4f91
+Revises: a3f7c9e1b254
+Create Date: 2026-10-18 11:24:51.902337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b8d7c4f91'
+down_revision: Union[str, None] = 'a3f7c9e1b254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the oldest RSVP of any duplicated (event, user) pair
+    op.execute(
+        """
+        DELETE FROM rsvps
+        WHERE uid IN (
+            SELECT uid FROM (
+                SELECT uid, row_number() OVER (
+                    PARTITION BY event_uid, user_uid ORDER BY rsvp_date, uid
+                ) AS rn
+                FROM rsvps
+            ) ranked
+            WHERE ranked.rn > 1
+        )
+        """
+    )
+    op.create_unique_constraint('uq_rsvps_event_user', 'rsvps', ['event_uid', 'user_uid'])
+
+    op.add_column('events', sa.Column('rsvp_count', sa.INTEGER(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE events
+        SET rsvp_count = counts.total
+        FROM (SELECT event_uid, count(*) AS total FROM rsvps GROUP BY event_uid) counts
+        WHERE events.uid = counts.event_uid
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('events', 'rsvp_count')
+    op.drop_constraint('uq_rsvps_event_user', 'rsvps', type_='unique')
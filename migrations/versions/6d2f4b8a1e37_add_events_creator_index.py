@@ -0,0 +1,27 @@
+"""add events creator index
+
+Revision ID: 6d2f4b8a1e37
+Revises: 5c1e9a7d3b28
+Create Date: 2026-10-18 19:02:44.518307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2f4b8a1e37'
+down_revision: Union[str, None] = '5c1e9a7d3b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_events_creator_starts_at', 'events', ['creator', 'starts_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_creator_starts_at', table_name='events')
@@ -0,0 +1,29 @@
+"""add events keyset index
+
+Revision ID: 8c1d2e4f6a10
+Revises: 13fe16594d5b
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d2e4f6a10'
+down_revision: Union[str, None] = '13fe16594d5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Rows without created_at would never be reachable through a keyset cursor
+    op.execute("UPDATE events SET created_at = now() WHERE created_at IS NULL")
+    op.create_index('ix_events_created_at_uid', 'events', ['created_at', 'uid'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_created_at_uid', table_name='events')
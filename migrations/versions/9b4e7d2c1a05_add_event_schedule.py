@@ -0,0 +1,46 @@
+"""add event schedule
+
+Revision ID: 9b4e7d2c1a05
+Revises: f3c8a61d2b47
+Create Date: 2026-10-18 16:21:37.905412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e7d2c1a05'
+down_revision: Union[str, None] = 'f3c8a61d2b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('events', sa.Column('starts_at', postgresql.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('events', sa.Column('ends_at', postgresql.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('events', sa.Column('timezone', sa.VARCHAR(), server_default='UTC', nullable=False))
+    op.create_check_constraint(
+        'ck_events_schedule',
+        'events',
+        '(starts_at IS NULL) = (ends_at IS NULL) AND ends_at >= starts_at',
+    )
+    op.create_index('ix_events_starts_at_uid', 'events', ['starts_at', 'uid'], unique=False)
+    op.create_index('ix_events_period', 'events', [sa.text("tstzrange(starts_at, ends_at, '[)')")], unique=False, postgresql_using='gist')
+    op.create_index('ix_events_category_starts_at', 'events', ['category', 'starts_at'], unique=False)
+    op.create_index('ix_events_location_starts_at', 'events', ['location', 'starts_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_location_starts_at', table_name='events')
+    op.drop_index('ix_events_category_starts_at', table_name='events')
+    op.drop_index('ix_events_period', table_name='events', postgresql_using='gist')
+    op.drop_index('ix_events_starts_at_uid', table_name='events')
+    op.drop_constraint('ck_events_schedule', 'events', type_='check')
+    op.drop_column('events', 'timezone')
+    op.drop_column('events', 'ends_at')
+    op.drop_column('events', 'starts_at')
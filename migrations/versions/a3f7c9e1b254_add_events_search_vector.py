@@ -0,0 +1,43 @@
+"""add events search vector
+
+Revision ID: a3f7c9e1b254
+Revises: 8c1d2e4f6a10
+Create Date: 2026-10-18 10:02:13.540871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f7c9e1b254'
+down_revision: Union[str, None] = '8c1d2e4f6a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('events', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index('ix_events_search_vector', 'events', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_events_title_trgm', 'events', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_events_description_trgm', 'events', ['description'], unique=False, postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_description_trgm', table_name='events')
+    op.drop_index('ix_events_title_trgm', table_name='events')
+    op.drop_index('ix_events_search_vector', table_name='events')
+    op.drop_column('events', 'search_vector')
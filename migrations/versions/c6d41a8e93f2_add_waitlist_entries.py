@@ -0,0 +1,39 @@
+"""add waitlist entries
+
+Revision ID: c6d41a8e93f2
+Revises: 5e2b8d7c4f91
+Create Date: 2026-10-18 13:02:17.448213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6d41a8e93f2'
+down_revision: Union[str, None] = '5e2b8d7c4f91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('waitlist_entries',
+    sa.Column('uid', sa.Uuid(), nullable=False),
+    sa.Column('event_uid', sa.Uuid(), nullable=False),
+    sa.Column('user_uid', sa.Uuid(), nullable=False),
+    sa.Column('position', sa.BIGINT(), sa.Identity(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+    sa.ForeignKeyConstraint(['event_uid'], ['events.uid'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_uid'], ['users.uid'], ),
+    sa.PrimaryKeyConstraint('uid'),
+    sa.UniqueConstraint('event_uid', 'user_uid', name='uq_waitlist_event_user')
+    )
+    op.create_index('ix_waitlist_event_position', 'waitlist_entries', ['event_uid', 'position'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_waitlist_event_position', table_name='waitlist_entries')
+    op.drop_table('waitlist_entries')
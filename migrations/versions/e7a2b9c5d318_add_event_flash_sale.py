@@ -0,0 +1,27 @@
+"""add event flash sale
+
+Revision ID: e7a2b9c5d318
+Revises: c6d41a8e93f2
+Create Date: 2026-10-18 13:47:05.216839
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a2b9c5d318'
+down_revision: Union[str, None] = 'c6d41a8e93f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('events', sa.Column('flash_sale', sa.BOOLEAN(), server_default='false', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('events', 'flash_sale')
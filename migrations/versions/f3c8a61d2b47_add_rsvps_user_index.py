@@ -0,0 +1,30 @@
+"""add rsvps user index
+
+Revision ID: f3c8a61d2b47
+Revises: e7a2b9c5d318
+Create Date: 2026-10-18 15:02:51.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a61d2b47'
+down_revision: Union[str, None] = 'e7a2b9c5d318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Every event needs a version for its ETag and Last-Modified headers
+    op.execute("UPDATE events SET updated_at = coalesce(created_at, now()) WHERE updated_at IS NULL")
+    # Serves the RSVP list of a user and its version as an index only scan
+    op.create_index('ix_rsvps_user_uid_uid', 'rsvps', ['user_uid', 'uid'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rsvps_user_uid_uid', table_name='rsvps')
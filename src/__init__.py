@@ -2,17 +2,40 @@ from fastapi import FastAPI
 from src.events.routes import event_router
 from src.auth.routes import auth_router
 from src.rsvp.routes import rsvp_router
+from src.admin.routes import admin_router
 from contextlib import asynccontextmanager
 from src.db.main import init_db
+from src.db.redis import redis_manager, revocation_filter
+from src.rsvp.flash_sale import flash_sale
+from src.auth.utils import password_hasher
+from src.auth.service import user_cache
+from src.config import Config
 from .middleware import register_middleware
+from .metrics import metrics_router
 
 
 # Define lifespan event for task that require it
 @asynccontextmanager
 async def life_span(app: FastAPI):
     print(f"Server is starting...")
-    await init_db()
+    # The schema is managed by Alembic, create_all is only a development aid
+    if Config.DB_CREATE_ALL:
+        await init_db()
+    await redis_manager.start()
+    # Writes behind the flash sale claims, after reconciling them with Postgres
+    await flash_sale.start()
+    # Local copy of the revoked tokens, checks go to Redis until it is in sync
+    if Config.REVOCATION_FILTER_ENABLED:
+        revocation_filter.start()
+    # Per-worker user rows, used once the invalidation feed is subscribed
+    user_cache.start()
     yield
+    await user_cache.stop()
+    await revocation_filter.stop()
+    await flash_sale.stop()
+    await redis_manager.close()
+    # Process pools would otherwise outlive the worker
+    password_hasher.shutdown()
     print(f"Server has been stopped.")
 
 
@@ -23,7 +46,7 @@ app = FastAPI(
     title="Event Management",
     description="A REST API for a event management service",
     version=version,
-    # lifespan=life_span,
+    lifespan=life_span,
 )
 
 register_middleware(app)
@@ -31,3 +54,5 @@ register_middleware(app)
 app.include_router(event_router, prefix=f"/api/{version}/events", tags=["events"])
 app.include_router(auth_router, prefix=f"/api/{version}/auth", tags=["auth"])
 app.include_router(rsvp_router, prefix=f"/api/{version}/rsvp", tags=["rsvp"])
+app.include_router(metrics_router, tags=["metrics"])
+app.include_router(admin_router, prefix=f"/api/{version}/admin", tags=["admin"])
@@ -0,0 +1,54 @@
+import uuid
+
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.exceptions import HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.auth.depends import RoleChecker
+from src.db.main import async_engine, get_pool_stats, get_session
+from src.db.redis import redis_manager
+from src.db.profiler import profiler
+from src.rsvp.flash_sale import flash_sale
+
+admin_router = APIRouter(dependencies=[Depends(RoleChecker(["admin"]))])
+
+
+@admin_router.get("/db/pool")
+async def database_pool_stats():
+    return get_pool_stats(async_engine)
+
+
+@admin_router.get("/db/queries")
+async def query_profile(limit: int = Query(20, ge=1, le=1000)):
+    # Slow queries, N+1 suspects, requests over budget and the heaviest shapes
+    return profiler.report(limit)
+
+
+@admin_router.get("/redis")
+async def redis_stats():
+    return redis_manager.stats()
+
+
+@admin_router.get("/events/{event_uid}/flash-sale")
+async def flash_sale_status(event_uid: uuid.UUID):
+    return await flash_sale.status(event_uid)
+
+
+@admin_router.post("/events/{event_uid}/flash-sale")
+async def enable_flash_sale(
+    event_uid: uuid.UUID, session: AsyncSession = Depends(get_session)
+):
+    try:
+        return await flash_sale.enable(event_uid, session)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@admin_router.delete("/events/{event_uid}/flash-sale")
+async def disable_flash_sale(
+    event_uid: uuid.UUID, session: AsyncSession = Depends(get_session)
+):
+    try:
+        return await flash_sale.disable(event_uid, session)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
@@ -6,13 +6,41 @@ from .utils import decode_token
 from src.db.redis import token_in_blacklist
 from src.db.main import get_session
 from .service import UserService
-from src.db.models import User
 from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Any, List
 
 user_service = UserService()
 
 
+# Verify the bearer token once per request. Routes stack several bearer and role
+# dependencies, they all share the result stored on the request state.
+async def verify_request_token(request: Request, token: str) -> dict:
+    verified = getattr(request.state, "verified_token", None)
+    if verified is not None and verified[0] == token:
+        return verified[1]
+
+    token_data = decode_token(token)
+    if token_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or Expired Token"
+        )
+
+    if await token_in_blacklist(token_data["jti"]):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={
+                "error": "This token is Invalid or has been Revoked",
+                "Resolution": "Please accquire a new token",
+            },
+        )
+
+    request.state.verified_token = (token, token_data)
+    # Read by the database layer to keep a user's reads on the primary after
+    # their writes
+    request.state.user_uid = token_data["user"].get("user_uid")
+    return token_data
+
+
 class CustomTokenBearer(HTTPBearer):
 
     def __init__(self, auto_error=True):
@@ -20,48 +48,15 @@ class CustomTokenBearer(HTTPBearer):
 
     async def __call__(self, request: Request) -> HTTPAuthorizationCredentials | None:
         creds = await super().__call__(request)
+        if creds is None:
+            return None
 
-        print("Creds scheme: ", creds.scheme)
-        print("Creds credential: ", creds.credentials)
-        token = creds.credentials
-
-        token_data = decode_token(token)
-
-        if not self.token_valid(token):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or Expired Token"
-            )
-
-        if await token_in_blacklist(token_data["jti"]):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail={
-                    "error": "This token is Invalid or has been Revoked",
-                    "Resolution": "Please accquire a new token",
-                },
-            )
-
-        # if token_data is not None:
-        #     if token_data["refresh"]:
-        #         raise HTTPException(
-        #             status_code=status.HTTP_403_FORBIDDEN,
-        #             detail="Please provide an valid Access Token",
-        #         )
-        # else:
-        #     raise HTTPException(
-        #         status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or Expired Token"
-        #     )
+        token_data = await verify_request_token(request, creds.credentials)
 
         self.verify_token_data(token_data)
 
         return token_data
 
-    def token_valid(self, token: str) -> bool:
-
-        token_data = decode_token(token)
-
-        return token_data is not None
-
     def verify_token_data(self, token_data):
         raise NotImplementedError("Please override this method in child classes")
 
@@ -91,17 +86,34 @@ async def get_current_user(
     session: AsyncSession = Depends(get_session),
 ):
     user_email = token_detail["user"]["email"]
-    user = await user_service.get_user_by_email(user_email, session)
+    user = await user_service.get_cached_user(user_email, session)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="User no longer exists"
+        )
 
     return user
 
 
+# Authorize from the role claim signed into the access token, no database access.
+# Tokens minted before the claim existed fall back to the cached user row.
 class RoleChecker:
     def __init__(self, allowed_roles: List[str]) -> None:
         self.allowed_roles = allowed_roles
 
-    def __call__(self, current_user: User = Depends(get_current_user)) -> Any:
-        if current_user.role in self.allowed_roles:
+    async def __call__(
+        self,
+        token_detail: dict = Depends(AccessTokenBearer()),
+        session: AsyncSession = Depends(get_session),
+    ) -> Any:
+        role = token_detail["user"].get("role")
+        if role is None:
+            user = await user_service.get_cached_user(
+                token_detail["user"]["email"], session
+            )
+            role = user.role if user is not None else None
+
+        if role in self.allowed_roles:
             return True
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -1,7 +1,13 @@
 from fastapi import APIRouter, Depends, status
-from .schemas import User, UserCreateModel, UserLoginModel
+from .schemas import User, UserCreateModel, UserLoginModel, UserRoleUpdateModel
 from .service import UserService
-from .utils import create_access_token, decode_token, verify_password
+from .utils import (
+    create_access_token,
+    decode_token,
+    check_password,
+    PasswordHasherBusy,
+)
+from src.config import Config
 from src.db.main import get_session
 from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi.exceptions import HTTPException
@@ -17,10 +23,18 @@ from src.db.redis import add_jti_to_blacklist
 
 auth_router = APIRouter()
 user_service = UserService()
-role_checker = RoleChecker(["admin", "user"])
+role_checker = RoleChecker(["admin", "organizer", "user"])
 REFRESH_TOKEN_EXPIRY_DAYS = 2
 
 
+def hashing_unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again shortly.",
+        headers={"Retry-After": str(Config.PASSWORD_HASH_RETRY_AFTER)},
+    )
+
+
 @auth_router.post("/signup", response_model=User, status_code=status.HTTP_201_CREATED)
 async def create_user_account(
     user_data: UserCreateModel, session: AsyncSession = Depends(get_session)
@@ -32,7 +46,10 @@ async def create_user_account(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User with the email is already exist!",
         )
-    new_user = await user_service.create_user(user_data, session)
+    try:
+        new_user = await user_service.create_user(user_data, session)
+    except PasswordHasherBusy:
+        raise hashing_unavailable()
     return new_user
 
 
@@ -46,8 +63,16 @@ async def login_user(
     user = await user_service.get_user_by_email(email, session)
 
     if user is not None:
-        valid = verify_password(password, user.password_hash)
+        try:
+            valid, new_hash = await check_password(password, user.password_hash)
+        except PasswordHasherBusy:
+            raise hashing_unavailable()
+
         if valid:
+            if new_hash is not None:
+                # Transparently move the stored hash to the current cost factor
+                await user_service.update_password_hash(user, new_hash, session)
+
             access_token = create_access_token(
                 user_data={
                     "email": user.email,
@@ -56,6 +81,7 @@ async def login_user(
                 }  # provide expiry too if needed, else will use the default 3600s
             )
 
+            # No role claim here, every refresh reads the current one
             refresh_token = create_access_token(
                 user_data={
                     "email": user.email,
@@ -79,14 +105,31 @@ async def login_user(
 
 
 @auth_router.get("/refresh_token")
-async def get_new_access_token(token_detail: dict = Depends(RefreshTokenBearer())):
+async def get_new_access_token(
+    token_detail: dict = Depends(RefreshTokenBearer()),
+    session: AsyncSession = Depends(get_session),
+):
     expiry_timestamp = token_detail["exp"]
 
     if (
         datetime.fromtimestamp(expiry_timestamp) > datetime.now()
     ):  # check the time of the access token
+        # Read the role from the database, not a per-worker cache, so a
+        # demoted user gets the new role on their next refresh
+        user = await user_service.get_user_by_email(
+            token_detail["user"]["email"], session
+        )
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail="User no longer exists"
+            )
+
         new_access_token = create_access_token(
-            user_data=token_detail["user"],
+            user_data={
+                "email": user.email,
+                "user_uid": user.uid,
+                "role": user.role,
+            },
         )  # create new token from the data
         return JSONResponse(content={"access_token": new_access_token})
 
@@ -95,9 +138,9 @@ async def get_new_access_token(token_detail: dict = Depends(RefreshTokenBearer()
     )
 
 
-@auth_router.get("/me")
+@auth_router.get("/me", response_model=User)
 async def get_current_user(
-    user=Depends(get_current_user), _: bool = Depends(RoleChecker)
+    user=Depends(get_current_user), _: bool = Depends(role_checker)
 ):
     return user
 
@@ -114,5 +157,20 @@ async def revoke_token(token_detail: dict = Depends(AccessTokenBearer())):
     )
 
 
-# @auth_router.patch("/admin/update_user_role")
-# async def update_user_role()
+# Role changes apply to access tokens issued from now on, including refreshed
+# ones. Existing access tokens keep their signed role claim until they expire.
+@auth_router.patch(
+    "/admin/update_user_role",
+    response_model=User,
+    dependencies=[Depends(RoleChecker(["admin"]))],
+)
+async def update_user_role(
+    role_data: UserRoleUpdateModel, session: AsyncSession = Depends(get_session)
+):
+    try:
+        user = await user_service.update_user_role(
+            role_data.email, role_data.role, session
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return user
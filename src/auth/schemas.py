@@ -1,6 +1,9 @@
 from pydantic import BaseModel, Field
 import uuid
 from datetime import datetime
+from typing import Literal
+
+UserRole = Literal["admin", "organizer", "user"]
 
 
 class User(BaseModel):
@@ -10,6 +13,7 @@ class User(BaseModel):
     password_hash: str = Field(exclude=True)
     first_name: str
     last_name: str
+    role: str
     is_verified: bool
     created_at: datetime
     updated_at: datetime
@@ -26,3 +30,8 @@ class UserCreateModel(BaseModel):
 class UserLoginModel(BaseModel):
     email: str = Field(..., max_length=40)
     password: str = Field(..., min_length=6, max_length=16)
+
+
+class UserRoleUpdateModel(BaseModel):
+    email: str = Field(..., max_length=40)
+    role: UserRole
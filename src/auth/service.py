@@ -1,8 +1,118 @@
 from src.db.models import User
-from .schemas import UserCreateModel
-from .utils import generate_password_hash, verify_password
+from src.db.redis import redis_manager
+from src.cache import TTLCache
+from src.config import Config
+from .schemas import UserCreateModel, User as UserSchema
+from .utils import hash_password
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
+from redis.exceptions import RedisError
+from typing import Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+USER_INVALIDATED_CHANNEL = "auth:user-invalidated"
+
+
+# Short lived per-worker copy of user rows for the endpoints that need more
+# than the token claims. A change to a user is published over Redis pub/sub and
+# dropped by every worker. Like the revocation filter, the copy is only used
+# while the subscription is provably live, otherwise lookups go to Postgres.
+class UserCache:
+    def __init__(
+        self, manager, maxsize: int, ttl: float, max_lag: float, heartbeat: float
+    ):
+        self.manager = manager
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.max_lag = max_lag
+        self.heartbeat = heartbeat
+        # Bumped by every invalidation, a load that started before one must
+        # not store what it read
+        self.generation = 0
+        self.synced = False
+        self.last_seen = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.synced and time.monotonic() - self.last_seen < self.max_lag
+
+    def get(self, email: str) -> Optional[UserSchema]:
+        return self.entries.get(email) if self.is_fresh() else None
+
+    def set(self, email: str, user: UserSchema, generation: int) -> None:
+        if self.is_fresh() and generation == self.generation:
+            self.entries.set(email, user)
+
+    def drop(self, email: str) -> None:
+        self.generation += 1
+        self.entries.pop(email)
+
+    async def invalidate(self, email: str) -> None:
+        self.drop(email)
+        try:
+            await self.manager.client.publish(USER_INVALIDATED_CHANNEL, email)
+        except RedisError as error:
+            logger.warning("Could not publish the change of user %s: %s", email, error)
+
+    async def listen(self) -> None:
+        pubsub = self.manager.client.pubsub()
+        try:
+            await pubsub.subscribe(USER_INVALIDATED_CHANNEL)
+            # Changes made while unsubscribed were missed, start empty
+            self.generation += 1
+            self.entries.clear()
+            self.synced = True
+            self.last_seen = time.monotonic()
+            last_ping = 0.0
+
+            while True:
+                if time.monotonic() - last_ping >= self.heartbeat:
+                    await pubsub.ping()
+                    last_ping = time.monotonic()
+
+                message = await pubsub.get_message(timeout=self.heartbeat)
+                if message is None:
+                    continue
+                self.last_seen = time.monotonic()
+                if message["type"] == "message":
+                    self.drop(message["data"])
+        finally:
+            self.synced = False
+            await pubsub.aclose()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.listen()
+            except (RedisError, OSError) as error:
+                logger.warning("User cache sync lost, reading Postgres: %s", error)
+            await asyncio.sleep(self.heartbeat)
+
+    def start(self) -> None:
+        if self.task is None and self.entries.maxsize > 0:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+# Same liveness bounds as the revocation filter
+user_cache = UserCache(
+    redis_manager,
+    maxsize=Config.USER_CACHE_SIZE,
+    ttl=Config.USER_CACHE_TTL,
+    max_lag=Config.REVOCATION_SYNC_MAX_LAG,
+    heartbeat=Config.REVOCATION_HEARTBEAT_INTERVAL,
+)
 
 
 class UserService:
@@ -12,6 +122,41 @@ class UserService:
         user = result.first()
         return user
 
+    async def get_cached_user(
+        self, email: str, session: AsyncSession
+    ) -> Optional[UserSchema]:
+        user = user_cache.get(email)
+        if user is not None:
+            return user
+
+        generation = user_cache.generation
+        user_row = await self.get_user_by_email(email, session)
+        if user_row is None:
+            return None
+
+        user = UserSchema.model_validate(user_row, from_attributes=True)
+        user_cache.set(email, user, generation)
+        return user
+
+    async def update_user_role(self, email: str, role: str, session: AsyncSession):
+        user = await self.get_user_by_email(email, session)
+        if user is None:
+            raise ValueError(f"User with email {email} not found")
+
+        user.role = role
+        await session.commit()
+        await user_cache.invalidate(email)
+
+        return user
+
+    async def update_password_hash(
+        self, user: User, password_hash: str, session: AsyncSession
+    ):
+        user.password_hash = password_hash
+        await session.commit()
+
+        return user
+
     async def user_exists(self, email: str, session: AsyncSession):
         user = await self.get_user_by_email(email, session)
         return True if user is not None else False
@@ -21,7 +166,7 @@ class UserService:
 
         new_user = User(**user_data_dict)
 
-        new_user.password_hash = generate_password_hash(user_data_dict["password"])
+        new_user.password_hash = await hash_password(user_data_dict["password"])
 
         new_user.role = "user"
 
@@ -1,14 +1,28 @@
 from passlib.context import CryptContext
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import timedelta, datetime
+from typing import Optional, Tuple
+import asyncio
 import jwt, uuid
+import hashlib
 import logging
 
 from src.config import Config
+from src.cache import TTLCache
 
-password_context = CryptContext(schemes=["bcrypt"])
+# Hashes made with fewer rounds than configured are rehashed on the next login
+password_context = CryptContext(
+    schemes=["bcrypt"],
+    bcrypt__default_rounds=Config.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=Config.BCRYPT_ROUNDS,
+)
 
 ACCESS_TOKEN_EXPIRY = 3600
 
+# Claims of tokens that already passed signature and expiry checks, keyed by the
+# token hash and dropped at the token's own exp
+verified_tokens = TTLCache(maxsize=Config.TOKEN_CACHE_SIZE)
+
 
 def generate_password_hash(password: str) -> str:
     hash = password_context.hash(password)
@@ -19,6 +33,67 @@ def verify_password(password: str, hash: str) -> bool:
     return password_context.verify(password, hash)
 
 
+def verify_and_update_password(password: str, hash: str) -> Tuple[bool, Optional[str]]:
+    return password_context.verify_and_update(password, hash)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+# Runs bcrypt off the event loop on a bounded pool. Jobs beyond the workers plus
+# the queue size are rejected right away instead of piling up behind each other.
+class PasswordHasher:
+    def __init__(self, kind: str, workers: int, queue_size: int) -> None:
+        self.kind = kind
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.pending = 0
+        self.executor: Optional[Executor] = None
+
+    def get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+        return self.executor
+
+    async def run(self, func, *args):
+        if self.pending >= self.capacity:
+            raise PasswordHasherBusy("Password hashing pool is saturated")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+password_hasher = PasswordHasher(
+    kind=Config.PASSWORD_HASH_EXECUTOR,
+    workers=Config.PASSWORD_HASH_WORKERS,
+    queue_size=Config.PASSWORD_HASH_QUEUE_SIZE,
+)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(generate_password_hash, password)
+
+
+async def check_password(password: str, hash: str) -> Tuple[bool, Optional[str]]:
+    # Returns whether the password matches, and a new hash when it needs an upgrade
+    return await password_hasher.run(verify_and_update_password, password, hash)
+
+
 def create_random_secret(length: int = 16) -> str:
     import secrets
 
@@ -48,11 +123,18 @@ def create_access_token(
 
 
 def decode_token(token: str) -> dict:
+    token_hash = hashlib.sha256(token.encode()).digest()
+    token_data = verified_tokens.get(token_hash)
+    if token_data is not None:
+        return token_data
+
     try:
         token_data = jwt.decode(
             jwt=token, key=Config.JWT_SECRET, algorithms=Config.JWT_ALGORITHM
         )
-        return token_data
     except jwt.PyJWTError as error:
-        logging.exception(error)
+        logging.warning("Rejected token: %s", error)
         return None
+
+    verified_tokens.set(token_hash, token_data, expires_at=token_data.get("exp"))
+    return token_data
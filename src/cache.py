@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+# Small in-process LRU cache where every entry also carries its own expiry time
+# (a unix timestamp). Meant for hot, per-worker lookups that are cheap to redo.
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self.entries[key]
+            return default
+
+        self.entries.move_to_end(key)
+        return value
+
+    def set(
+        self, key: Hashable, value: Any, expires_at: Optional[float] = None
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+
+        # An entry never outlives the cache wide TTL, even with a later expiry
+        if self.ttl is not None:
+            ttl_expiry = time.time() + self.ttl
+            expires_at = (
+                ttl_expiry if expires_at is None else min(expires_at, ttl_expiry)
+            )
+        if expires_at is None:
+            expires_at = float("inf")
+
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Any:
+        entry = self.entries.pop(key, None)
+        return None if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
@@ -0,0 +1,171 @@
+import zlib
+from typing import Iterable, Optional
+
+from src.config import Config
+
+# Statuses that never carry a body worth compressing
+NO_BODY_STATUSES = {204, 206, 304}
+
+
+def accepts_gzip(headers: Iterable) -> bool:
+    # q-values of an explicit gzip entry and of the wildcard. An explicit entry
+    # wins over "*" whatever their order, "*;q=0, gzip" still accepts gzip.
+    qualities = {}
+    for name, value in headers:
+        if name != b"accept-encoding":
+            continue
+        for coding in value.decode("latin-1").lower().split(","):
+            token, *params = coding.split(";")
+            token = token.strip()
+            if token not in ("gzip", "*"):
+                continue
+            quality = 1.0
+            for param in params:
+                key, _, number = param.strip().partition("=")
+                if key == "q":
+                    try:
+                        quality = float(number)
+                    except ValueError:
+                        quality = 0.0
+            qualities[token] = quality
+    # gzip;q=0 means the client refuses it
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+# Gzip for allowlisted content types above a size threshold. Pure ASGI like the
+# other middlewares, so streamed bodies (exports) are compressed chunk by chunk
+# with a sync flush instead of being buffered. The start message is held until
+# enough of the body is seen to tell whether it is worth it, tiny responses go
+# out untouched and pay for nothing but that check.
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = Config.COMPRESSION_MIN_SIZE,
+        level: int = Config.COMPRESSION_LEVEL,
+        content_types: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.content_types = frozenset(
+            content_types
+            if content_types is not None
+            else (
+                value.strip()
+                for value in Config.COMPRESSION_CONTENT_TYPES.split(",")
+                if value.strip()
+            )
+        )
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not Config.COMPRESSION_ENABLED
+            or not accepts_gzip(scope["headers"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        responder = GzipResponder(self, send)
+        await self.app(scope, receive, responder.send)
+
+    def eligible(self, message) -> bool:
+        if message["status"] in NO_BODY_STATUSES:
+            return False
+        content_type = None
+        for name, value in message.get("headers", []):
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.decode("latin-1").partition(";")[0].strip()
+        return content_type in self.content_types
+
+
+class GzipResponder:
+    def __init__(self, middleware: CompressionMiddleware, send) -> None:
+        self.middleware = middleware
+        self.downstream = send
+        self.start = None
+        self.buffer = b""
+        # None until decided, then True (compressing) or False (passing through)
+        self.compressing = None
+        self.compressor = None
+
+    async def send(self, message) -> None:
+        kind = message["type"]
+        if kind == "http.response.start":
+            if self.middleware.eligible(message):
+                self.start = message
+            else:
+                self.compressing = False
+                await self.downstream(message)
+            return
+
+        if kind != "http.response.body" or self.compressing is False:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressing is None:
+            self.buffer += body
+            if len(self.buffer) < self.middleware.minimum_size:
+                if more_body:
+                    return
+                # Too small to be worth it, send it as it was
+                self.compressing = False
+                await self.downstream(self.start)
+                await self.downstream(
+                    {"type": "http.response.body", "body": self.buffer}
+                )
+                return
+
+            self.compressing = True
+            body, self.buffer = self.buffer, b""
+            # wbits=31 writes the gzip header and trailer
+            self.compressor = zlib.compressobj(self.middleware.level, zlib.DEFLATED, 31)
+            data = self.compress(body, more_body)
+            # A complete body gets its Content-Length, a stream goes chunked
+            await self.downstream(
+                self.compressed_start(None if more_body else len(data))
+            )
+            await self.downstream(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+            return
+
+        data = self.compress(body, more_body)
+        if data or not more_body:
+            await self.downstream(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        if more_body:
+            # Flush so a streaming client gets each chunk now, not at the end
+            return self.compressor.compress(body) + self.compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+        return self.compressor.compress(body) + self.compressor.flush()
+
+    def compressed_start(self, content_length: Optional[int]) -> dict:
+        headers = []
+        vary = b"Accept-Encoding"
+        for name, value in self.start.get("headers", []):
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary = value + b", Accept-Encoding"
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # The bytes differ from the identity response, so the strong
+                # validator becomes weak. If-None-Match compares weakly anyway.
+                value = b"W/" + value
+            headers.append((name, value))
+        headers.append((b"content-encoding", b"gzip"))
+        headers.append((b"vary", vary))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        return {**self.start, "headers": headers}
@@ -6,6 +6,65 @@ class Settings(BaseSettings):
     JWT_SECRET: str
     JWT_ALGORITHM: str
     REDIS_URL: str
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 1.0  # seconds to wait for a free connection
+    REDIS_CONNECT_TIMEOUT: float = 1.0  # seconds
+    REDIS_SOCKET_TIMEOUT: float = 0.5  # seconds per command
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # seconds, 0 disables
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failures before opening
+    REDIS_BREAKER_RESET_TIMEOUT: float = 10.0  # seconds before a trial call
+    REDIS_DEGRADED_POLICY: str = "fail_closed"  # or "fail_open", for auth checks
+    DB_ECHO: bool = False
+    DB_CREATE_ALL: bool = False  # dev only, create missing tables at startup
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WAIT_WARNING_MS: int = 100
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # 0 disables
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100  # asyncpg only, 0 disables
+    DATABASE_REPLICA_URLS: str = ""  # comma separated read replica DSNs
+    REPLICA_HEALTH_CHECK_INTERVAL: int = 10  # seconds
+    REPLICA_HEALTH_CHECK_TIMEOUT: int = 2  # seconds
+    REPLICA_STICKY_SECONDS: int = 5  # reads stay on the primary after a write
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: str = ""  # bearer token for /metrics, empty means admins only
+    SQL_PROFILER_ENABLED: bool = False  # per query bookkeeping, turn on to investigate
+    SLOW_QUERY_MS: float = 200
+    SLOW_QUERY_LOG_SIZE: int = 100  # entries kept per ring buffer
+    N_PLUS_ONE_THRESHOLD: int = 5  # repeats of a statement shape or relationship load
+    SQL_QUERY_BUDGET: int = 50  # queries per request before warning, 0 disables
+    SQL_QUERY_BUDGET_STRICT: bool = False  # dev/test: fail the request instead
+    EVENT_CACHE_ENABLED: bool = True
+    EVENT_CACHE_TTL: int = 300  # seconds
+    FAST_SERIALIZATION: bool = False  # list routes encode rows without validation
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes, smaller bodies are sent as they are
+    COMPRESSION_LEVEL: int = 1  # gzip level, 1 (fastest) to 9 (smallest)
+    COMPRESSION_CONTENT_TYPES: str = (
+        "application/json,application/x-ndjson,text/csv,text/plain,text/html"
+    )
+    IMPORT_BATCH_SIZE: int = 1000  # rows per INSERT and per transaction
+    IMPORT_MAX_ERRORS: int = 1000  # row errors kept in the import report
+    IMPORT_MAX_LINE_BYTES: int = 1048576  # longer upload lines become row errors
+    RSVP_BATCH_MAX_SIZE: int = 500  # items accepted by one batch RSVP request
+    FLASH_SALE_FLUSH_INTERVAL: float = 1.0  # seconds between write-behind flushes
+    FLASH_SALE_BATCH_SIZE: int = 500  # claimed seats written per INSERT
+    FLASH_SALE_RECONCILE_INTERVAL: float = 30.0  # seconds, rebuilds lost Redis keys
+    WAITLIST_INDEX_TTL: int = 600  # seconds a Redis waitlist rank index lives
+    TOKEN_CACHE_SIZE: int = 10000  # verified tokens kept per worker, 0 disables
+    USER_CACHE_SIZE: int = 10000  # users kept per worker, 0 disables
+    USER_CACHE_TTL: int = 30  # seconds
+    REVOCATION_FILTER_ENABLED: bool = True
+    REVOCATION_FILTER_SIZE: int = 100000  # revoked JTIs kept per worker
+    REVOCATION_SYNC_MAX_LAG: float = 5.0  # seconds without sync before checking Redis
+    REVOCATION_HEARTBEAT_INTERVAL: float = 1.0  # seconds
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # "thread" or "process"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 32  # waiting jobs before rejecting with 503
+    PASSWORD_HASH_RETRY_AFTER: int = 1  # seconds
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
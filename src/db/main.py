@@ -1,12 +1,261 @@
-from sqlmodel import create_engine, text, SQLModel
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import text, SQLModel
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from redis.exceptions import RedisError
+from typing import List, Optional
+import asyncio
+import logging
+import time
 
 from src.config import Config
+from src.cache import TTLCache
+from src.db.redis import redis_manager
 
-# Define async orm engine object
-async_engine = AsyncEngine(create_engine(url=Config.DATABASE_URL, echo=True))
+logger = logging.getLogger(__name__)
+
+
+# Queue pool that keeps track of how long checkouts wait for a free connection
+class MonitoredQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        connection = super()._do_get()
+        waited = time.perf_counter() - started
+
+        self.checkouts += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        if waited * 1000 >= Config.DB_POOL_WAIT_WARNING_MS:
+            self.slow_checkouts += 1
+            logger.warning(
+                "Waited %.0fms for a database connection (%s)",
+                waited * 1000,
+                self.status(),
+            )
+
+        return connection
+
+
+def build_engine(url: str) -> AsyncEngine:
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        connect_args["prepared_statement_cache_size"] = (
+            Config.DB_PREPARED_STATEMENT_CACHE_SIZE
+        )
+        if Config.DB_STATEMENT_TIMEOUT_MS:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(Config.DB_STATEMENT_TIMEOUT_MS)
+            }
+
+    return create_async_engine(
+        url,
+        echo=Config.DB_ECHO,
+        poolclass=MonitoredQueuePool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+def get_pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.sync_engine.pool
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    stats = {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "utilization": round(pool.checkedout() / capacity, 4) if capacity else 0.0,
+    }
+    if isinstance(pool, MonitoredQueuePool):
+        stats.update(
+            {
+                "checkouts": pool.checkouts,
+                "slow_checkouts": pool.slow_checkouts,
+                "avg_wait_ms": (
+                    round(pool.total_wait / pool.checkouts * 1000, 3)
+                    if pool.checkouts
+                    else 0.0
+                ),
+                "max_wait_ms": round(pool.max_wait * 1000, 3),
+            }
+        )
+    return stats
+
+
+def build_session_maker(engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,  # allow to use session after commit
+    )
+
+
+# Define async orm engine object and the session factory shared by every request
+async_engine = build_engine(Config.DATABASE_URL)
+
+async_session_maker = build_session_maker(async_engine)
+
+
+class Replica:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.engine = build_engine(url)
+        self.session_maker = build_session_maker(self.engine)
+        self.healthy = True
+        self.checked_at = 0.0
+        self.checking = False
+
+
+# Spreads read-only sessions over the replicas round-robin. Unhealthy replicas
+# are skipped until a background ping succeeds again, and users who just wrote
+# something read from the primary for a short while so they see their writes.
+# That stickiness lives in Redis so it holds whichever worker serves the next
+# read, the local cache only saves the round trip on the worker that wrote.
+# ReadYourWritesMiddleware holds the response until the Redis write is done.
+class ReplicaRouter:
+    def __init__(self, urls: List[str]) -> None:
+        self.replicas = [Replica(url) for url in urls]
+        self.position = 0
+        self.recent_writers = TTLCache(
+            maxsize=100000, ttl=Config.REPLICA_STICKY_SECONDS
+        )
+        self.health_checks = set()
+        self.sticky_writes = set()
+
+    def pick(self) -> Optional[Replica]:
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self.position % len(self.replicas)]
+            self.position += 1
+            self.schedule_health_check(replica)
+            if replica.healthy:
+                return replica
+        return None  # No healthy replica, the primary serves the read
+
+    def sticky_key(self, user_uid: str) -> str:
+        return f"replica:sticky:{user_uid}"
+
+    def remember_write(self, request: Request, user_uid: str) -> None:
+        # Called from the sync after_commit hook, inside the event loop, so the
+        # Redis write runs as a task. The request keeps it for the middleware
+        # to await before the response starts.
+        self.recent_writers.set(user_uid, True)
+        task = asyncio.get_running_loop().create_task(self.share_write(user_uid))
+        self.sticky_writes.add(task)
+        task.add_done_callback(self.sticky_writes.discard)
+        request.state.sticky_writes = [
+            *getattr(request.state, "sticky_writes", []),
+            task,
+        ]
+
+    async def share_write(self, user_uid: str) -> None:
+        try:
+            await redis_manager.client.set(
+                self.sticky_key(user_uid), 1, ex=Config.REPLICA_STICKY_SECONDS
+            )
+        except RedisError as error:
+            logger.warning("Could not share read-your-writes stickiness: %s", error)
+
+    async def sticks_to_primary(self, user_uid: Optional[str]) -> bool:
+        if user_uid is None:
+            return False
+        if user_uid in self.recent_writers:
+            return True
+        try:
+            return bool(await redis_manager.client.exists(self.sticky_key(user_uid)))
+        except RedisError:
+            # Without Redis a replica may lag behind the user's last write,
+            # still better than moving every read onto the primary
+            return False
+
+    def mark_unhealthy(self, replica: Replica) -> None:
+        if replica.healthy:
+            logger.warning("Read replica %s marked unhealthy", replica.engine.url)
+        replica.healthy = False
+        replica.checked_at = time.monotonic()
+
+    def schedule_health_check(self, replica: Replica) -> None:
+        due = (
+            time.monotonic() - replica.checked_at
+            >= Config.REPLICA_HEALTH_CHECK_INTERVAL
+        )
+        if due and not replica.checking:
+            replica.checking = True
+            task = asyncio.create_task(self.check_health(replica))
+            self.health_checks.add(task)
+            task.add_done_callback(self.health_checks.discard)
+
+    async def check_health(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as conn:
+                await asyncio.wait_for(
+                    conn.execute(text("SELECT 1")),
+                    timeout=Config.REPLICA_HEALTH_CHECK_TIMEOUT,
+                )
+            if not replica.healthy:
+                logger.warning("Read replica %s is healthy again", replica.engine.url)
+            replica.healthy = True
+        except (DBAPIError, OSError, asyncio.TimeoutError):
+            self.mark_unhealthy(replica)
+        finally:
+            replica.checking = False
+            replica.checked_at = time.monotonic()
+
+
+replica_router = ReplicaRouter(
+    [url.strip() for url in Config.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+)
+
+
+def request_user_uid(request: Request) -> Optional[str]:
+    # Set by the auth dependencies once the bearer token is verified, the
+    # routes resolve them before their session
+    return getattr(request.state, "user_uid", None)
+
+
+@event.listens_for(Session, "after_commit")
+def remember_writer(session: Session) -> None:
+    request = session.info.get("request")
+    user_uid = request_user_uid(request) if request is not None else None
+    if user_uid is not None:
+        replica_router.remember_write(request, user_uid)
+
+
+# Holds the response start until the commits of the request are shared as
+# stickiness, so the user's next read, on any worker, goes to the primary
+class ReadYourWritesMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # request.state lives in the scope
+                tasks = scope.get("state", {}).pop("sticky_writes", None)
+                if tasks:
+                    await asyncio.gather(*tasks)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 
 # This function handle the initialize start of db
@@ -19,12 +268,39 @@ async def init_db():
 
 
 # Dependency injection to create session accross all routes
-async def get_session() -> AsyncSession:
-    Session = sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,  # allow to use session after commit
-    )
-
-    async with Session() as session:
+async def get_session(request: Request) -> AsyncSession:
+    async with async_session_maker() as session:
+        if replica_router.replicas:
+            # Lets a commit pin this user's following reads to the primary.
+            # The user is looked up at commit time, after the token checks.
+            session.info["request"] = request
         yield session
+
+
+async def pick_read_replica(request: Request) -> Optional[Replica]:
+    if not replica_router.replicas or await replica_router.sticks_to_primary(
+        request_user_uid(request)
+    ):
+        return None
+    return replica_router.pick()
+
+
+# Session factory for reads that outlive the request dependencies (streaming)
+async def read_session_maker(request: Request) -> async_sessionmaker:
+    replica = await pick_read_replica(request)
+    return replica.session_maker if replica else async_session_maker
+
+
+# Session for read-only routes, served by a replica when one is configured
+async def get_read_session(request: Request) -> AsyncSession:
+    replica = await pick_read_replica(request)
+
+    session_maker = replica.session_maker if replica else async_session_maker
+    async with session_maker() as session:
+        try:
+            yield session
+        except (DBAPIError, OSError) as error:
+            lost_connection = isinstance(error, OSError) or error.connection_invalidated
+            if replica is not None and lost_connection:
+                replica_router.mark_unhealthy(replica)
+            raise
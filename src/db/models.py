@@ -1,9 +1,29 @@
 from sqlmodel import SQLModel, Column, Field, Relationship
+from sqlalchemy import (
+    Index,
+    Computed,
+    UniqueConstraint,
+    Identity,
+    ForeignKey,
+    CheckConstraint,
+    DDL,
+    event,
+    text,
+)
 import sqlalchemy.dialects.postgresql as pg
 import uuid
 from datetime import datetime
 from typing import Optional, List
 
+from src.events.geo import GEOHASH_FUNCTION_SQL, GEOHASH_PRECISION
+
+# Text search configuration shared by the generated column and the search queries
+SEARCH_CONFIG = "english"
+
+# Half-open period of a scheduled event. Queries must spell the range exactly
+# like this, with the bounds as a literal, to be matched to its GiST index.
+EVENT_PERIOD_SQL = "tstzrange(starts_at, ends_at, '[)')"
+
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
@@ -33,6 +53,46 @@ class User(SQLModel, table=True):
 
 class Event(SQLModel, table=True):
     __tablename__ = "events"
+    __table_args__ = (
+        # Backs the (created_at, uid) keyset pagination of the events listing
+        Index("ix_events_created_at_uid", "created_at", "uid"),
+        Index("ix_events_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_events_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_events_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+        # Upcoming and between filters, in schedule order
+        Index("ix_events_starts_at_uid", "starts_at", "uid"),
+        # Overlap and happening-now filters
+        Index("ix_events_period", text(EVENT_PERIOD_SQL), postgresql_using="gist"),
+        # Exact match filters, still ordered by start
+        Index("ix_events_category_starts_at", "category", "starts_at"),
+        Index("ix_events_location_starts_at", "location", "starts_at"),
+        Index("ix_events_creator_starts_at", "creator", "starts_at"),
+        CheckConstraint(
+            "(starts_at IS NULL) = (ends_at IS NULL) AND ends_at >= starts_at",
+            name="ck_events_schedule",
+        ),
+        # Nearby search, a cell is a prefix so its events are one range scan.
+        # The "C" collation keeps the byte order the prefix ranges rely on.
+        Index("ix_events_geohash", "geohash"),
+        CheckConstraint(
+            "(latitude IS NULL) = (longitude IS NULL) "
+            "AND latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180",
+            name="ck_events_coordinates",
+        ),
+    )
+    # The search vector and the geohash are maintained by Postgres and only
+    # used inside queries, so keep them out of the mapper and never load them
+    __mapper_args__ = {"exclude_properties": ["search_vector", "geohash"]}
     uid: uuid.UUID = Field(
         sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4)
     )
@@ -43,8 +103,61 @@ class Event(SQLModel, table=True):
     location: str
     category: str
     capacity: int
+    # Denormalized number of RSVPs, only changed together with the rsvps rows
+    rsvp_count: int = Field(
+        default=0, sa_column=Column(pg.INTEGER, nullable=False, server_default="0")
+    )
+    # Reservations go through Redis seat counters instead, see src/rsvp/flash_sale.py
+    flash_sale: bool = Field(
+        default=False,
+        sa_column=Column(pg.BOOLEAN, nullable=False, server_default="false"),
+    )
+    # Unscheduled events have neither, the time filters skip them
+    starts_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(pg.TIMESTAMP(timezone=True), nullable=True)
+    )
+    ends_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(pg.TIMESTAMP(timezone=True), nullable=True)
+    )
+    # IANA name the event is held in, for display in local time
+    timezone: str = Field(
+        default="UTC",
+        sa_column=Column(pg.VARCHAR, nullable=False, server_default="UTC"),
+    )
+    # WGS84 degrees, events without a venue on the map have neither
+    latitude: Optional[float] = Field(
+        default=None, sa_column=Column(pg.DOUBLE_PRECISION, nullable=True)
+    )
+    longitude: Optional[float] = Field(
+        default=None, sa_column=Column(pg.DOUBLE_PRECISION, nullable=True)
+    )
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
-    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+    # Bumped by every UPDATE of the row, including the rsvp_count changes of
+    # reservations and cancellations. Backs the ETag and Last-Modified headers.
+    updated_at: datetime = Field(
+        sa_column=Column(pg.TIMESTAMP, default=datetime.now, onupdate=datetime.now)
+    )
+    search_vector: Optional[str] = Field(
+        default=None,
+        sa_column=Column(
+            pg.TSVECTOR,
+            Computed(
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+                persisted=True,
+            ),
+        ),
+    )
+    geohash: Optional[str] = Field(
+        default=None,
+        sa_column=Column(
+            pg.VARCHAR(GEOHASH_PRECISION, collation="C"),
+            Computed(
+                f"geohash_encode(latitude, longitude, {GEOHASH_PRECISION})",
+                persisted=True,
+            ),
+        ),
+    )
     rsvps: Optional[List["RSVP"]] = Relationship(
         back_populates="event", sa_relationship_kwargs={"lazy": "selectin"}
     )
@@ -52,12 +165,18 @@ class Event(SQLModel, table=True):
     def __repr__(self) -> str:
         return f"<Event {self.title}>"
 
-    def rsvp_count(self) -> int:
-        return len(self.rsvps)
+
+# The generated geohash column calls this function, create_all needs it first
+event.listen(Event.__table__, "before_create", DDL(GEOHASH_FUNCTION_SQL))
 
 
 class RSVP(SQLModel, table=True):
     __tablename__ = "rsvps"
+    __table_args__ = (
+        UniqueConstraint("event_uid", "user_uid", name="uq_rsvps_event_user"),
+        # Lists the RSVPs of a user and computes their ETag version
+        Index("ix_rsvps_user_uid_uid", "user_uid", "uid"),
+    )
     uid: uuid.UUID = Field(
         sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4)
     )
@@ -71,3 +190,30 @@ class RSVP(SQLModel, table=True):
 
     def __repr__(self) -> str:
         return f"<RSVP user_uid={self.user_uid}, event_uid={self.event_uid}>"
+
+
+# Users waiting for a seat on a full event. position is a global, ever growing
+# ticket number, so ordering by it inside one event gives the queue order.
+class WaitlistEntry(SQLModel, table=True):
+    __tablename__ = "waitlist_entries"
+    __table_args__ = (
+        UniqueConstraint("event_uid", "user_uid", name="uq_waitlist_event_user"),
+        # Serves both the head lookup on promotion and the position count
+        Index("ix_waitlist_event_position", "event_uid", "position"),
+    )
+    uid: uuid.UUID = Field(
+        sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4)
+    )
+    event_uid: uuid.UUID = Field(
+        sa_column=Column(
+            pg.UUID, ForeignKey("events.uid", ondelete="CASCADE"), nullable=False
+        )
+    )
+    user_uid: uuid.UUID = Field(nullable=False, foreign_key="users.uid")
+    position: Optional[int] = Field(
+        default=None, sa_column=Column(pg.BIGINT, Identity(), nullable=False)
+    )
+    created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+
+    def __repr__(self) -> str:
+        return f"<WaitlistEntry user_uid={self.user_uid}, event_uid={self.event_uid}>"
@@ -0,0 +1,336 @@
+import hashlib
+import logging
+import re
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.cache import TTLCache
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Statement shapes that differ only in literals or IN list length share a
+# fingerprint. Bound parameters of every paramstyle become "?".
+NORMALIZE_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\$\d+|%\(\w+\)s|(?<!:):\w+\b|%s"), "?"),
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b"), "?"),
+    # asyncpg casts its parameters, "$1::UUID" is still just a parameter
+    (
+        re.compile(
+            r"\?::(?:TIME(?:STAMP)? WITH(?:OUT)? TIME ZONE|DOUBLE PRECISION|\w+)"
+            r"(?:\[\])?"
+        ),
+        "?",
+    ),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+# Raised by a query that goes over the budget of its request in strict mode
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class RequestProfile:
+    __slots__ = (
+        "request_id",
+        "scope",
+        "queries",
+        "seconds",
+        "fingerprints",
+        "relationships",
+    )
+
+    def __init__(self, request_id: str, scope: Optional[dict]) -> None:
+        self.request_id = request_id
+        self.scope = scope
+        self.queries = 0
+        self.seconds = 0.0
+        self.fingerprints: Dict[str, int] = {}
+        self.relationships: Dict[str, int] = {}
+
+    @property
+    def route(self) -> str:
+        if self.scope is None:
+            return "background"
+        route = self.scope.get("route")
+        path = getattr(route, "path_format", None) or self.scope.get("path", "")
+        return f"{self.scope.get('method', '')} {path}"
+
+
+# Query being profiled for the current request, set by ProfilerMiddleware
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+    "current_profile", default=None
+)
+
+
+# Cursor event profiler. Attributes every query to the request that ran it,
+# keeps per-fingerprint totals, a ring buffer of slow queries and one of N+1
+# suspects. A suspect is the same fingerprint repeated many times within one
+# request, or the same relationship loaded many times: a selectin load of
+# Event.rsvps per event fetched in a loop, whatever its IN list looked like.
+class SQLProfiler:
+    def __init__(
+        self,
+        enabled: bool,
+        slow_ms: float,
+        log_size: int,
+        n_plus_one_threshold: int,
+        budget: int,
+        strict: bool,
+    ) -> None:
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.budget = budget
+        self.strict = strict
+        self.slow_queries: deque = deque(maxlen=log_size)
+        self.n_plus_one: deque = deque(maxlen=log_size)
+        self.over_budget: deque = deque(maxlen=log_size)
+        self.totals: Dict[str, dict] = {}
+        # Raw statement -> fingerprint, statements repeat so normalize them once
+        self.fingerprints = TTLCache(maxsize=2000)
+
+    def fingerprint(self, statement: str) -> Tuple[str, str]:
+        cached = self.fingerprints.get(statement)
+        if cached is not None:
+            return cached
+
+        normalized = statement
+        for pattern, replacement in NORMALIZE_PATTERNS:
+            normalized = pattern.sub(replacement, normalized)
+        normalized = normalized.strip()
+        fingerprint = (hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized)
+        self.fingerprints.set(statement, fingerprint)
+        return fingerprint
+
+    def before_query(self) -> None:
+        profile = current_profile.get()
+        if (
+            self.strict
+            and self.budget
+            and profile is not None
+            and profile.queries >= self.budget
+        ):
+            raise QueryBudgetExceeded(
+                f"{profile.route} ran more than {self.budget} queries "
+                f"(request {profile.request_id})"
+            )
+
+    def after_query(self, context, statement: str, elapsed: float) -> None:
+        fingerprint, normalized = self.fingerprint(statement)
+        profile = current_profile.get()
+
+        totals = self.totals.get(fingerprint)
+        if totals is None:
+            if len(self.totals) >= self.fingerprints.maxsize:
+                # Keep the table bounded, the rarest shape makes room
+                del self.totals[min(self.totals, key=lambda k: self.totals[k]["calls"])]
+            totals = self.totals[fingerprint] = {
+                "fingerprint": fingerprint,
+                "statement": normalized[:500],
+                "calls": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+            }
+        totals["calls"] += 1
+        totals["total_ms"] += elapsed * 1000
+        totals["max_ms"] = max(totals["max_ms"], elapsed * 1000)
+
+        route = profile.route if profile is not None else "background"
+        request_id = profile.request_id if profile is not None else None
+
+        if elapsed >= self.slow_seconds:
+            self.slow_queries.append(
+                {
+                    "at": datetime.now().isoformat(),
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "fingerprint": fingerprint,
+                    "statement": normalized[:500],
+                    "route": route,
+                    "request_id": request_id,
+                }
+            )
+            logger.warning(
+                "Slow query %.0fms on %s [%s]: %s",
+                elapsed * 1000,
+                route,
+                request_id,
+                normalized[:200],
+            )
+
+        if profile is None:
+            return
+        profile.queries += 1
+        profile.seconds += elapsed
+        repeats = profile.fingerprints.get(fingerprint, 0) + 1
+        profile.fingerprints[fingerprint] = repeats
+        # Flag once per request, when the repetition count is first reached
+        if repeats == self.n_plus_one_threshold:
+            self.n_plus_one.append(
+                {
+                    "at": datetime.now().isoformat(),
+                    "fingerprint": fingerprint,
+                    "statement": normalized[:500],
+                    "route": route,
+                    "request_id": request_id,
+                }
+            )
+            logger.warning(
+                "Possible N+1 on %s [%s]: %s repeated %s times",
+                route,
+                request_id,
+                normalized[:200],
+                repeats,
+            )
+
+    def relationship_load(self, relationship: str) -> None:
+        profile = current_profile.get()
+        if profile is None:
+            return
+        loads = profile.relationships.get(relationship, 0) + 1
+        profile.relationships[relationship] = loads
+        if loads == self.n_plus_one_threshold:
+            self.n_plus_one.append(
+                {
+                    "at": datetime.now().isoformat(),
+                    "relationship": relationship,
+                    "route": profile.route,
+                    "request_id": profile.request_id,
+                }
+            )
+            logger.warning(
+                "Possible N+1 on %s [%s]: %s loaded %s times",
+                profile.route,
+                profile.request_id,
+                relationship,
+                loads,
+            )
+
+    def finish(self, profile: RequestProfile) -> None:
+        if self.budget and profile.queries > self.budget:
+            self.over_budget.append(
+                {
+                    "at": datetime.now().isoformat(),
+                    "route": profile.route,
+                    "request_id": profile.request_id,
+                    "queries": profile.queries,
+                    "budget": self.budget,
+                }
+            )
+            logger.warning(
+                "%s ran %s queries, budget is %s [%s]",
+                profile.route,
+                profile.queries,
+                self.budget,
+                profile.request_id,
+            )
+
+    def report(self, limit: int = 20) -> dict:
+        top = sorted(self.totals.values(), key=lambda t: t["total_ms"], reverse=True)
+        return {
+            "enabled": self.enabled,
+            "slow_query_ms": self.slow_seconds * 1000,
+            "query_budget": self.budget,
+            "strict": self.strict,
+            "slow_queries": list(self.slow_queries)[-limit:],
+            "n_plus_one": list(self.n_plus_one)[-limit:],
+            "over_budget": list(self.over_budget)[-limit:],
+            "top_fingerprints": [
+                {
+                    **totals,
+                    "total_ms": round(totals["total_ms"], 3),
+                    "max_ms": round(totals["max_ms"], 3),
+                }
+                for totals in top[:limit]
+            ],
+        }
+
+
+profiler = SQLProfiler(
+    enabled=Config.SQL_PROFILER_ENABLED,
+    slow_ms=Config.SLOW_QUERY_MS,
+    log_size=Config.SLOW_QUERY_LOG_SIZE,
+    n_plus_one_threshold=Config.N_PLUS_ONE_THRESHOLD,
+    budget=Config.SQL_QUERY_BUDGET,
+    strict=Config.SQL_QUERY_BUDGET_STRICT,
+)
+
+
+# (context, statement, seconds) callbacks fed by the one timer below. Every
+# cursor listener costs on every query, so the metrics and the profiler share
+# a single pair instead of each timing the query again.
+query_observers: List[Callable[[Any, str, float], None]] = []
+if profiler.enabled:
+    query_observers.append(profiler.after_query)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not query_observers:
+        return
+    if profiler.enabled:
+        profiler.before_query()
+    context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    for observer in query_observers:
+        observer(context, statement, elapsed)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def profile_relationship_load(state) -> None:
+    # Selectin and lazy loads name the relationship they fill, e.g. Event.rsvps
+    if profiler.enabled and state.is_relationship_load:
+        path = state.loader_strategy_path
+        profiler.relationship_load(str(path.prop) if path is not None else "?")
+
+
+# Opens a profile per HTTP request and hands out the request id, taken from an
+# incoming X-Request-ID header when there is one
+class ProfilerMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        profile = RequestProfile(request_id, scope)
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            profiler.finish(profile)
@@ -1,18 +1,483 @@
+import asyncio
+import bisect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import (
+    ConnectionError as RedisConnectionError,
+    RedisError,
+    TimeoutError as RedisTimeoutError,
+)
 from src.config import Config
 
+logger = logging.getLogger(__name__)
+
 JTI_EXPIRY = 3600
 
-# URL-based connection
-token_blacklist = redis.from_url(Config.REDIS_URL, decode_responses=True)
+# Revoked JTIs with their expiry as score, read when a worker (re)joins the sync
+REVOKED_KEY = "auth:revoked"
+REVOKED_CHANNEL = "auth:revoked"
+# Longest wait between checks while the revoked set is too large for the filter
+REVOCATION_OVERFLOW_BACKOFF = 60.0
+
+# Upper bounds of the latency buckets, in milliseconds
+LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Errors that say Redis is unreachable or too slow, as opposed to a bad command
+UNAVAILABLE_ERRORS = (
+    RedisConnectionError,
+    RedisTimeoutError,
+    OSError,
+    asyncio.TimeoutError,
+)
+
+
+# Raised without touching the network while the circuit breaker is open. It is a
+# ConnectionError, so every "except RedisError" fallback also covers it.
+class RedisUnavailable(RedisConnectionError):
+    pass
+
+
+# Closed: calls go through. After failure_threshold consecutive failures the
+# breaker opens and calls fail fast. After reset_timeout one trial call is let
+# through (half open), its outcome closes or reopens the breaker.
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+        if self.trial_running:
+            return False
+        self.trial_running = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_running = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning("Redis circuit breaker opened")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+# Per command latency histogram, kept in process and cheap enough for every call
+class RedisMetrics:
+    def __init__(self) -> None:
+        self.commands: Dict[str, dict] = {}
+        self.rejected = 0
+
+    def observe(self, command: str, seconds: float, failed: bool) -> None:
+        entry = self.commands.get(command)
+        if entry is None:
+            entry = self.commands[command] = {
+                "calls": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        elapsed_ms = seconds * 1000
+        entry["calls"] += 1
+        entry["errors"] += failed
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["buckets"][bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def quantile(self, buckets: List[int], calls: int, q: float) -> Optional[float]:
+        # Upper bound of the bucket holding the quantile, None past the last one
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, buckets):
+            seen += count
+            if seen >= q * calls:
+                return bound
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            "rejected": self.rejected,
+            "commands": {
+                command: {
+                    "calls": entry["calls"],
+                    "errors": entry["errors"],
+                    "avg_ms": round(entry["total_ms"] / entry["calls"], 3),
+                    "max_ms": round(entry["max_ms"], 3),
+                    "p50_ms": self.quantile(entry["buckets"], entry["calls"], 0.5),
+                    "p99_ms": self.quantile(entry["buckets"], entry["calls"], 0.99),
+                }
+                for command, entry in self.commands.items()
+            },
+        }
+
+
+class ManagedPipeline(Pipeline):
+    def __init__(self, manager: "RedisManager", *args) -> None:
+        super().__init__(*args)
+        self.manager = manager
+
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        execute = super().execute
+        return await self.manager.guard("PIPELINE", lambda: execute(raise_on_error))
+
+
+# Every command and pipeline goes through the manager's breaker and metrics.
+# Pub/sub connections are long lived and handle their own failures.
+class ManagedRedis(redis.Redis):
+    def __init__(self, manager: "RedisManager", **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.manager = manager
+
+    async def execute_command(self, *args, **options):
+        execute_command = super().execute_command
+        return await self.manager.guard(
+            str(args[0]).upper(), lambda: execute_command(*args, **options)
+        )
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: Optional[str] = None
+    ) -> ManagedPipeline:
+        return ManagedPipeline(
+            self.manager,
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint,
+        )
+
+
+# A Lua script that follows the manager to whatever client is current
+class ManagedScript:
+    def __init__(self, manager: "RedisManager", text: str) -> None:
+        self.manager = manager
+        self.text = text
+        self.owner = None
+        self.script = None
+
+    async def __call__(self, keys: Iterable[str] = (), args: Iterable[Any] = ()):
+        client = self.manager.client
+        if self.owner is not client:
+            self.script, self.owner = client.register_script(self.text), client
+        return await self.script(keys=list(keys), args=list(args))
+
+
+# Owns the Redis connection pool. The app lifespan starts and closes it, scripts
+# and benchmarks that skip the lifespan get a client on first use.
+class RedisManager:
+    def __init__(
+        self,
+        url: str,
+        max_connections: int,
+        pool_timeout: float,
+        connect_timeout: float,
+        socket_timeout: float,
+        health_check_interval: int,
+        breaker: CircuitBreaker,
+        degraded_policy: str,
+    ) -> None:
+        self.url = url
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.connect_timeout = connect_timeout
+        self.socket_timeout = socket_timeout
+        self.health_check_interval = health_check_interval
+        self.breaker = breaker
+        self.degraded_policy = degraded_policy
+        self.metrics = RedisMetrics()
+        # Extra (command, seconds, failed) callbacks, e.g. for exporters
+        self.observers: List[Callable[[str, float, bool], None]] = []
+        self._client: Optional[ManagedRedis] = None
+
+    @property
+    def client(self) -> ManagedRedis:
+        if self._client is None:
+            self._client = self.create_client()
+        return self._client
+
+    def create_client(self) -> ManagedRedis:
+        # Callers wait up to pool_timeout for a free connection instead of
+        # opening an unbounded number of them
+        pool = redis.BlockingConnectionPool.from_url(
+            self.url,
+            max_connections=self.max_connections,
+            timeout=self.pool_timeout,
+            socket_connect_timeout=self.connect_timeout,
+            socket_timeout=self.socket_timeout,
+            health_check_interval=self.health_check_interval,
+            decode_responses=True,
+        )
+        return ManagedRedis(self, connection_pool=pool)
+
+    def register_script(self, text: str) -> ManagedScript:
+        return ManagedScript(self, text)
+
+    async def start(self) -> None:
+        try:
+            await self.client.ping()
+        except RedisError as error:
+            # Not fatal, every caller has a degraded path
+            logger.warning("Redis is not reachable at startup: %s", error)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def guard(self, command: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.breaker.allow():
+            self.metrics.rejected += 1
+            raise RedisUnavailable("Redis circuit breaker is open")
+
+        started = time.perf_counter()
+        failed = False
+        try:
+            result = await call()
+        except UNAVAILABLE_ERRORS:
+            failed = True
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            # Says nothing about Redis, only frees the half open trial
+            failed = True
+            self.breaker.trial_running = False
+            raise
+        except Exception:
+            # An error reply, Redis itself is reachable
+            failed = True
+            self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe(command, elapsed, failed)
+            for observer in self.observers:
+                observer(command, elapsed, failed)
+
+    def fail_open(self) -> bool:
+        # What security checks assume while Redis cannot answer
+        return self.degraded_policy == "fail_open"
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return await self.client.mget(keys) if keys else []
+
+    async def set_many(self, values: Dict[str, Any], ex: Optional[int] = None) -> None:
+        if not values:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(key, value, ex=ex)
+            await pipe.execute()
+
+    async def delete_many(self, keys: List[str]) -> int:
+        return await self.client.delete(*keys) if keys else 0
+
+    def stats(self) -> dict:
+        pool = self._client.connection_pool if self._client is not None else None
+        return {
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+            },
+            "pool": {
+                "max_connections": self.max_connections,
+                # Private attributes of redis-py, read defensively
+                "idle": len(getattr(pool, "_available_connections", ())),
+                "in_use": len(getattr(pool, "_in_use_connections", ())),
+            },
+            **self.metrics.snapshot(),
+        }
+
+
+redis_manager = RedisManager(
+    Config.REDIS_URL,
+    max_connections=Config.REDIS_MAX_CONNECTIONS,
+    pool_timeout=Config.REDIS_POOL_TIMEOUT,
+    connect_timeout=Config.REDIS_CONNECT_TIMEOUT,
+    socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+    health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+    breaker=CircuitBreaker(
+        Config.REDIS_BREAKER_FAILURE_THRESHOLD, Config.REDIS_BREAKER_RESET_TIMEOUT
+    ),
+    degraded_policy=Config.REDIS_DEGRADED_POLICY,
+)
+
+
+# Per-worker copy of the revoked JTIs, kept current through Redis pub/sub so
+# the revocation check of a request needs no network round trip. It is only
+# trusted while the subscription is provably live: the listener pings through
+# its own connection and a missing answer, a reconnect or an overflowing set
+# sends every check back to Redis until the copy is rebuilt.
+class RevocationFilter:
+    def __init__(self, manager, max_size: int, max_lag: float, heartbeat: float):
+        self.manager = manager
+        self.max_size = max_size
+        self.max_lag = max_lag
+        self.heartbeat = heartbeat
+        self.revoked: Dict[str, float] = {}
+        self.synced = False
+        self.last_seen = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def client(self) -> ManagedRedis:
+        return self.manager.client
+
+    def is_fresh(self) -> bool:
+        return self.synced and time.monotonic() - self.last_seen < self.max_lag
+
+    def add(self, jti: str, expires_at: float) -> None:
+        if len(self.revoked) >= self.max_size:
+            self.purge()
+        if len(self.revoked) >= self.max_size:
+            # Dropping an entry would let a revoked token through
+            logger.warning("Revocation filter is full, checking Redis instead")
+            self.synced = False
+            return
+        self.revoked[jti] = expires_at
+
+    def contains(self, jti: str) -> bool:
+        expires_at = self.revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def purge(self) -> None:
+        now = time.time()
+        self.revoked = {
+            jti: expires_at
+            for jti, expires_at in self.revoked.items()
+            if expires_at > now
+        }
+
+    async def live_count(self) -> int:
+        # ZCOUNT is O(log n), unlike the full load it stands in front of
+        return await self.client.zcount(REVOKED_KEY, time.time(), "+inf")
+
+    async def load(self) -> None:
+        now = time.time()
+        await self.client.zremrangebyscore(REVOKED_KEY, "-inf", now)
+        entries = await self.client.zrangebyscore(
+            REVOKED_KEY, now, "+inf", withscores=True
+        )
+        self.revoked = {}
+        for jti, expires_at in entries:
+            self.add(jti, expires_at)
+
+    async def listen(self) -> None:
+        pubsub = self.client.pubsub()
+        try:
+            # Subscribe before loading, a revocation in between is not missed
+            await pubsub.subscribe(REVOKED_CHANNEL)
+            await self.load()
+            self.synced = len(self.revoked) < self.max_size
+            self.last_seen = time.monotonic()
+            last_ping = 0.0
+
+            while True:
+                if time.monotonic() - last_ping >= self.heartbeat:
+                    await pubsub.ping()
+                    last_ping = time.monotonic()
+
+                if not self.synced:
+                    # The filter overflowed, start over from a fresh load
+                    return
+
+                message = await pubsub.get_message(timeout=self.heartbeat)
+                if message is None:
+                    continue
+                self.last_seen = time.monotonic()
+                if message["type"] == "message":
+                    self.add(message["data"], time.time() + JTI_EXPIRY)
+        finally:
+            self.synced = False
+            await pubsub.aclose()
+
+    async def run(self) -> None:
+        delay = self.heartbeat
+        while True:
+            try:
+                live = await self.live_count()
+                if live < self.max_size:
+                    started = time.monotonic()
+                    await self.listen()
+                    if time.monotonic() - started > REVOCATION_OVERFLOW_BACKOFF:
+                        # Held for long, a new overflow starts a new backoff
+                        delay = self.heartbeat
+                else:
+                    logger.warning(
+                        "%d revoked tokens do not fit the revocation filter, "
+                        "checking Redis",
+                        live,
+                    )
+                # listen only returns once the filter overflowed. Stay on Redis
+                # and back off, rather than reloading the whole set every beat.
+                delay = min(delay * 2, REVOCATION_OVERFLOW_BACKOFF)
+            except (RedisError, OSError) as error:
+                logger.warning("Revocation sync lost, checking Redis: %s", error)
+                delay = self.heartbeat
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+revocation_filter = RevocationFilter(
+    redis_manager,
+    max_size=Config.REVOCATION_FILTER_SIZE,
+    max_lag=Config.REVOCATION_SYNC_MAX_LAG,
+    heartbeat=Config.REVOCATION_HEARTBEAT_INTERVAL,
+)
 
 
 # Add JTI to blacklist with expiration time
 async def add_jti_to_blacklist(jti: str) -> None:
-    await token_blacklist.set(name=jti, value="", ex=JTI_EXPIRY)
+    expires_at = time.time() + JTI_EXPIRY
+    async with redis_manager.client.pipeline(transaction=True) as pipe:
+        pipe.set(name=jti, value="", ex=JTI_EXPIRY)
+        pipe.zadd(REVOKED_KEY, {jti: expires_at})
+        pipe.publish(REVOKED_CHANNEL, jti)
+        await pipe.execute()
+    if Config.REVOCATION_FILTER_ENABLED:
+        revocation_filter.add(jti, expires_at)
 
 
 # Check if JTI is in blacklist
 async def token_in_blacklist(jti: str) -> bool:
-    jti_value = await token_blacklist.get(jti)
+    if Config.REVOCATION_FILTER_ENABLED and revocation_filter.is_fresh():
+        return revocation_filter.contains(jti)
+
+    try:
+        jti_value = await redis_manager.client.get(jti)
+    except RedisError as error:
+        # By default fail closed, a token that cannot be checked is revoked
+        logger.warning("Token revocation check failed: %s", error)
+        return not redis_manager.fail_open()
     return jti_value is not None
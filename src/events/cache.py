@@ -0,0 +1,138 @@
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from redis.exceptions import RedisError
+
+from src.config import Config
+from src.db.redis import redis_manager
+from src.responses import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+LIST_VERSION_KEY = "events:version:list"
+
+
+def normalize_uid(event_uid) -> Optional[str]:
+    # One key per event however its uid was spelled (case, dashes, braces),
+    # None for strings that cannot name an event at all
+    try:
+        return str(uuid.UUID(str(event_uid)))
+    except ValueError:
+        return None
+
+
+# Read-through cache for event payloads. Every entry is stored under the current
+# version of what it depends on (the event itself, or the whole listing). Writers
+# bump the version after their commit, so a reader that loaded old data before
+# the bump can only store it under a version nobody reads anymore.
+class EventCache:
+    def __init__(self, manager, ttl: int, enabled: bool = True) -> None:
+        self.manager = manager
+        self.ttl = ttl
+        self.enabled = enabled
+        # Versions must outlive the entries written under them
+        self.version_ttl = max(ttl * 10, 86400)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def client(self):
+        return self.manager.client
+
+    def event_version_key(self, event_uid: str) -> str:
+        return f"events:version:{event_uid}"
+
+    async def get_event(
+        self, event_uid: str, load: Callable[[], Awaitable[Optional[dict]]]
+    ) -> Optional[dict]:
+        event_uid = normalize_uid(event_uid)
+        if event_uid is None:
+            return await load()
+        return await self.read_through(
+            self.event_version_key(event_uid), f"events:item:{event_uid}", load
+        )
+
+    async def get_event_page(
+        self,
+        cursor: Optional[str],
+        limit: int,
+        load: Callable[[], Awaitable[dict]],
+    ) -> dict:
+        return await self.read_through(
+            LIST_VERSION_KEY, f"events:list:{cursor or ''}:{limit}", load
+        )
+
+    async def invalidate_event(self, event_uid: str) -> None:
+        # An event change is visible in its own entry and in every listing page
+        await self.invalidate_events([event_uid])
+
+    async def invalidate_events(self, event_uids) -> None:
+        uids = filter(None, map(normalize_uid, event_uids))
+        keys = [self.event_version_key(event_uid) for event_uid in uids]
+        await self.bump(*keys, LIST_VERSION_KEY)
+
+    async def invalidate_lists(self) -> None:
+        await self.bump(LIST_VERSION_KEY)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    async def read_through(
+        self, version_key: str, key: str, load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        if not self.enabled:
+            return await load()
+
+        try:
+            version = await self.client.get(version_key) or "0"
+            cached = await self.client.get(f"{key}:v{version}")
+        except RedisError as error:
+            # The cache is an optimization, never fail a read because of it
+            self.errors += 1
+            logger.warning("Event cache read failed: %s", error)
+            return await load()
+
+        if cached is not None:
+            self.hits += 1
+            return loads(cached)
+
+        self.misses += 1
+        payload = await load()
+
+        if payload is not None:
+            try:
+                await self.client.set(f"{key}:v{version}", dumps(payload), ex=self.ttl)
+            except RedisError as error:
+                self.errors += 1
+                logger.warning("Event cache write failed: %s", error)
+
+        return payload
+
+    async def bump(self, *version_keys: str) -> None:
+        if not self.enabled:
+            return
+
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for version_key in version_keys:
+                    pipe.incr(version_key)
+                    pipe.expire(version_key, self.version_ttl)
+                await pipe.execute()
+        except RedisError as error:
+            # Entries left behind will still expire after their TTL
+            self.errors += 1
+            logger.warning("Event cache invalidation failed: %s", error)
+
+
+event_cache = EventCache(
+    redis_manager, ttl=Config.EVENT_CACHE_TTL, enabled=Config.EVENT_CACHE_ENABLED
+)
@@ -0,0 +1,137 @@
+import math
+from typing import List, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+
+# Postgres twin of encode() below, backs the generated events.geohash column.
+# Plain PL/pgSQL, so no PostGIS or other extension is needed.
+GEOHASH_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION geohash_encode(
+    lat double precision, lon double precision, chars integer
+) RETURNS text
+LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE AS $$
+DECLARE
+    alphabet CONSTANT text := '0123456789bcdefghjkmnpqrstuvwxyz';
+    lat_lo double precision := -90;
+    lat_hi double precision := 90;
+    lon_lo double precision := -180;
+    lon_hi double precision := 180;
+    mid double precision;
+    even boolean := true;
+    bits integer := 0;
+    ch integer := 0;
+    hash text := '';
+BEGIN
+    IF lat < -90 OR lat > 90 OR lon < -180 OR lon > 180 THEN
+        RETURN NULL;
+    END IF;
+    WHILE length(hash) < chars LOOP
+        IF even THEN
+            mid := (lon_lo + lon_hi) / 2;
+            IF lon >= mid THEN
+                ch := ch * 2 + 1;
+                lon_lo := mid;
+            ELSE
+                ch := ch * 2;
+                lon_hi := mid;
+            END IF;
+        ELSE
+            mid := (lat_lo + lat_hi) / 2;
+            IF lat >= mid THEN
+                ch := ch * 2 + 1;
+                lat_lo := mid;
+            ELSE
+                ch := ch * 2;
+                lat_hi := mid;
+            END IF;
+        END IF;
+        even := NOT even;
+        bits := bits + 1;
+        IF bits = 5 THEN
+            hash := hash || substr(alphabet, ch + 1, 1);
+            bits := 0;
+            ch := 0;
+        END IF;
+    END LOOP;
+    RETURN hash;
+END;
+$$
+"""
+
+
+def encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, ch, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, bounds = (lon, lon_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            ch = ch * 2 + 1
+            bounds[0] = mid
+        else:
+            ch = ch * 2
+            bounds[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def cell_bits(precision: int) -> Tuple[int, int]:
+    # Longitude takes the first bit, so it gets the odd one out
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+
+def covering_cells(
+    lat: float, lon: float, radius_km: float, max_cells: int = 32
+) -> List[str]:
+    # Geohash prefixes whose cells together cover the bounding box of the
+    # circle, at the finest precision that needs at most max_cells of them.
+    # An empty prefix means the circle is too large to narrow anything down.
+    angle = math.degrees(radius_km / EARTH_RADIUS_KM)
+    lat_min, lat_max = max(-90.0, lat - angle), min(90.0, lat + angle)
+    widest = max(abs(lat_min), abs(lat_max))
+    if widest >= 90.0 or angle >= 90.0:
+        lon_span = 360.0
+    else:
+        lon_span = min(360.0, 2 * angle / math.cos(math.radians(widest)))
+    lon_min = lon - lon_span / 2
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_bits, lon_bits = cell_bits(precision)
+        height, width = 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+        first_row = int((lat_min + 90.0) // height)
+        last_row = min(int((lat_max + 90.0) // height), 2**lat_bits - 1)
+        first_col = int((lon_min + 180.0) // width)
+        cols = min(
+            int((lon_min + lon_span + 180.0) // width) - first_col + 1, 2**lon_bits
+        )
+        if (last_row - first_row + 1) * cols > max_cells:
+            continue
+
+        cells = set()
+        for row in range(first_row, last_row + 1):
+            center_lat = (row + 0.5) * height - 90.0
+            for col in range(first_col, first_col + cols):
+                # Wraps around the antimeridian
+                center_lon = (col % 2**lon_bits + 0.5) * width - 180.0
+                cells.add(encode(center_lat, center_lon, precision))
+        return sorted(cells)
+
+    return [""]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    half_dphi = math.radians(lat2 - lat1) / 2
+    half_dlambda = math.radians(lon2 - lon1) / 2
+    a = (
+        math.sin(half_dphi) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -1,30 +1,117 @@
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Depends, Query, Request, Response
 from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from typing import List
-from .schemas import Event, EventCreateModel, EventUpdateModel
-from .service import EventService
-from src.db.main import get_session
+from datetime import datetime
+from typing import Literal, Optional
+from .schemas import (
+    Event,
+    EventCreateModel,
+    EventUpdateModel,
+    EventPage,
+    EventSearchPage,
+    EventNearbyPage,
+    EventImportReport,
+    EventTimeFilter,
+)
+from .service import (
+    EventService,
+    EVENT_EXPORT_COLUMNS,
+    RSVP_EXPORT_COLUMNS,
+    PROJECTABLE_FIELDS,
+)
+from .cache import event_cache
+from .utils import iter_ndjson_records, iter_csv_records, encode_export
+from src.config import Config
+from src.responses import (
+    FastJSONResponse,
+    cache_validators,
+    is_conditional,
+    is_not_modified,
+    make_etag,
+)
+from src.db.main import get_session, get_read_session, read_session_maker
 from src.auth.depends import AccessTokenBearer, RoleChecker
 
+NDJSON_CONTENT_TYPES = {
+    "application/x-ndjson",
+    "application/ndjson",
+    "application/jsonl",
+    "application/json-lines",
+}
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 event_router = APIRouter()
 event_service = EventService()
 access_token_bearer = AccessTokenBearer()
+# Cache fills must not read from a lagging replica, or stale rows would be stored
+# under the version bumped by the latest write
+cached_read_session = get_session if event_cache.enabled else get_read_session
 # role_checker = Depends(RoleChecker(["admin", "organizer", "user"]))
 
+# Sparse fieldsets: fields=title,location picks columns, include=rsvp_count,rsvps
+# adds the counter and the RSVP list. Projected responses bypass the cache.
+FIELDS_DESCRIPTION = "Comma separated event fields to return"
+INCLUDE_DESCRIPTION = "Comma separated extras to return: rsvp_count, rsvps"
+
+
+def event_etag(uid, updated_at: datetime, fields, include) -> str:
+    # Projections are separate representations of the same version
+    return make_etag(uid, updated_at.isoformat(), fields or "", include or "")
+
+
+async def projected_page(
+    session: AsyncSession,
+    fields: Optional[str],
+    include: Optional[str],
+    cursor: Optional[str],
+    size: int,
+    page: Optional[int] = None,
+) -> JSONResponse:
+    try:
+        names, with_rsvps = event_service.parse_projection(fields, include)
+        items, next_cursor = await event_service.get_events_projection(
+            session, names, with_rsvps, cursor, size, page
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return JSONResponse(
+        content=jsonable_encoder({"items": items, "next_cursor": next_cursor})
+    )
+
 
 @event_router.get(
     "/",
-    response_model=List[Event],
+    response_model=EventPage,
     dependencies=[Depends(RoleChecker(["admin", "organizer", "user"]))],
 )
 async def get_all_events(
-    session: AsyncSession = Depends(get_session),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    include: Optional[str] = Query(None, description=INCLUDE_DESCRIPTION),
+    session: AsyncSession = Depends(cached_read_session),
     token_detail: dict = Depends(access_token_bearer),
 ):
-    events = await event_service.get_all_events(session)
-    return events
+    if fields or include:
+        return await projected_page(session, fields, include, cursor, limit)
+
+    async def load_page() -> dict:
+        # Newest first, one bounded page at a time
+        items, next_cursor = await event_service.get_events_projection(
+            session, PROJECTABLE_FIELDS, True, cursor, limit
+        )
+        return {"items": items, "next_cursor": next_cursor}
+
+    try:
+        page = await event_cache.get_event_page(cursor, limit, load_page)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # Cached or freshly loaded, the page already has the EventPage shape
+    return FastJSONResponse(page) if Config.FAST_SERIALIZATION else page
 
 
 @event_router.post(
@@ -40,9 +127,137 @@ async def create_an_event(
 ) -> dict:
     user_uid = token_detail.get("user")["user_uid"]
     new_event = await event_service.create_event(event_data, user_uid, session)
+    await event_cache.invalidate_lists()
     return new_event
 
 
+@event_router.post(
+    "/import",
+    response_model=EventImportReport,
+    dependencies=[Depends(RoleChecker(["admin", "organizer"]))],
+)
+async def import_events(
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    token_detail: dict = Depends(access_token_bearer),
+):
+    # The body is read as a stream, one NDJSON object or CSV row per record
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type.lower() in CSV_CONTENT_TYPES:
+        records = iter_csv_records(request.stream(), Config.IMPORT_MAX_LINE_BYTES)
+    elif content_type.lower() in NDJSON_CONTENT_TYPES:
+        records = iter_ndjson_records(request.stream(), Config.IMPORT_MAX_LINE_BYTES)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload events as application/x-ndjson or text/csv",
+        )
+
+    user_uid = token_detail.get("user")["user_uid"]
+    report = await event_service.import_events(
+        records,
+        user_uid,
+        session,
+        batch_size=Config.IMPORT_BATCH_SIZE,
+        max_errors=Config.IMPORT_MAX_ERRORS,
+    )
+    if report["inserted"]:
+        await event_cache.invalidate_lists()
+    return report
+
+
+async def export_response(
+    request: Request, stream_rows, columns: list, export_format: str, filename: str
+) -> StreamingResponse:
+    # The session lives inside the body generator, rows are sent as they are read
+    session_maker = await read_session_maker(request)
+
+    async def body():
+        async with session_maker() as session:
+            async for chunk in encode_export(
+                stream_rows(session),
+                [column.name for column in columns],
+                export_format,
+            ):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format}"'
+        },
+    )
+
+
+@event_router.get(
+    "/export",
+    dependencies=[Depends(RoleChecker(["admin", "organizer"]))],
+)
+async def export_events(
+    request: Request,
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    token_detail: dict = Depends(access_token_bearer),
+):
+    return await export_response(
+        request,
+        event_service.stream_events,
+        EVENT_EXPORT_COLUMNS,
+        export_format,
+        "events",
+    )
+
+
+# Declared before /{event_uid} so "nearby" is not read as an event uid
+@event_router.get(
+    "/nearby",
+    response_model=EventNearbyPage,
+    dependencies=[Depends(RoleChecker(["admin", "organizer", "user"]))],
+)
+async def nearby_events(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=500),
+    limit: int = Query(20, ge=1, le=100),
+    category: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session),
+    token_detail: dict = Depends(access_token_bearer),
+):
+    # Closest first, events without coordinates never match
+    items = await event_service.nearby_events(
+        session, lat, lon, radius_km, limit, category
+    )
+    page = {"items": items}
+    return FastJSONResponse(page) if Config.FAST_SERIALIZATION else page
+
+
+@event_router.get(
+    "/{event_uid}/rsvps/export",
+    dependencies=[Depends(RoleChecker(["admin", "organizer"]))],
+)
+async def export_event_rsvps(
+    request: Request,
+    event_uid: str,
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    session: AsyncSession = Depends(get_read_session),
+    token_detail: dict = Depends(access_token_bearer),
+):
+    if not await event_service.event_exists(event_uid, session):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Event not found"
+        )
+
+    return await export_response(
+        request,
+        lambda export_session: event_service.stream_event_rsvps(
+            event_uid, export_session
+        ),
+        RSVP_EXPORT_COLUMNS,
+        export_format,
+        f"event-{event_uid}-rsvps",
+    )
+
+
 @event_router.get(
     "/{event_uid}",
     response_model=Event,
@@ -50,14 +265,57 @@ async def create_an_event(
 )
 async def get_an_event(
     event_uid: str,
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    include: Optional[str] = Query(None, description=INCLUDE_DESCRIPTION),
+    session: AsyncSession = Depends(cached_read_session),
     token_detail: dict = Depends(access_token_bearer),
 ) -> dict:
-    event = await event_service.get_event(event_uid, session)
+    headers = None
+    if fields or include or is_conditional(request):
+        # Checked before the body is loaded, a version older than the body
+        # only costs the client a refetch, a newer one would be wrong
+        version = await event_service.get_event_version(event_uid, session)
+        if version is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Event not found"
+            )
+        etag = event_etag(version.uid, version.updated_at, fields, include)
+        headers = cache_validators(etag, version.updated_at)
+        if is_not_modified(request, etag, version.updated_at):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if fields or include:
+        try:
+            names, with_rsvps = event_service.parse_projection(fields, include)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        event = await event_service.get_event_projection(
+            event_uid, session, names, with_rsvps
+        )
+        if event is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Event not found"
+            )
+        return JSONResponse(content=jsonable_encoder(event), headers=headers)
+
+    async def load_event() -> dict | None:
+        event = await event_service.get_event(event_uid, session)
+        if event is None:
+            return None
+        return Event.model_validate(event, from_attributes=True).model_dump(mode="json")
+
+    event = await event_cache.get_event(event_uid, load_event)
     if not event:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Event not found"
         )
+
+    # The full body carries its own version
+    updated_at = datetime.fromisoformat(event["updated_at"])
+    etag = event_etag(event["uid"], updated_at, fields, include)
+    response.headers.update(cache_validators(etag, updated_at))
     return event
 
 
@@ -79,6 +337,7 @@ async def update_an_event(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Event not found"
         )
+    await event_cache.invalidate_event(event_uid)
     return updated_book
 
 
@@ -97,59 +356,104 @@ async def delete_an_event(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Event not found"
         )
+    await event_cache.invalidate_event(event_uid)
     return None
 
 
+@event_router.get(
+    "/cache/stats",
+    dependencies=[Depends(RoleChecker(["admin"]))],
+)
+async def get_cache_stats(token_detail: dict = Depends(access_token_bearer)):
+    return event_cache.stats()
+
+
 @event_router.get(
     "/search/",
-    response_model=List[Event],
+    response_model=EventSearchPage,
     dependencies=[Depends(RoleChecker(["admin", "organizer", "user"]))],
 )
 async def search_events(
-    query: str,
-    session: AsyncSession = Depends(get_session),
+    query: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    size: int = Query(10, ge=1, le=100),
+    session: AsyncSession = Depends(get_read_session),
     token_detail: dict = Depends(access_token_bearer),
 ):
-    events = await event_service.search_events(query, session)
-    return events
+    try:
+        hits, next_cursor = await event_service.search_events(
+            query, session, cursor, size
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    page = {"items": hits, "next_cursor": next_cursor}
+    return FastJSONResponse(page) if Config.FAST_SERIALIZATION else page
 
 
 @event_router.get(
     "/filter/",
-    response_model=List[Event],
+    response_model=EventPage,
     dependencies=[Depends(RoleChecker(["admin", "organizer", "user"]))],
 )
 async def event_filter(
-    date_start: str = None,
-    date_end: str = None,
-    location: str = None,
-    category: str = None,
-    organizer: str = None,
-    session: AsyncSession = Depends(get_session),
+    when: Optional[EventTimeFilter] = Query(
+        None,
+        description="upcoming: not started yet, between: starting between the "
+        "dates, overlap: running at some point between the dates, now: running "
+        "now. Omitted: between when a date is given, otherwise all events.",
+    ),
+    date_start: Optional[datetime] = None,
+    date_end: Optional[datetime] = None,
+    location: Optional[str] = None,
+    category: Optional[str] = None,
+    organizer: Optional[str] = None,
+    cursor: Optional[str] = None,
+    size: int = Query(10, ge=1, le=100),
+    session: AsyncSession = Depends(get_read_session),
     token_detail: dict = Depends(access_token_bearer),
 ):
-    # Pass the query parameters to the service method
-    events = await event_service.filter_events(
-        session=session,
+    filters = dict(
+        when=when,
         date_start=date_start,
         date_end=date_end,
         location=location,
         category=category,
         organizer=organizer,
+        cursor=cursor,
+        size=size,
     )
-    return events
+    try:
+        items, next_cursor = await event_service.filter_events(session, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    page = {"items": items, "next_cursor": next_cursor}
+    return FastJSONResponse(page) if Config.FAST_SERIALIZATION else page
 
 
 @event_router.get(
     "/pagination/",
-    response_model=List[Event],
+    response_model=EventPage,
     dependencies=[Depends(RoleChecker(["admin", "organizer", "user"]))],
 )
 async def paginated_events(
-    page: int = 1,
-    size: int = 10,
-    session: AsyncSession = Depends(get_session),
+    cursor: Optional[str] = None,
+    page: Optional[int] = Query(None, ge=1),
+    size: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    include: Optional[str] = Query(None, description=INCLUDE_DESCRIPTION),
+    session: AsyncSession = Depends(get_read_session),
     token_detail: dict = Depends(access_token_bearer),
 ):
-    events = await event_service.get_paginated_events(session, page, size)
-    return events
+    if fields or include:
+        return await projected_page(session, fields, include, cursor, size, page)
+
+    try:
+        # A page without a cursor is the legacy offset mode, kept for existing
+        # clients
+        items, next_cursor = await event_service.get_events_projection(
+            session, PROJECTABLE_FIELDS, True, cursor, size, page
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    result = {"items": items, "next_cursor": next_cursor}
+    return FastJSONResponse(result) if Config.FAST_SERIALIZATION else result
@@ -1,7 +1,8 @@
 import uuid
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Literal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from src.rsvp.schemas import RSVP
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import datetime
 
 
@@ -13,12 +14,109 @@ class Event(BaseModel):
     location: str
     category: str
     capacity: int
+    rsvp_count: int
+    flash_sale: bool
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    timezone: str = "UTC"
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     created_at: datetime
     updated_at: datetime
     rsvps: List[RSVP]
 
 
-class EventCreateModel(BaseModel):
+class EventPage(BaseModel):
+    items: List[Event]
+    next_cursor: Optional[str] = None
+
+
+class EventSearchHighlight(BaseModel):
+    title: str
+    description: str
+
+
+class EventSearchHit(BaseModel):
+    event: Event
+    rank: float
+    highlight: EventSearchHighlight
+
+
+class EventSearchPage(BaseModel):
+    items: List[EventSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class EventNearbyHit(BaseModel):
+    event: Event
+    distance_km: float
+
+
+class EventNearbyPage(BaseModel):
+    items: List[EventNearbyHit]
+
+
+EventTimeFilter = Literal["upcoming", "between", "overlap", "now"]
+
+
+# Schedule of an event: both ends or neither. Naive times are read as local
+# times of the event's timezone, an IANA name like "Europe/Paris".
+class EventScheduleModel(BaseModel):
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    timezone: str = "UTC"
+
+    @field_validator("starts_at", "ends_at", mode="before")
+    @classmethod
+    def empty_as_none(cls, value):
+        # CSV imports send unscheduled events as empty cells
+        return None if value == "" else value
+
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, value: str) -> str:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone {value}")
+        return value
+
+    @model_validator(mode="after")
+    def check_schedule(self):
+        if (self.starts_at is None) != (self.ends_at is None):
+            raise ValueError("starts_at and ends_at must be given together")
+        if self.starts_at is None:
+            return self
+
+        zone = ZoneInfo(self.timezone)
+        if self.starts_at.tzinfo is None:
+            self.starts_at = self.starts_at.replace(tzinfo=zone)
+        if self.ends_at.tzinfo is None:
+            self.ends_at = self.ends_at.replace(tzinfo=zone)
+        if self.ends_at < self.starts_at:
+            raise ValueError("ends_at must not be before starts_at")
+        return self
+
+
+# Venue coordinates in WGS84 degrees, both or neither
+class EventCoordinatesModel(BaseModel):
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+    @field_validator("latitude", "longitude", mode="before")
+    @classmethod
+    def empty_coordinates_as_none(cls, value):
+        # Same as the schedule, CSV imports send no venue as empty cells
+        return None if value == "" else value
+
+    @model_validator(mode="after")
+    def check_coordinates(self):
+        if (self.latitude is None) != (self.longitude is None):
+            raise ValueError("latitude and longitude must be given together")
+        return self
+
+
+class EventCreateModel(EventScheduleModel, EventCoordinatesModel):
     title: str
     creator: str
     description: str
@@ -27,10 +125,23 @@ class EventCreateModel(BaseModel):
     capacity: int
 
 
-class EventUpdateModel(BaseModel):
+class EventUpdateModel(EventScheduleModel, EventCoordinatesModel):
     title: str
     creator: str
     description: str
     location: str
     category: str
     capacity: int
+
+
+class EventImportError(BaseModel):
+    row: int
+    error: str
+
+
+class EventImportReport(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[EventImportError]
+    errors_truncated: bool
@@ -1,20 +1,117 @@
 from sqlmodel.ext.asyncio.session import AsyncSession
-from .schemas import EventCreateModel, EventUpdateModel
-from src.db.models import Event
+from .schemas import EventCreateModel, EventUpdateModel, Event as EventSchema
+from src.db.models import Event, RSVP, SEARCH_CONFIG
 from sqlmodel import select, desc
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy import tuple_, func, and_, or_, insert, literal, literal_column
+import sqlalchemy.dialects.postgresql as pg
+from sqlalchemy.exc import DBAPIError
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from collections import defaultdict
+from datetime import datetime, timezone
+import uuid
+
+from .utils import encode_cursor, decode_cursor, escape_like, ImportRecord
+from .geo import EARTH_RADIUS_KM, covering_cells
+from src.rsvp.service import RSVPService
+
+rsvp_service = RSVPService()
+
+# Options passed to ts_headline for the highlighted snippets
+TITLE_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, HighlightAll=true"
+DESCRIPTION_HEADLINE_OPTIONS = (
+    "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+)
+
+# Plain columns written by the exports, the generated ones are internal
+EVENT_EXPORT_COLUMNS = [
+    column
+    for column in Event.__table__.columns
+    if column.name not in ("search_vector", "geohash")
+]
+RSVP_EXPORT_COLUMNS = list(RSVP.__table__.columns)
+EXPORT_BATCH_SIZE = 1000
+
+# Event fields a client can pick with fields=, relations are asked with include=
+PROJECTABLE_FIELDS = [name for name in EventSchema.model_fields if name != "rsvps"]
+INCLUDABLE = {"rsvp_count", "rsvps"}
+
+
+def event_period():
+    # Same expression as the ix_events_period index, the bounds stay a literal
+    return func.tstzrange(Event.starts_at, Event.ends_at, literal_column("'[)'"))
+
+
+def distance_km(latitude: float, longitude: float):
+    # Haversine great-circle distance from the given point, in plain SQL
+    latitude = literal(latitude, pg.DOUBLE_PRECISION)
+    longitude = literal(longitude, pg.DOUBLE_PRECISION)
+    half_dphi = func.radians(Event.latitude - latitude) * 0.5
+    half_dlambda = func.radians(Event.longitude - longitude) * 0.5
+    a = func.power(func.sin(half_dphi), 2) + func.cos(
+        func.radians(latitude)
+    ) * func.cos(func.radians(Event.latitude)) * func.power(func.sin(half_dlambda), 2)
+    # Rounding can push a just above 1 for antipodal points
+    return (2 * EARTH_RADIUS_KM) * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Filters without an offset are read as UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
 
 
 class EventService:
-    async def get_all_events(self, session: AsyncSession):
-        statement = select(Event).order_by(
-            desc(Event.created_at)
-        )  # Return all event order by created_at col
+    async def get_events_page(
+        self, session: AsyncSession, cursor: Optional[str] = None, size: int = 10
+    ) -> Tuple[List[Event], Optional[str]]:
+        statement = self.keyset_statement(select(Event), cursor, size)
 
         result = await session.exec(statement)
+        events = result.all()
+
+        return self.split_page(events, size)
+
+    def keyset_statement(self, statement, cursor: Optional[str], size: int):
+        # Keyset pagination on (created_at, uid), served by ix_events_created_at_uid
+        statement = statement.order_by(desc(Event.created_at), desc(Event.uid)).limit(
+            size + 1  # Fetch one extra row to know if there is a next page
+        )
 
-        return result.all()
+        if cursor is not None:
+            created_at, uid = self.decode_event_cursor(cursor)
+            statement = statement.where(
+                tuple_(Event.created_at, Event.uid) < tuple_(created_at, uid)
+            )
+
+        return statement
+
+    def offset_statement(self, statement, page: int, size: int):
+        # Legacy page/size mode, ordered like the keyset mode so the returned
+        # cursor can be used to continue from here
+        return (
+            statement.order_by(desc(Event.created_at), desc(Event.uid))
+            .offset((page - 1) * size)
+            .limit(size + 1)
+        )
+
+    def split_page(
+        self, events: List[Event], size: int
+    ) -> Tuple[List[Event], Optional[str]]:
+        if len(events) <= size:
+            return events, None
+
+        events = events[:size]
+        last_event = events[-1]
+        return events, encode_cursor(last_event.created_at, last_event.uid)
+
+    def decode_event_cursor(self, cursor: str) -> Tuple[datetime, uuid.UUID]:
+        created_at, uid = decode_cursor(cursor, 2)
+        try:
+            return datetime.fromisoformat(created_at), uuid.UUID(uid)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor")
 
     async def get_event(self, event_uid: str, session: AsyncSession):
         statement = select(Event).where(
@@ -25,6 +122,132 @@ class EventService:
 
         return result.first()
 
+    async def get_event_version(self, event_uid: str, session: AsyncSession):
+        # Primary key lookup of the version only, no row body and no RSVPs
+        result = await session.exec(
+            select(Event.uid, Event.updated_at).where(Event.uid == event_uid)
+        )
+        return result.first()
+
+    def parse_projection(
+        self, fields: Optional[str], include: Optional[str]
+    ) -> Tuple[List[str], bool]:
+        names = (
+            [name.strip() for name in fields.split(",") if name.strip()]
+            if fields
+            else list(PROJECTABLE_FIELDS)
+        )
+        unknown = [name for name in names if name not in PROJECTABLE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+        includes = {name.strip() for name in (include or "").split(",") if name.strip()}
+        if includes - INCLUDABLE:
+            raise ValueError(f"Unknown include: {', '.join(includes - INCLUDABLE)}")
+
+        if "rsvp_count" in includes:
+            names.append("rsvp_count")
+
+        # The uid always comes back so clients can refer to the event
+        return list(dict.fromkeys(["uid", *names])), "rsvps" in includes
+
+    def projection_statement(self, names: List[str]):
+        # Only the requested columns, plus the keyset columns. Selecting columns
+        # instead of the entity also skips the selectin load of Event.rsvps.
+        columns = dict.fromkeys(["uid", "created_at", *names])
+        return select(*[getattr(Event, name) for name in columns])
+
+    async def project_rows(
+        self, rows: list, names: List[str], with_rsvps: bool, session: AsyncSession
+    ) -> List[dict]:
+        items = [{name: getattr(row, name) for name in names} for row in rows]
+
+        if with_rsvps and rows:
+            rsvps = await self.get_rsvps_by_event([row.uid for row in rows], session)
+            for item, row in zip(items, rows):
+                item["rsvps"] = rsvps.get(row.uid, [])
+
+        return items
+
+    async def get_rsvps_by_event(
+        self, event_uids: List[uuid.UUID], session: AsyncSession
+    ) -> Dict[uuid.UUID, List[dict]]:
+        # One IN query for the whole page instead of one load per event
+        result = await session.exec(
+            select(*RSVP_EXPORT_COLUMNS)
+            .where(RSVP.event_uid.in_(event_uids))
+            .order_by(RSVP.rsvp_date, RSVP.uid)
+        )
+        grouped = defaultdict(list)
+        for row in result.all():
+            grouped[row.event_uid].append(row._asdict())
+        return grouped
+
+    async def get_events_projection(
+        self,
+        session: AsyncSession,
+        names: List[str],
+        with_rsvps: bool,
+        cursor: Optional[str] = None,
+        size: int = 10,
+        page: Optional[int] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        statement = self.projection_statement(names)
+        if cursor is None and page is not None:
+            statement = self.offset_statement(statement, page, size)
+        else:
+            statement = self.keyset_statement(statement, cursor, size)
+
+        result = await session.exec(statement)
+        rows, next_cursor = self.split_page(result.all(), size)
+
+        return await self.project_rows(rows, names, with_rsvps, session), next_cursor
+
+    async def get_event_projection(
+        self,
+        event_uid: str,
+        session: AsyncSession,
+        names: List[str],
+        with_rsvps: bool,
+    ) -> Optional[dict]:
+        statement = self.projection_statement(names).where(Event.uid == event_uid)
+        result = await session.exec(statement)
+        row = result.first()
+        if row is None:
+            return None
+
+        items = await self.project_rows([row], names, with_rsvps, session)
+        return items[0]
+
+    async def stream_events(self, session: AsyncSession) -> AsyncIterator[list]:
+        # Column-only rows through a server-side cursor, no ORM objects and no
+        # RSVP loading, handed out one fetch at a time
+        statement = (
+            select(*EVENT_EXPORT_COLUMNS)
+            .order_by(Event.created_at, Event.uid)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        result = await session.stream(statement)
+        async for rows in result.mappings().partitions():
+            yield rows
+
+    async def stream_event_rsvps(
+        self, event_uid: str, session: AsyncSession
+    ) -> AsyncIterator[list]:
+        statement = (
+            select(*RSVP_EXPORT_COLUMNS)
+            .where(RSVP.event_uid == event_uid)
+            .order_by(RSVP.rsvp_date, RSVP.uid)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        result = await session.stream(statement)
+        async for rows in result.mappings().partitions():
+            yield rows
+
+    async def event_exists(self, event_uid: str, session: AsyncSession) -> bool:
+        result = await session.exec(select(Event.uid).where(Event.uid == event_uid))
+        return result.first() is not None
+
     async def create_event(
         self, event_data: EventCreateModel, user_uid: str, session: AsyncSession
     ):
@@ -42,6 +265,87 @@ class EventService:
 
         return new_event
 
+    async def import_events(
+        self,
+        records: AsyncIterator[ImportRecord],
+        user_uid: str,
+        session: AsyncSession,
+        batch_size: int = 1000,
+        max_errors: int = 1000,
+    ) -> dict:
+        # Validate and insert a stream of records batch by batch, so memory use
+        # depends on the batch size and not on the size of the upload
+        report = {
+            "received": 0,
+            "inserted": 0,
+            "failed": 0,
+            "errors": [],
+            "errors_truncated": False,
+        }
+        user_uid = uuid.UUID(str(user_uid))
+        batch = []
+
+        async for row, record, error in records:
+            report["received"] += 1
+
+            if error is None:
+                try:
+                    event_data = EventCreateModel.model_validate(record)
+                except ValidationError as validation_error:
+                    error = "; ".join(
+                        f"{'.'.join(map(str, item['loc']))}: {item['msg']}"
+                        for item in validation_error.errors()
+                    )
+
+            if error is not None:
+                self.add_import_error(report, row, error, max_errors)
+                continue
+
+            batch.append((row, {**event_data.model_dump(), "user_uid": user_uid}))
+            if len(batch) >= batch_size:
+                await self.insert_event_batch(batch, session, report, max_errors)
+                batch = []
+
+        if batch:
+            await self.insert_event_batch(batch, session, report, max_errors)
+
+        return report
+
+    async def insert_event_batch(
+        self, batch: list, session: AsyncSession, report: dict, max_errors: int
+    ) -> None:
+        # One multi-row INSERT and one transaction per batch
+        try:
+            await session.exec(insert(Event), params=[values for _, values in batch])
+            await session.commit()
+            report["inserted"] += len(batch)
+            return
+        except DBAPIError:
+            await session.rollback()
+
+        # Some row was refused. Insert them one by one, each in a savepoint,
+        # so only the rows at fault are reported and the rest still go in.
+        inserted = 0
+        for row, values in batch:
+            try:
+                async with session.begin_nested():
+                    await session.exec(insert(Event), params=[values])
+                inserted += 1
+            except DBAPIError as error:
+                message = f"Rejected by the database: {error.orig}"
+                self.add_import_error(report, row, message, max_errors)
+        await session.commit()
+        report["inserted"] += inserted
+
+    def add_import_error(
+        self, report: dict, row: int, message: str, max_errors: int
+    ) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"row": row, "error": message})
+        else:
+            report["errors_truncated"] = True
+
     async def update_event(
         self, event_uid: str, update_data: EventUpdateModel, session: AsyncSession
     ):
@@ -50,12 +354,27 @@ class EventService:
         )  # Get the event to update
 
         if event_to_update is not None:
-            update_data_dict = update_data.model_dump()
+            # The schedule is only replaced when it is sent, with its timezone
+            update_data_dict = update_data.model_dump(exclude_unset=True)
+            if "starts_at" in update_data_dict or "ends_at" in update_data_dict:
+                update_data_dict["timezone"] = update_data.timezone
 
+            old_capacity = event_to_update.capacity
             for key, value in update_data_dict.items():  # Loop to update the values
                 setattr(event_to_update, key, value)
 
+            promoted = []
+            if event_to_update.capacity > old_capacity:
+                # Seats added to a full event go to its waitlist, in the same
+                # transaction as the new capacity
+                await session.flush()
+                promoted = await rsvp_service.promote_waitlist(
+                    event_to_update.uid, session
+                )
+
             await session.commit()
+            if promoted:
+                await session.refresh(event_to_update)
 
             return event_to_update
         else:
@@ -75,49 +394,284 @@ class EventService:
         else:
             raise ValueError(f"Event with uid {event_uid} not found")
 
-    async def search_events(self, query: str, session: AsyncSession) -> List[Event]:
-        # Use SQL LIKE to search for events by name or description
-        statement = select(Event).where(
-            Event.title.ilike(f"%{query}%") | Event.description.ilike(f"%{query}%")
+    async def search_events(
+        self,
+        query: str,
+        session: AsyncSession,
+        cursor: Optional[str] = None,
+        size: int = 10,
+    ) -> Tuple[List[dict], Optional[str]]:
+        # Hits are built from the selected columns and the RSVPs of the page
+        # come from one IN query, ready for either response encoder
+        columns = [getattr(Event, name) for name in PROJECTABLE_FIELDS]
+        result = await session.exec(self.search_statement(query, cursor, size, columns))
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_cursor = encode_cursor(rows[-1].rank, rows[-1].uid)
+
+        events = await self.project_rows(rows, PROJECTABLE_FIELDS, True, session)
+        hits = [
+            {
+                "event": event,
+                "rank": row.rank,
+                "highlight": {
+                    "title": row.title_highlight,
+                    "description": row.description_highlight,
+                },
+            }
+            for event, row in zip(events, rows)
+        ]
+        return hits, next_cursor
+
+    def search_statement(
+        self, query: str, cursor: Optional[str], size: int, entities: list
+    ):
+        # Full-text match on the weighted search vector, plus trigram similarity
+        # and substring matches for typos and partial words. Every branch is
+        # served by a GIN index, see the events table args.
+        search_vector = Event.__table__.c.search_vector
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        pattern = f"%{escape_like(query)}%"
+
+        rank = func.ts_rank_cd(search_vector, ts_query) + func.similarity(
+            Event.title, query
         )
-        result = await session.exec(statement)
-        return result.all()
+
+        matches = (
+            select(Event.uid.label("uid"), rank.label("rank"))
+            .where(
+                or_(
+                    search_vector.op("@@")(ts_query),
+                    Event.title.op("%")(query),
+                    Event.title.ilike(pattern, escape="\\"),
+                    Event.description.ilike(pattern, escape="\\"),
+                )
+            )
+            .order_by(desc(rank), desc(Event.uid))
+            .limit(size + 1)
+        )
+
+        if cursor is not None:
+            last_rank, last_uid = self.decode_search_cursor(cursor)
+            matches = matches.where(
+                tuple_(rank, Event.uid) < tuple_(last_rank, last_uid)
+            )
+
+        # Rank and page first, then build the (expensive) headlines for the
+        # rows of this page only
+        page = matches.subquery("page")
+        return (
+            select(
+                *entities,
+                page.c.rank,
+                func.ts_headline(
+                    SEARCH_CONFIG, Event.title, ts_query, TITLE_HEADLINE_OPTIONS
+                ).label("title_highlight"),
+                func.ts_headline(
+                    SEARCH_CONFIG,
+                    Event.description,
+                    ts_query,
+                    DESCRIPTION_HEADLINE_OPTIONS,
+                ).label("description_highlight"),
+            )
+            .join(page, page.c.uid == Event.uid)
+            .order_by(desc(page.c.rank), desc(Event.uid))
+        )
+
+    def decode_search_cursor(self, cursor: str) -> Tuple[float, uuid.UUID]:
+        rank, uid = decode_cursor(cursor, 2)
+        try:
+            return float(rank), uuid.UUID(uid)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor")
 
     async def filter_events(
         self,
         session: AsyncSession,  # Keep session as the first argument
-        date_start: Optional[str] = None,
-        date_end: Optional[str] = None,
+        when: Optional[str] = None,
+        date_start: Optional[datetime] = None,
+        date_end: Optional[datetime] = None,
         location: Optional[str] = None,
         category: Optional[str] = None,
         organizer: Optional[str] = None,
-    ) -> List[Event]:
-        # Build the base query
-        statement = select(Event)
+        cursor: Optional[str] = None,
+        size: int = 10,
+    ) -> Tuple[List[dict], Optional[str]]:
+        # Column rows and one IN query for the RSVPs, see search_events
+        statement = self.filter_statement(
+            [getattr(Event, name) for name in PROJECTABLE_FIELDS],
+            when,
+            date_start,
+            date_end,
+            location,
+            category,
+            organizer,
+            cursor,
+            size,
+        )
+        result = await session.exec(statement)
+        rows, next_cursor = self.split_schedule_page(result.all(), size)
+        items = await self.project_rows(rows, PROJECTABLE_FIELDS, True, session)
+        return items, next_cursor
 
-        # Apply filters
-        if date_start:
+    def filter_statement(
+        self,
+        entities: list,
+        when: Optional[str],
+        date_start: Optional[datetime],
+        date_end: Optional[datetime],
+        location: Optional[str],
+        category: Optional[str],
+        organizer: Optional[str],
+        cursor: Optional[str],
+        size: int,
+    ):
+        # In start order. Each mode is served by an index, see the events table
+        # args, and returns scheduled events only. The range of an unscheduled
+        # event is tstzrange(NULL, NULL), unbounded, so the range modes have
+        # to rule those out explicitly; the starts_at comparisons already do.
+        # Without a mode, dates alone mean between and no dates mean all
+        # events, unscheduled ones last.
+        date_start, date_end = as_utc(date_start), as_utc(date_end)
+        statement = select(*entities)
+
+        if when is None and (date_start is not None or date_end is not None):
+            when = "between"
+
+        if when == "upcoming":
+            statement = statement.where(Event.starts_at >= func.now())
+        elif when == "between":
+            if date_start is None and date_end is None:
+                raise ValueError("between needs date_start, date_end or both")
+            if date_start is not None:
+                statement = statement.where(Event.starts_at >= date_start)
+            if date_end is not None:
+                statement = statement.where(Event.starts_at < date_end)
+        elif when == "overlap":
+            if date_start is None or date_end is None:
+                raise ValueError("overlap needs both date_start and date_end")
+            if date_end < date_start:
+                raise ValueError("date_end must not be before date_start")
+            statement = statement.where(
+                Event.starts_at.is_not(None),
+                event_period().op("&&")(
+                    func.tstzrange(
+                        literal(date_start, pg.TIMESTAMP(timezone=True)),
+                        literal(date_end, pg.TIMESTAMP(timezone=True)),
+                        literal_column("'[)'"),
+                    )
+                ),
+            )
+        elif when == "now":
             statement = statement.where(
-                Event.date >= datetime.fromisoformat(date_start)
+                Event.starts_at.is_not(None), event_period().op("@>")(func.now())
             )
-        if date_end:
-            statement = statement.where(Event.date <= datetime.fromisoformat(date_end))
+        elif when is not None:
+            raise ValueError(f"Unknown filter {when}")
+
+        # Exact matches, so the (category|location, starts_at) indexes apply
         if location:
-            statement = statement.where(Event.location.ilike(f"%{location}%"))
+            statement = statement.where(Event.location == location)
         if category:
-            statement = statement.where(Event.category.ilike(f"%{category}%"))
+            statement = statement.where(Event.category == category)
         if organizer:
-            statement = statement.where(Event.organizer.ilike(f"%{organizer}%"))
+            statement = statement.where(Event.creator == organizer)
 
-        result = await session.exec(statement)
-        return result.all()
+        if cursor is not None:
+            starts_at, uid = self.decode_schedule_cursor(cursor)
+            if starts_at is None:
+                # Already into the unscheduled events, which sort last
+                statement = statement.where(Event.starts_at.is_(None), Event.uid > uid)
+            elif when is None:
+                statement = statement.where(
+                    or_(
+                        tuple_(Event.starts_at, Event.uid) > tuple_(starts_at, uid),
+                        Event.starts_at.is_(None),
+                    )
+                )
+            else:
+                statement = statement.where(
+                    tuple_(Event.starts_at, Event.uid) > tuple_(starts_at, uid)
+                )
+
+        return statement.order_by(Event.starts_at.asc().nulls_last(), Event.uid).limit(
+            size + 1
+        )
+
+    def split_schedule_page(self, rows: list, size: int) -> Tuple[list, Optional[str]]:
+        if len(rows) <= size:
+            return rows, None
+
+        rows = rows[:size]
+        last = rows[-1]
+        return rows, encode_cursor(last.starts_at, last.uid)
 
-    async def get_paginated_events(
-        self, session: AsyncSession, page: int = 1, size: int = 10
-    ) -> List[Event]:
-        # Calculate the offset for pagination
-        offset = (page - 1) * size
-        statement = select(Event).offset(offset).limit(size)
+    def decode_schedule_cursor(
+        self, cursor: str
+    ) -> Tuple[Optional[datetime], uuid.UUID]:
+        starts_at, uid = decode_cursor(cursor, 2)
+        try:
+            if starts_at is not None:
+                starts_at = datetime.fromisoformat(starts_at)
+            return starts_at, uuid.UUID(uid)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor")
 
+    async def nearby_events(
+        self,
+        session: AsyncSession,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: int = 20,
+        category: Optional[str] = None,
+    ) -> List[dict]:
+        # Column rows and one IN query for the RSVPs, see search_events
+        statement = self.nearby_statement(
+            [getattr(Event, name) for name in PROJECTABLE_FIELDS],
+            latitude,
+            longitude,
+            radius_km,
+            limit,
+            category,
+        )
         result = await session.exec(statement)
-        return result.all()
+        rows = result.all()
+        events = await self.project_rows(rows, PROJECTABLE_FIELDS, True, session)
+        return [
+            {"event": event, "distance_km": row.distance_km}
+            for event, row in zip(events, rows)
+        ]
+
+    def nearby_statement(
+        self,
+        entities: list,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: int,
+        category: Optional[str] = None,
+    ):
+        # The geohash cells around the point narrow the candidates down with
+        # range scans on ix_events_geohash, each cell is [prefix, prefix~).
+        # The exact distance then drops the corners and orders the rest.
+        geohash = Event.__table__.c.geohash
+        cells = covering_cells(latitude, longitude, radius_km)
+        if cells == [""]:
+            candidates = geohash.is_not(None)
+        else:
+            candidates = or_(
+                *(and_(geohash >= cell, geohash < cell + "~") for cell in cells)
+            )
+
+        distance = distance_km(latitude, longitude)
+        statement = select(*entities, distance.label("distance_km")).where(
+            candidates, distance <= radius_km
+        )
+        if category:
+            statement = statement.where(Event.category == category)
+
+        return statement.order_by(distance, Event.uid).limit(limit)
@@ -0,0 +1,176 @@
+import base64
+import binascii
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+# (row number, parsed record, parse error) yielded by the upload readers
+ImportRecord = Tuple[int, Optional[dict], Optional[str]]
+
+
+def encode_cursor(*values: Any) -> str:
+    # Pack the sort key of the last row into an opaque url-safe token
+    payload = [
+        (
+            str(value)
+            if isinstance(value, uuid.UUID)
+            else value.isoformat() if isinstance(value, datetime) else value
+        )
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    # Reverse of encode_cursor, the caller converts the values back to their types
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid pagination cursor")
+
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid pagination cursor")
+
+    return values
+
+
+def escape_like(value: str) -> str:
+    # Make user input safe to embed in a LIKE/ILIKE pattern
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Longest upload line kept in memory, longer ones are reported as row errors
+MAX_LINE_BYTES = 1024 * 1024
+
+
+def decode_line(line: bytes) -> str:
+    return line.rstrip(b"\r").decode("utf-8-sig", errors="replace")
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_length: int = MAX_LINE_BYTES
+) -> AsyncIterator[Optional[str]]:
+    # Split a byte stream into decoded lines without buffering the whole body.
+    # A line over max_length bytes comes out as None and the rest of it is
+    # dropped as it arrives, so memory stays bounded even without newlines.
+    buffer = b""
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                # The end of the line that was already reported
+                skipping = False
+                continue
+            yield None if len(line) > max_length else decode_line(line)
+        if len(buffer) > max_length:
+            if not skipping:
+                yield None
+                skipping = True
+            buffer = b""
+    if buffer and not skipping:
+        yield None if len(buffer) > max_length else decode_line(buffer)
+
+
+async def iter_ndjson_records(
+    chunks: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES
+) -> AsyncIterator[ImportRecord]:
+    row = 0
+    async for line in iter_lines(chunks, max_line_bytes):
+        if line is None:
+            row += 1
+            yield row, None, f"Line longer than {max_line_bytes} bytes"
+            continue
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield row, None, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, "Each line must be a JSON object"
+            continue
+        yield row, record, None
+
+
+async def iter_csv_records(
+    chunks: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES
+) -> AsyncIterator[ImportRecord]:
+    header = None
+    row = 0
+    pending = ""
+    async for line in iter_lines(chunks, max_line_bytes):
+        if line is None:
+            # Also ends a quoted field it may have been part of
+            pending = ""
+            row += 1
+            yield row, None, f"Line longer than {max_line_bytes} bytes"
+            continue
+
+        # A quoted field may contain newlines, keep reading until quotes balance
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            if len(pending) > max_line_bytes:
+                pending = ""
+                row += 1
+                yield row, None, f"Quoted record longer than {max_line_bytes} bytes"
+            continue
+        text, pending = pending, ""
+
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+
+        row += 1
+        if len(values) != len(header):
+            yield row, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row, dict(zip(header, values)), None
+
+    if pending:
+        yield row + 1, None, "Unterminated quoted field"
+
+
+def export_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+async def encode_export(
+    partitions: AsyncIterator[list], columns: List[str], export_format: str
+) -> AsyncIterator[bytes]:
+    # Turn batches of row mappings into NDJSON or CSV chunks, one chunk per batch
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        async for rows in partitions:
+            writer.writerows(
+                [[export_value(row[column]) for column in columns] for row in rows]
+            )
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+        return
+
+    async for rows in partitions:
+        yield "".join(
+            json.dumps(dict(row), default=export_value, separators=(",", ":")) + "\n"
+            for row in rows
+        ).encode()
@@ -0,0 +1,295 @@
+import bisect
+import hmac
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.exceptions import HTTPException
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPBearer
+
+from src.auth.depends import RoleChecker
+from src.config import Config
+from src.db.main import async_engine, get_pool_stats, replica_router
+from src.db.profiler import query_observers
+from src.db.redis import LATENCY_BUCKETS_MS, redis_manager
+
+# Upper bounds in seconds, tuned for API calls and the queries behind them
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+Labels = Tuple[str, ...]
+
+
+def format_labels(names: Iterable[str], values: Labels) -> str:
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# Minimal Prometheus metric types. Everything runs on the event loop thread, so
+# plain dicts are enough and an observation costs a few dictionary operations.
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, labels: Labels, value: float) -> None:
+        self.values[labels] = value
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per bucket counts (last one is +Inf), sum]
+        self.values: Dict[Labels, list] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> Iterable[str]:
+        bucket_names = self.labelnames + ("le",)
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else format_value(bound)
+                yield f"{self.name}_bucket{format_labels(bucket_names, labels + (le,))} {cumulative}"
+            label_text = format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {format_value(total)}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.metrics: list = []
+        # Called at scrape time to refresh gauges that mirror other components
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(enabled=Config.METRICS_ENABLED)
+
+requests_in_progress = registry.register(
+    Gauge("http_requests_in_progress", "Requests being served", ("method",))
+)
+request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to serve a request, by route template",
+        ("method", "route"),
+    )
+)
+responses_total = registry.register(
+    Counter("http_responses_total", "Responses sent", ("method", "route", "status"))
+)
+request_db_queries = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "Database queries run while serving one request",
+        ("method", "route"),
+        QUERY_COUNT_BUCKETS,
+    )
+)
+request_db_seconds = registry.register(
+    Histogram(
+        "http_request_db_seconds",
+        "Time spent in database queries while serving one request",
+        ("method", "route"),
+    )
+)
+query_duration = registry.register(
+    Histogram(
+        "db_query_duration_seconds", "Duration of single queries", (), QUERY_BUCKETS
+    )
+)
+# Mirrors of the Redis manager's own per command metrics, filled at scrape time
+redis_duration = registry.register(
+    Histogram(
+        "redis_command_duration_seconds",
+        "Duration of Redis commands and pipelines",
+        ("command",),
+        tuple(bound / 1000 for bound in LATENCY_BUCKETS_MS),
+    )
+)
+redis_errors = registry.register(
+    Counter("redis_command_errors_total", "Failed Redis commands", ("command",))
+)
+db_pool = registry.register(
+    Gauge("db_pool", "Database connection pool state", ("engine", "stat"))
+)
+redis_pool = registry.register(
+    Gauge("redis_pool", "Redis connection pool and breaker state", ("stat",))
+)
+
+
+# Queries and their time for the request being served, set by the middleware
+request_queries: ContextVar[Optional[list]] = ContextVar(
+    "request_queries", default=None
+)
+
+
+def observe_query(context, statement: str, seconds: float) -> None:
+    if not registry.enabled:
+        return
+    query_duration.observe((), seconds)
+    stats = request_queries.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+
+
+def collect_pools() -> None:
+    engines = [("primary", async_engine)] + [
+        (f"replica{index}", replica.engine)
+        for index, replica in enumerate(replica_router.replicas)
+    ]
+    for name, engine in engines:
+        stats = get_pool_stats(engine)
+        for stat in ("size", "checked_out", "overflow", "checkouts", "slow_checkouts"):
+            if stat in stats:
+                db_pool.set((name, stat), stats[stat])
+
+    redis_stats = redis_manager.stats()
+    redis_pool.set(("in_use",), redis_stats["pool"]["in_use"])
+    redis_pool.set(("idle",), redis_stats["pool"]["idle"])
+    redis_pool.set(("breaker_open",), redis_stats["breaker"]["state"] != "closed")
+    redis_pool.set(("rejected",), redis_stats["rejected"])
+
+    for command, entry in redis_manager.metrics.commands.items():
+        redis_duration.values[(command,)] = [
+            list(entry["buckets"]),
+            entry["total_ms"] / 1000,
+        ]
+        redis_errors.values[(command,)] = entry["errors"]
+
+
+registry.collectors.append(collect_pools)
+if registry.enabled:
+    query_observers.append(observe_query)
+
+
+# Pure ASGI middleware, cheaper than BaseHTTPMiddleware and it runs the app in
+# the same task, so the query counter context variable reaches the listeners
+class MetricsMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = request_queries.set(stats)
+        requests_in_progress.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_progress.dec((method,))
+            request_queries.reset(token)
+
+            # The template keeps the label count bounded, raw paths would not
+            route = scope.get("route")
+            route = getattr(route, "path_format", None) or "unmatched"
+            labels = (method, route)
+            request_duration.observe(labels, elapsed)
+            responses_total.inc((method, route, str(status_code)))
+            request_db_queries.observe(labels, stats[0])
+            request_db_seconds.observe(labels, stats[1])
+
+
+# Prometheus cannot log in, scrapers send METRICS_TOKEN as a bearer token.
+# Without a token configured the endpoint is for admins only.
+class MetricsTokenBearer(HTTPBearer):
+    async def __call__(self, request: Request) -> bool:
+        creds = await super().__call__(request)
+        if not hmac.compare_digest(
+            creds.credentials.encode(), Config.METRICS_TOKEN.encode()
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail="Invalid metrics token"
+            )
+        return True
+
+
+metrics_access = (
+    MetricsTokenBearer() if Config.METRICS_TOKEN else RoleChecker(["admin"])
+)
+metrics_router = APIRouter(dependencies=[Depends(metrics_access)])
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
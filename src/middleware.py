@@ -5,6 +5,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import time
 import logging
+from src.metrics import MetricsMiddleware
+from src.db.profiler import ProfilerMiddleware
+from src.compression import CompressionMiddleware
+from src.db.main import ReadYourWritesMiddleware
 
 logger = logging.getLogger("uvicorn.access")
 logger.disabled = True
@@ -29,3 +33,14 @@ def register_middleware(app: FastAPI):
             "0.0.0.0",
         ],
     )
+
+    # No response starts before its writes pin the user to the primary
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    # Inside the metrics and profiler layers, so their timings include it
+    app.add_middleware(CompressionMiddleware)
+
+    app.add_middleware(ProfilerMiddleware)
+
+    # Added last so it is the outermost layer and also times the ones above
+    app.add_middleware(MetricsMiddleware)
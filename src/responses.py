@@ -0,0 +1,95 @@
+import email.utils
+import hashlib
+import json
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def default(value: Any) -> Any:
+    if isinstance(value, datetime) and value.utcoffset() == timedelta(0):
+        # UTC as "Z", like pydantic and orjson's OPT_UTC_Z
+        return value.replace(tzinfo=None).isoformat() + "Z"
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    # orjson encodes UUIDs and datetimes natively, in the same format pydantic
+    # uses for mode="json" dumps once UTC is written as "Z" (timestamptz
+    # columns come back in UTC). The stdlib fallback produces the same output.
+    # Both paths fill the same cache keys, so the bytes must not differ.
+    if orjson is not None:
+        return orjson.dumps(content, default=default, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        content, default=default, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+# Response for payloads built straight from database rows. The content is
+# trusted, so it skips the response_model validation and jsonable_encoder pass
+# FastAPI would otherwise run over every field.
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def make_etag(*parts: Any) -> str:
+    # Strong validator, it changes whenever one of the version parts does
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode())
+    return f'"{digest.hexdigest()[:24]}"'
+
+
+def http_date(value: datetime) -> str:
+    # Naive timestamps are local time, as written by datetime.now()
+    return email.utils.format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def cache_validators(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    # no-cache lets clients store the body but makes them revalidate each time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_conditional(request: Request) -> bool:
+    headers = request.headers
+    return "if-none-match" in headers or "if-modified-since" in headers
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime] = None
+) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Takes precedence over If-Modified-Since. GET uses the weak comparison.
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = email.utils.parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates only carry whole seconds
+    return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
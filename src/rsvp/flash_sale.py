@@ -0,0 +1,398 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import sqlalchemy.dialects.postgresql as pg
+from redis.exceptions import RedisError
+from sqlalchemy import func, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.db.main import async_session_maker
+from src.db.models import Event, RSVP
+from src.db.redis import redis_manager
+from src.events.cache import event_cache
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_KEY = "flash:events"
+
+# Claim outcomes returned by the Lua script
+NOT_ACTIVE = -2
+DUPLICATE = -1
+SOLD_OUT = 0
+CLAIMED = 1
+
+# Check the user, take a seat and queue the RSVP for the database as one atomic
+# step. KEYS: seats, users, pending. ARGV: user uid, RSVP payload.
+CLAIM_SCRIPT = """
+local seats = redis.call('GET', KEYS[1])
+if not seats then
+    return -2
+end
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1 then
+    return -1
+end
+if tonumber(seats) <= 0 then
+    return 0
+end
+redis.call('DECR', KEYS[1])
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('RPUSH', KEYS[3], ARGV[2])
+return 1
+"""
+
+# Seats left are whatever the database has not counted yet and the pending
+# queue has not claimed. KEYS: seats, pending. ARGV: capacity - rsvp_count.
+RESET_SCRIPT = """
+local seats = tonumber(ARGV[1]) - redis.call('LLEN', KEYS[2])
+if seats < 0 then
+    seats = 0
+end
+redis.call('SET', KEYS[1], seats)
+return seats
+"""
+
+# Give seats back, unless the sale was stopped meanwhile. KEYS: seats. ARGV:
+# number of seats.
+RELEASE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+"""
+
+
+# Opt-in reservation mode for headline events. Seats are preloaded into a Redis
+# counter and claimed by a Lua script, so the hot path never touches Postgres.
+# Claimed RSVPs queue up in Redis and a background task writes them behind in
+# batches. Invariant: seats + pending + events.rsvp_count == capacity.
+class FlashSale:
+    def __init__(
+        self,
+        manager,
+        batch_size: int,
+        flush_interval: float,
+        reconcile_interval: float,
+    ) -> None:
+        self.manager = manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+        self.claim_script = manager.register_script(CLAIM_SCRIPT)
+        self.reset_script = manager.register_script(RESET_SCRIPT)
+        self.release_script = manager.register_script(RELEASE_SCRIPT)
+        self.task: Optional[asyncio.Task] = None
+        # Per-worker copy of ACTIVE_KEY, refreshed by every flush round. Only
+        # a routing hint: Postgres refuses flash sale events whatever it says.
+        self.active: Set[str] = set()
+        self.recovered_at: Dict[str, float] = {}
+
+    @property
+    def client(self):
+        return self.manager.client
+
+    def keys(self, event_uid) -> Tuple[str, str, str]:
+        # The hash tag keeps all keys of an event on the same cluster slot
+        prefix = f"flash:{{{event_uid}}}"
+        return f"{prefix}:seats", f"{prefix}:users", f"{prefix}:pending"
+
+    def is_active(self, event_uid) -> bool:
+        return str(event_uid) in self.active
+
+    def flush_lock(self, event_uid):
+        # Flushing and reconciling must not interleave, across all workers
+        return self.client.lock(f"flash:{{{event_uid}}}:flush", timeout=60)
+
+    async def claim(
+        self, event_uid: uuid.UUID, user_uid: uuid.UUID
+    ) -> Tuple[int, Optional[RSVP]]:
+        rsvp = RSVP(
+            uid=uuid.uuid4(),
+            event_uid=event_uid,
+            user_uid=user_uid,
+            rsvp_date=datetime.now(),
+        )
+        payload = json.dumps(
+            {
+                "uid": str(rsvp.uid),
+                "user_uid": str(user_uid),
+                "rsvp_date": rsvp.rsvp_date.isoformat(),
+            }
+        )
+        try:
+            outcome = await self.claim_script(
+                keys=self.keys(event_uid), args=[str(user_uid), payload]
+            )
+        except RedisError as error:
+            # Postgres refuses flash sale events, everything else falls back to it
+            logger.warning("Flash sale claim failed: %s", error)
+            return NOT_ACTIVE, None
+
+        return outcome, rsvp if outcome == CLAIMED else None
+
+    async def enable(self, event_uid: uuid.UUID, session: AsyncSession) -> dict:
+        async with self.flush_lock(event_uid):
+            # The UPDATE locks the event row until the commit, so Postgres
+            # reservations in flight are either counted below or refused after
+            result = await session.exec(
+                update(Event)
+                .where(Event.uid == event_uid)
+                .values(flash_sale=True)
+                .returning(Event.capacity, Event.rsvp_count)
+            )
+            event = result.first()
+            if event is None:
+                await session.rollback()
+                raise ValueError(f"Event with UID {event_uid} does not exist.")
+
+            result = await session.exec(
+                select(RSVP.user_uid).where(RSVP.event_uid == event_uid)
+            )
+            user_uids = [str(uid) for uid in result.all()]
+
+            seats_key, users_key, pending_key = self.keys(event_uid)
+            try:
+                for start in range(0, len(user_uids), 1000):
+                    await self.client.sadd(users_key, *user_uids[start : start + 1000])
+                # The seats key comes last, claims only start once it exists.
+                # Enabling twice keeps the claims still waiting to be written.
+                await self.reset_script(
+                    keys=[seats_key, pending_key],
+                    args=[event.capacity - event.rsvp_count],
+                )
+                await self.client.sadd(ACTIVE_KEY, str(event_uid))
+                await session.commit()
+                self.active.add(str(event_uid))
+            except (RedisError, SQLAlchemyError):
+                await session.rollback()
+                await self.client.delete(seats_key)
+                raise
+
+        await event_cache.invalidate_event(event_uid)
+        return await self.status(event_uid)
+
+    async def disable(self, event_uid: uuid.UUID, session: AsyncSession) -> dict:
+        seats_key, users_key, pending_key = self.keys(event_uid)
+
+        async with self.flush_lock(event_uid):
+            # Stop claims first, then drain what was already claimed
+            await self.client.delete(seats_key)
+            await self.flush_pending(event_uid)
+
+            result = await session.exec(
+                update(Event)
+                .where(Event.uid == event_uid)
+                .values(flash_sale=False)
+                .returning(Event.uid)
+            )
+            if result.first() is None:
+                await session.rollback()
+                raise ValueError(f"Event with UID {event_uid} does not exist.")
+            await session.commit()
+
+            await self.manager.delete_many([users_key, pending_key])
+            await self.client.srem(ACTIVE_KEY, str(event_uid))
+            self.active.discard(str(event_uid))
+
+        await event_cache.invalidate_event(event_uid)
+        return await self.status(event_uid)
+
+    async def status(self, event_uid: uuid.UUID) -> dict:
+        seats_key, users_key, pending_key = self.keys(event_uid)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(seats_key)
+            pipe.llen(pending_key)
+            seats, pending = await pipe.execute()
+        return {
+            "event_uid": str(event_uid),
+            "active": seats is not None,
+            "seats_left": int(seats) if seats is not None else None,
+            "pending_writes": pending,
+        }
+
+    async def flush(self, event_uid) -> int:
+        lock = self.flush_lock(event_uid)
+        # Another worker is already flushing this event
+        if not await lock.acquire(blocking=False):
+            return 0
+        try:
+            return await self.flush_pending(event_uid)
+        finally:
+            await lock.release()
+
+    async def flush_pending(self, event_uid) -> int:
+        # Caller holds the flush lock. A crash between the commit and the LTRIM
+        # replays the batch, which the ON CONFLICT and RETURNING make harmless.
+        seats_key, _, pending_key = self.keys(event_uid)
+        written = 0
+        while True:
+            raw = await self.client.lrange(pending_key, 0, self.batch_size - 1)
+            if not raw:
+                return written
+
+            rows = [self.parse_pending(event_uid, item) for item in raw]
+            async with async_session_maker() as session:
+                result = await session.exec(
+                    pg.insert(RSVP)
+                    .values(rows)
+                    .on_conflict_do_nothing()
+                    .returning(RSVP.uid)
+                )
+                inserted = len(result.all())
+                if inserted:
+                    await session.exec(
+                        update(Event)
+                        .where(Event.uid == event_uid)
+                        .values(rsvp_count=Event.rsvp_count + inserted)
+                    )
+                # Rows of a replayed batch are already counted. Any other
+                # conflict (the user got an RSVP some other way) drops the row
+                # and its seat must go back on sale.
+                result = await session.exec(
+                    select(func.count()).where(
+                        RSVP.uid.in_([row["uid"] for row in rows])
+                    )
+                )
+                dropped = len(raw) - result.one()
+                await session.commit()
+
+            await self.client.ltrim(pending_key, len(raw), -1)
+            if dropped:
+                await self.release_script(keys=[seats_key], args=[dropped])
+            await event_cache.invalidate_event(event_uid)
+            written += inserted
+
+    def parse_pending(self, event_uid, item: str) -> dict:
+        record = json.loads(item)
+        return {
+            "uid": uuid.UUID(record["uid"]),
+            "event_uid": uuid.UUID(str(event_uid)),
+            "user_uid": uuid.UUID(record["user_uid"]),
+            "rsvp_date": datetime.fromisoformat(record["rsvp_date"]),
+        }
+
+    async def reconcile(self) -> None:
+        # Bring Redis back in line with Postgres after a restart: flush whatever
+        # was claimed, then recompute the seats and the duplicate set from the
+        # database. Also rebuilds the keys if Redis lost them.
+        async with async_session_maker() as session:
+            result = await session.exec(select(Event.uid).where(Event.flash_sale))
+            flash_events = {str(uid) for uid in result.all()}
+        tracked = await self.client.smembers(ACTIVE_KEY)
+
+        for event_uid in flash_events | set(tracked):
+            async with self.flush_lock(event_uid):
+                await self.flush_pending(event_uid)
+                if event_uid in flash_events:
+                    await self.reset(event_uid)
+                else:
+                    # Mode was switched off while claims were still queued
+                    await self.manager.delete_many(list(self.keys(event_uid)))
+                    await self.client.srem(ACTIVE_KEY, event_uid)
+
+    async def recover(self, event_uid) -> bool:
+        # Postgres says flash sale but Redis has no seats key: Redis lost its
+        # data or was never reconciled. Rebuild this event's keys, at most once
+        # per flush interval per worker so a stampede does not pile up.
+        # Claims queued in the lost pending list are gone, that only Redis
+        # persistence can prevent.
+        event_uid = str(event_uid)
+        now = time.monotonic()
+        if now - self.recovered_at.get(event_uid, 0.0) < self.flush_interval:
+            return False
+        self.recovered_at[event_uid] = now
+
+        try:
+            async with self.flush_lock(event_uid):
+                async with async_session_maker() as session:
+                    result = await session.exec(
+                        select(Event.flash_sale).where(Event.uid == event_uid)
+                    )
+                    if not result.first():
+                        return False
+                await self.flush_pending(event_uid)
+                await self.reset(event_uid)
+        except (RedisError, SQLAlchemyError, OSError) as error:
+            logger.warning("Flash sale recovery of %s failed: %s", event_uid, error)
+            return False
+
+        self.active.add(event_uid)
+        return True
+
+    async def reset(self, event_uid: str) -> None:
+        seats_key, users_key, pending_key = self.keys(event_uid)
+        async with async_session_maker() as session:
+            result = await session.exec(
+                select(Event.capacity, Event.rsvp_count).where(Event.uid == event_uid)
+            )
+            event = result.one()
+            result = await session.exec(
+                select(RSVP.user_uid).where(RSVP.event_uid == event_uid)
+            )
+            user_uids: List[str] = [str(uid) for uid in result.all()]
+
+        # Adding users is always safe, claims in flight only add more
+        for start in range(0, len(user_uids), 1000):
+            await self.client.sadd(users_key, *user_uids[start : start + 1000])
+        seats = await self.reset_script(
+            keys=[seats_key, pending_key], args=[event.capacity - event.rsvp_count]
+        )
+        await self.client.sadd(ACTIVE_KEY, event_uid)
+        logger.info(
+            "Flash sale of event %s reconciled, %s seats left", event_uid, seats
+        )
+
+    async def run(self) -> None:
+        reconciled_at = time.monotonic()
+        while True:
+            try:
+                # Periodically too, so keys Redis lost at runtime come back
+                # even for events nobody is reserving right now
+                if time.monotonic() - reconciled_at >= self.reconcile_interval:
+                    reconciled_at = time.monotonic()
+                    await self.reconcile()
+                self.active = set(await self.client.smembers(ACTIVE_KEY))
+                for event_uid in self.active:
+                    await self.flush(event_uid)
+            except (RedisError, SQLAlchemyError, OSError) as error:
+                # Claims stay queued in Redis, the next round retries them
+                logger.warning("Flash sale flush failed: %s", error)
+            await asyncio.sleep(self.flush_interval)
+
+    async def start(self) -> None:
+        try:
+            await self.reconcile()
+        except (RedisError, SQLAlchemyError, OSError) as error:
+            logger.error("Flash sale reconciliation failed: %s", error)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        # Leave as little as possible for the reconciliation of the next start
+        try:
+            for event_uid in await self.client.smembers(ACTIVE_KEY):
+                await self.flush(event_uid)
+        except (RedisError, SQLAlchemyError, OSError) as error:
+            logger.warning("Flash sale final flush failed: %s", error)
+
+
+flash_sale = FlashSale(
+    redis_manager,
+    batch_size=Config.FLASH_SALE_BATCH_SIZE,
+    flush_interval=Config.FLASH_SALE_FLUSH_INTERVAL,
+    reconcile_interval=Config.FLASH_SALE_RECONCILE_INTERVAL,
+)
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Depends, Request, Response
 from fastapi.exceptions import HTTPException
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from typing import List
 from .service import RSVPService
-from src.db.main import get_session
+from src.db.main import get_session, get_read_session
 from src.auth.depends import AccessTokenBearer, RoleChecker
 from src.db.models import RSVP
+from .schemas import RSVPBatchModel, RSVPBatchResult, WaitlistPosition
+from src.events.cache import event_cache
+from src.config import Config
+from src.responses import (
+    FastJSONResponse,
+    cache_validators,
+    is_conditional,
+    is_not_modified,
+    make_etag,
+)
 
 rsvp_router = APIRouter()
 rsvp_service = RSVPService()
@@ -20,14 +30,112 @@ access_token_bearer = AccessTokenBearer()
     dependencies=[Depends(RoleChecker(["admin", "user"]))],
 )
 async def get_rsvps_by_user(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
     token_detail: dict = Depends(access_token_bearer),
 ):
     user_uid = token_detail.get("user")["user_uid"]
+    if is_conditional(request):
+        version = await rsvp_service.get_rsvps_version(user_uid, session)
+        etag = make_etag(user_uid, version)
+        if is_not_modified(request, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers=cache_validators(etag),
+            )
+
+    # No Last-Modified here, a cancellation leaves no timestamp behind
     rsvps = await rsvp_service.get_rsvps_of_user(user_uid, session)
+    version = rsvp_service.rsvps_version([rsvp["uid"] for rsvp in rsvps])
+    headers = cache_validators(make_etag(user_uid, version))
+    if Config.FAST_SERIALIZATION:
+        return FastJSONResponse(rsvps, headers=headers)
+    response.headers.update(headers)
     return rsvps
 
 
+@rsvp_router.get(
+    "/waitlist/{event_uid}",
+    response_model=WaitlistPosition,
+    dependencies=[Depends(RoleChecker(["admin", "user"]))],
+)
+async def get_waitlist_position(
+    event_uid: str,
+    session: AsyncSession = Depends(get_read_session),
+    token_detail: dict = Depends(access_token_bearer),
+):
+    user_uid = token_detail.get("user")["user_uid"]
+    try:
+        position = await rsvp_service.get_waitlist_position(
+            event_uid, user_uid, session
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if position is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="You are not on the waitlist of this event.",
+        )
+    return position
+
+
+@rsvp_router.delete(
+    "/waitlist/{event_uid}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(RoleChecker(["admin", "user"]))],
+)
+async def leave_waitlist(
+    event_uid: str,
+    session: AsyncSession = Depends(get_session),
+    token_detail: dict = Depends(access_token_bearer),
+):
+    user_uid = token_detail.get("user")["user_uid"]
+    try:
+        await rsvp_service.leave_waitlist(event_uid, user_uid, session)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+# Declared before "/{event_uid}" so "batch" is not taken for an event uid
+@rsvp_router.post(
+    "/batch",
+    response_model=RSVPBatchResult,
+    dependencies=[Depends(RoleChecker(["admin", "user"]))],
+)
+async def rsvp_batch(
+    batch: RSVPBatchModel,
+    session: AsyncSession = Depends(get_session),
+    token_detail: dict = Depends(access_token_bearer),
+):
+    user = token_detail.get("user")
+    user_uid = rsvp_service.parse_uid(user["user_uid"])
+    pairs = [(item.event_uid, item.user_uid or user_uid) for item in batch.items]
+
+    # Group bookings of a regular user are for themselves, enrolling others is
+    # reserved to admins
+    if user.get("role") != "admin" and any(uid != user_uid for _, uid in pairs):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can RSVP on behalf of other users.",
+        )
+
+    result = await rsvp_service.rsvp_batch(pairs, batch.mode, session)
+
+    if not result.committed:
+        # All-or-nothing batch rolled back, report why every item failed
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=result.model_dump(mode="json"),
+        )
+
+    booked = {item.event_uid for item in result.items if item.status == "created"}
+    if booked:
+        await event_cache.invalidate_events(booked)
+    return result
+
+
 @rsvp_router.post(
     "/{event_uid}",
     status_code=status.HTTP_200_OK,
@@ -35,12 +143,20 @@ async def get_rsvps_by_user(
 )
 async def rsvp_to_event(
     event_uid: str,
+    response: Response,
     session: AsyncSession = Depends(get_session),
     token_detail: dict = Depends(access_token_bearer),
 ):
     user_uid = token_detail.get("user")["user_uid"]
     try:
-        rsvp_result = await rsvp_service.rsvp_event(event_uid, user_uid, session)
+        rsvp_result, waitlisted = await rsvp_service.reserve(
+            event_uid, user_uid, session
+        )
+        if waitlisted is not None:
+            # Full event, the user is queued and gets the next free seat
+            response.status_code = status.HTTP_202_ACCEPTED
+            return waitlisted
+        await event_cache.invalidate_event(event_uid)
         return rsvp_result  # Return the RSVP result if successful
     except ValueError as e:
         # If the error is raised by the service, return it as an HTTPException
@@ -62,7 +178,8 @@ async def cancel_rsvp(
 ):
     user_uid = token_detail.get("user")["user_uid"]
     try:
-        cancel_result = await rsvp_service.cancel_rsvp(rsvp_uid, session)
+        cancel_result, _ = await rsvp_service.cancel_rsvp(rsvp_uid, session)
+        await event_cache.invalidate_event(cancel_result.event_uid)
         return cancel_result
     except ValueError as e:
         # If the error is raised by the service, return it as an HTTPException
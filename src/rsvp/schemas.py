@@ -1,6 +1,19 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import uuid
 from datetime import datetime
+from typing import List, Literal, Optional
+from src.config import Config
+
+RSVPBatchMode = Literal["all_or_nothing", "best_effort"]
+# "aborted" marks items that were fine but rolled back with the rest of the batch
+RSVPBatchStatus = Literal[
+    "created",
+    "duplicate",
+    "full",
+    "event_not_found",
+    "user_not_found",
+    "aborted",
+]
 
 
 class RSVP(BaseModel):
@@ -12,3 +25,39 @@ class RSVP(BaseModel):
 
 class RSVPCreateModel(BaseModel):
     event_uid: uuid.UUID
+
+
+class WaitlistPosition(BaseModel):
+    event_uid: uuid.UUID
+    user_uid: uuid.UUID
+    position: int  # 1 is the next user to get a seat
+
+
+class RSVPBatchItem(BaseModel):
+    event_uid: uuid.UUID
+    # Defaults to the caller, only admins may enroll somebody else
+    user_uid: Optional[uuid.UUID] = None
+
+
+class RSVPBatchModel(BaseModel):
+    items: List[RSVPBatchItem] = Field(
+        min_length=1, max_length=Config.RSVP_BATCH_MAX_SIZE
+    )
+    mode: RSVPBatchMode = "all_or_nothing"
+
+
+class RSVPBatchItemResult(BaseModel):
+    index: int
+    event_uid: uuid.UUID
+    user_uid: uuid.UUID
+    status: RSVPBatchStatus
+    rsvp_uid: Optional[uuid.UUID] = None
+    detail: Optional[str] = None
+
+
+class RSVPBatchResult(BaseModel):
+    mode: RSVPBatchMode
+    committed: bool
+    created: int
+    failed: int
+    items: List[RSVPBatchItemResult]
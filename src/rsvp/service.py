@@ -2,19 +2,68 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 # from .schemas import EventCreateModel, EventUpdateModel
 from src.db.models import RSVP
-from src.db.models import Event
+from src.db.models import Event, User, WaitlistEntry
+from .schemas import RSVPBatchItemResult, RSVPBatchResult, WaitlistPosition
+from .schemas import RSVP as RSVPSchema
+from .flash_sale import flash_sale, CLAIMED, DUPLICATE, SOLD_OUT
+from .waitlist import waitlist_index
+from src.db.main import async_session_maker
+from redis.exceptions import RedisError
 from sqlmodel import select, desc
-from typing import List, Optional
+from sqlalchemy import update, delete, exists, literal, func, case, tuple_, cast, Text
+import sqlalchemy.dialects.postgresql as pg
+from typing import List, Optional, Tuple
+from collections import Counter
+from datetime import datetime
+import hashlib
+import uuid
+
+
+# Raised by rsvp_event when there is no seat left, callers may queue the user
+class EventFullError(ValueError):
+    pass
+
+
+# Raised by rsvp_event for events in a flash sale, their seats come from Redis
+class FlashSaleEventError(ValueError):
+    pass
 
 
 class RSVPService:
     async def get_rsvps_of_user(
         self, user_uid: str, session: AsyncSession
-    ) -> List[RSVP]:
-        # Fetch all RSVPs for a specific user
-        statement = select(RSVP).where(RSVP.user_uid == user_uid)
-        result = await session.exec(statement)
-        return result.all()  # Return all the results as a list
+    ) -> List[dict]:
+        # Fetch all RSVPs for a specific user, as plain dicts in the response
+        # shape
+        columns = [getattr(RSVP, name) for name in RSVPSchema.model_fields]
+        result = await session.exec(select(*columns).where(RSVP.user_uid == user_uid))
+        return [row._asdict() for row in result.all()]
+
+    async def get_rsvps_version(self, user_uid: str, session: AsyncSession) -> str:
+        # RSVPs never change once made, so the set of uids is the version. The
+        # digest matches rsvps_version, uuid order is the order of their text.
+        result = await session.exec(
+            select(
+                func.count(),
+                func.coalesce(
+                    func.md5(
+                        func.string_agg(
+                            cast(RSVP.uid, Text),
+                            pg.aggregate_order_by(literal(","), RSVP.uid),
+                        )
+                    ),
+                    "",
+                ),
+            ).where(RSVP.user_uid == user_uid)
+        )
+        count, digest = result.one()
+        return f"{count}:{digest}"
+
+    def rsvps_version(self, rsvp_uids: List[uuid.UUID]) -> str:
+        # Same version as above, computed from RSVPs already loaded
+        joined = ",".join(sorted(str(uid) for uid in rsvp_uids))
+        digest = hashlib.md5(joined.encode()).hexdigest() if rsvp_uids else ""
+        return f"{len(rsvp_uids)}:{digest}"
 
     async def get_rsvp(self, rsvp_uid: str, session: AsyncSession) -> Optional[RSVP]:
         # Fetch a specific RSVP by its UID
@@ -31,25 +80,504 @@ class RSVPService:
         return event  # Return the result, which can be None or the found event
 
     async def rsvp_event(self, event_uid: str, user_uid: str, session: AsyncSession):
-        # check for duplicate rsvp using is_user_rsvp()
-        if await self.is_user_rsvp(event_uid, user_uid, session):
+        event_uid, user_uid = self.parse_uid(event_uid), self.parse_uid(user_uid)
+        rsvp_uid = uuid.uuid4()
+        rsvp_date = datetime.now()
+
+        already_rsvped = exists().where(
+            RSVP.event_uid == event_uid, RSVP.user_uid == user_uid
+        )
+
+        # Take a seat only if there is one left. The row lock taken by the
+        # UPDATE serializes concurrent reservations for the same event.
+        seat = (
+            update(Event)
+            .where(
+                Event.uid == event_uid,
+                Event.rsvp_count < Event.capacity,
+                # Seats of a flash sale are handed out by Redis only
+                ~Event.flash_sale,
+                ~already_rsvped,
+            )
+            .values(rsvp_count=Event.rsvp_count + 1)
+            .returning(Event.uid)
+            .cte("seat")
+        )
+
+        new_rsvp = (
+            pg.insert(RSVP)
+            .from_select(
+                ["uid", "user_uid", "event_uid", "rsvp_date"],
+                select(
+                    literal(rsvp_uid, pg.UUID),
+                    literal(user_uid, pg.UUID),
+                    seat.c.uid,
+                    literal(rsvp_date, pg.TIMESTAMP),
+                ),
+            )
+            .on_conflict_do_nothing(constraint="uq_rsvps_event_user")
+            .returning(RSVP.uid)
+            .cte("new_rsvp")
+        )
+
+        # Reserve and explain the outcome in a single round trip
+        statement = select(
+            select(new_rsvp.c.uid).scalar_subquery(),
+            exists(select(seat.c.uid)),
+            select(Event.flash_sale).where(Event.uid == event_uid).scalar_subquery(),
+            already_rsvped,
+        )
+
+        result = await session.exec(statement)
+        created_uid, seat_taken, flash, duplicate = result.one()
+
+        if created_uid is not None:
+            await session.commit()
+            return RSVP(
+                uid=created_uid,
+                event_uid=event_uid,
+                user_uid=user_uid,
+                rsvp_date=rsvp_date,
+            )
+
+        # Nothing was inserted, also undo the seat if a concurrent duplicate
+        # slipped past the NOT EXISTS check and hit the unique constraint
+        await session.rollback()
+
+        if seat_taken or duplicate:
             raise ValueError(
                 f"User {user_uid} has already RSVPed for event {event_uid}."
-            )  # Raise error
+            )
+        if flash is None:
+            raise ValueError(f"Event with UID {event_uid} does not exist.")
+        if flash:
+            raise FlashSaleEventError(
+                f"Event with UID {event_uid} is in a flash sale, try again shortly."
+            )
+        raise EventFullError(f"Event with UID {event_uid} is already full.")
+
+    async def reserve(
+        self, event_uid: str, user_uid: str, session: AsyncSession
+    ) -> Tuple[Optional[RSVP], Optional[WaitlistPosition]]:
+        event_uid, user_uid = self.parse_uid(event_uid), self.parse_uid(user_uid)
+
+        # Only events this worker knows to be in a flash sale go to Redis
+        # first, every other reservation stays off Redis entirely
+        if flash_sale.is_active(event_uid):
+            rsvp = await self.claim_flash_seat(event_uid, user_uid)
+            if rsvp is not None:
+                return rsvp, None
+
+        # Take a seat, or queue up for one when the event is full. A seat can
+        # free up between the two steps, then the reservation is tried again.
+        for _ in range(3):
+            try:
+                return await self.rsvp_event(event_uid, user_uid, session), None
+            except FlashSaleEventError:
+                # The local hint was stale, or Redis lost the event's keys
+                rsvp = await self.claim_flash_seat(event_uid, user_uid)
+                if rsvp is None and await flash_sale.recover(event_uid):
+                    rsvp = await self.claim_flash_seat(event_uid, user_uid)
+                if rsvp is None:
+                    # Redis is unavailable or the mode is switching
+                    raise FlashSaleEventError(
+                        f"Event with UID {event_uid} is in a flash sale, "
+                        "try again shortly."
+                    )
+                return rsvp, None
+            except EventFullError:
+                position = await self.join_waitlist(event_uid, user_uid, session)
+                if position is not None:
+                    return None, position
 
-        # check if event exist
-        event = await self.get_event(event_uid, session)
-        if not event:
+        raise EventFullError(f"Event with UID {event_uid} is already full.")
+
+    async def claim_flash_seat(
+        self, event_uid: uuid.UUID, user_uid: uuid.UUID
+    ) -> Optional[RSVP]:
+        # Flash sale events are served by Redis alone, sold out means sold out.
+        # None when Redis has no sale running for the event.
+        outcome, rsvp = await flash_sale.claim(event_uid, user_uid)
+        if outcome == CLAIMED:
+            return rsvp
+        if outcome == DUPLICATE:
+            raise ValueError(
+                f"User {user_uid} has already RSVPed for event {event_uid}."
+            )
+        if outcome == SOLD_OUT:
+            raise EventFullError(f"Event with UID {event_uid} is already full.")
+        return None
+
+    async def lock_event(self, event_uid: uuid.UUID, session: AsyncSession):
+        # Reservations, cancellations and waitlist changes of an event all
+        # serialize on its row
+        result = await session.exec(
+            select(Event.uid, Event.capacity, Event.rsvp_count)
+            .where(Event.uid == event_uid)
+            .with_for_update()
+        )
+        return result.first()
+
+    async def join_waitlist(
+        self, event_uid: str, user_uid: str, session: AsyncSession
+    ) -> Optional[WaitlistPosition]:
+        event_uid, user_uid = self.parse_uid(event_uid), self.parse_uid(user_uid)
+
+        event = await self.lock_event(event_uid, session)
+        if event is None:
+            await session.rollback()
             raise ValueError(f"Event with UID {event_uid} does not exist.")
+        if event.rsvp_count < event.capacity:
+            # Nobody waits while there is a free seat, let the caller retry
+            await session.rollback()
+            return None
+        if await self.is_user_rsvp(event_uid, user_uid, session):
+            await session.rollback()
+            raise ValueError(
+                f"User {user_uid} has already RSVPed for event {event_uid}."
+            )
 
-        rsvp_count = await self.get_event_rsvp_count(event_uid, session)
-        if rsvp_count >= event.capacity:
-            raise ValueError(f"Event with UID {event_uid} is already full.")
+        # Joining twice keeps the original place in the queue
+        result = await session.exec(
+            pg.insert(WaitlistEntry)
+            .values(
+                uid=uuid.uuid4(),
+                event_uid=event_uid,
+                user_uid=user_uid,
+                created_at=datetime.now(),
+            )
+            .on_conflict_do_nothing(constraint="uq_waitlist_event_user")
+            .returning(WaitlistEntry.position)
+        )
+        ticket = result.first()
+        await self.commit_waitlist(
+            event_uid, session, added=(user_uid, ticket.position) if ticket else None
+        )
 
-        rsvp = RSVP(event_uid=event_uid, user_uid=user_uid)
-        session.add(rsvp)
+        return await self.get_waitlist_position(event_uid, user_uid, session)
+
+    async def get_waitlist_position(
+        self, event_uid: str, user_uid: str, session: AsyncSession
+    ) -> Optional[WaitlistPosition]:
+        event_uid, user_uid = self.parse_uid(event_uid), self.parse_uid(user_uid)
+
+        # O(log n) from the Redis rank index, built on first use. Counting in
+        # Postgres is the fallback while Redis is unavailable, and confirms a
+        # user the index does not know yet: it is written after the commit.
+        try:
+            built, position = await waitlist_index.rank(event_uid, user_uid)
+            if not built:
+                await self.rebuild_waitlist_index(event_uid)
+                built, position = await waitlist_index.rank(event_uid, user_uid)
+        except RedisError:
+            built = False
+        if not built or position is None:
+            position = await self.count_waitlist_position(event_uid, user_uid, session)
+
+        if not position:
+            return None
+        return WaitlistPosition(
+            event_uid=event_uid, user_uid=user_uid, position=position
+        )
+
+    async def count_waitlist_position(
+        self, event_uid: uuid.UUID, user_uid: uuid.UUID, session: AsyncSession
+    ) -> int:
+        # 1-based rank: entries of the event up to and including the user's
+        # ticket, counted on ix_waitlist_event_position without touching the heap
+        ticket = (
+            select(WaitlistEntry.position)
+            .where(
+                WaitlistEntry.event_uid == event_uid,
+                WaitlistEntry.user_uid == user_uid,
+            )
+            .scalar_subquery()
+        )
+        result = await session.exec(
+            select(func.count()).where(
+                WaitlistEntry.event_uid == event_uid,
+                WaitlistEntry.position <= ticket,
+            )
+        )
+        return result.one()
+
+    async def rebuild_waitlist_index(self, event_uid: uuid.UUID) -> None:
+        # Read on the primary under a share lock of the event row, so no
+        # waitlist change can slip in between the read and the Redis write
+        async with async_session_maker() as session:
+            result = await session.exec(
+                select(Event.uid)
+                .where(Event.uid == event_uid)
+                .with_for_update(read=True)
+            )
+            if result.first() is None:
+                return
+            result = await session.exec(
+                select(WaitlistEntry.user_uid, WaitlistEntry.position).where(
+                    WaitlistEntry.event_uid == event_uid
+                )
+            )
+            await waitlist_index.rebuild(event_uid, result.all())
+            await session.commit()
+
+    async def commit_waitlist(
+        self,
+        event_uid: uuid.UUID,
+        session: AsyncSession,
+        added: Optional[Tuple[uuid.UUID, int]] = None,
+        removed: Optional[uuid.UUID] = None,
+    ) -> None:
+        # Commit, then mirror the change into the rank index. The row lock is
+        # not held across the Redis round trip and a rolled back change never
+        # reaches Redis. An index that missed a change is dropped.
         await session.commit()
-        return rsvp
+        try:
+            if added:
+                await waitlist_index.add(event_uid, *added)
+            if removed:
+                await waitlist_index.remove(event_uid, [removed])
+        except RedisError:
+            await waitlist_index.drop(event_uid)
+
+    async def promote_waitlist(
+        self, event_uid: uuid.UUID, session: AsyncSession
+    ) -> List[RSVP]:
+        # Fill the free seats of an event from the head of its waitlist, e.g.
+        # after its capacity went up. Does not commit, the caller's
+        # transaction covers the change that freed the seats.
+        result = await session.exec(
+            select(Event.capacity, Event.rsvp_count, Event.flash_sale)
+            .where(Event.uid == event_uid)
+            .with_for_update()
+        )
+        event = result.first()
+        # Seats of a flash sale are handed out by Redis only
+        if event is None or event.flash_sale or event.rsvp_count >= event.capacity:
+            return []
+
+        heads = (
+            select(WaitlistEntry.uid)
+            .where(
+                WaitlistEntry.event_uid == event_uid,
+                ~exists().where(
+                    RSVP.event_uid == WaitlistEntry.event_uid,
+                    RSVP.user_uid == WaitlistEntry.user_uid,
+                ),
+            )
+            .order_by(WaitlistEntry.position)
+            .limit(event.capacity - event.rsvp_count)
+        )
+        dequeued = (
+            delete(WaitlistEntry)
+            .where(WaitlistEntry.uid.in_(heads))
+            .returning(WaitlistEntry.user_uid)
+            .cte("dequeued")
+        )
+        promoted_date = datetime.now()
+        promoted = (
+            pg.insert(RSVP)
+            .from_select(
+                ["uid", "user_uid", "event_uid", "rsvp_date"],
+                select(
+                    func.gen_random_uuid(),
+                    dequeued.c.user_uid,
+                    literal(event_uid, pg.UUID),
+                    literal(promoted_date, pg.TIMESTAMP),
+                ),
+            )
+            .on_conflict_do_nothing(constraint="uq_rsvps_event_user")
+            .returning(RSVP.uid, RSVP.user_uid)
+            .cte("promoted")
+        )
+        taken = (
+            update(Event)
+            .where(Event.uid == event_uid)
+            .values(
+                rsvp_count=Event.rsvp_count
+                + select(func.count()).select_from(promoted).scalar_subquery()
+            )
+            .returning(Event.uid)
+            .cte("taken")
+        )
+        result = await session.exec(
+            select(promoted.c.uid, promoted.c.user_uid).add_cte(taken)
+        )
+        rows = result.all()
+
+        if rows:
+            # Several places moved at once, cheaper to rebuild than to patch.
+            # A lookup rebuilding meanwhile waits for the event row lock.
+            await waitlist_index.drop(event_uid)
+        return [
+            RSVP(
+                uid=row.uid,
+                event_uid=event_uid,
+                user_uid=row.user_uid,
+                rsvp_date=promoted_date,
+            )
+            for row in rows
+        ]
+
+    async def leave_waitlist(
+        self, event_uid: str, user_uid: str, session: AsyncSession
+    ) -> None:
+        event_uid, user_uid = self.parse_uid(event_uid), self.parse_uid(user_uid)
+
+        await self.lock_event(event_uid, session)
+        result = await session.exec(
+            delete(WaitlistEntry)
+            .where(
+                WaitlistEntry.event_uid == event_uid,
+                WaitlistEntry.user_uid == user_uid,
+            )
+            .returning(WaitlistEntry.uid)
+        )
+        if result.first() is None:
+            await session.rollback()
+            raise ValueError(
+                f"User {user_uid} is not on the waitlist of event {event_uid}."
+            )
+        await self.commit_waitlist(event_uid, session, removed=user_uid)
+
+    async def rsvp_batch(
+        self,
+        pairs: List[Tuple[uuid.UUID, uuid.UUID]],
+        mode: str,
+        session: AsyncSession,
+    ) -> RSVPBatchResult:
+        # pairs are (event_uid, user_uid) in request order
+        event_uids = sorted({event_uid for event_uid, _ in pairs})
+        user_uids = {user_uid for _, user_uid in pairs}
+
+        # Lock the events in uid order so concurrent batches cannot deadlock.
+        # Single RSVPs and cancellations update the same rows, so they wait for
+        # this transaction and the counts read here stay valid until commit.
+        result = await session.exec(
+            select(Event.uid, Event.capacity, Event.rsvp_count, Event.flash_sale)
+            .where(Event.uid.in_(event_uids))
+            .order_by(Event.uid)
+            .with_for_update()
+        )
+        # Flash sale seats live in Redis, there are none to hand out here
+        seats_left = {
+            row.uid: 0 if row.flash_sale else row.capacity - row.rsvp_count
+            for row in result.all()
+        }
+
+        result = await session.exec(select(User.uid).where(User.uid.in_(user_uids)))
+        known_users = set(result.all())
+
+        result = await session.exec(
+            select(RSVP.event_uid, RSVP.user_uid).where(
+                tuple_(RSVP.event_uid, RSVP.user_uid).in_(list(set(pairs)))
+            )
+        )
+        taken = {tuple(row) for row in result.all()}
+
+        # Hand out the remaining seats in request order
+        outcomes, rows = [], []
+        rsvp_date = datetime.now()
+        for index, (event_uid, user_uid) in enumerate(pairs):
+            outcome = RSVPBatchItemResult(
+                index=index, event_uid=event_uid, user_uid=user_uid, status="created"
+            )
+            if event_uid not in seats_left:
+                outcome.status = "event_not_found"
+                outcome.detail = f"Event with UID {event_uid} does not exist."
+            elif user_uid not in known_users:
+                outcome.status = "user_not_found"
+                outcome.detail = f"User with UID {user_uid} does not exist."
+            elif (event_uid, user_uid) in taken:
+                outcome.status = "duplicate"
+                outcome.detail = (
+                    f"User {user_uid} has already RSVPed for event {event_uid}."
+                )
+            elif seats_left[event_uid] <= 0:
+                outcome.status = "full"
+                outcome.detail = f"Event with UID {event_uid} is already full."
+            else:
+                seats_left[event_uid] -= 1
+                taken.add((event_uid, user_uid))
+                outcome.rsvp_uid = uuid.uuid4()
+                rows.append(
+                    {
+                        "uid": outcome.rsvp_uid,
+                        "event_uid": event_uid,
+                        "user_uid": user_uid,
+                        "rsvp_date": rsvp_date,
+                    }
+                )
+            outcomes.append(outcome)
+
+        created = [outcome for outcome in outcomes if outcome.status == "created"]
+        if mode == "all_or_nothing" and len(created) < len(outcomes):
+            return await self.abort_batch(mode, outcomes, session)
+
+        if rows:
+            # The unique constraint is the last line of defence, a pair that
+            # still conflicts is reported as a duplicate
+            result = await session.exec(
+                pg.insert(RSVP)
+                .values(rows)
+                .on_conflict_do_nothing(constraint="uq_rsvps_event_user")
+                .returning(RSVP.uid)
+            )
+            inserted = set(result.scalars().all())
+
+            for outcome in created:
+                if outcome.rsvp_uid not in inserted:
+                    outcome.status = "duplicate"
+                    outcome.rsvp_uid = None
+                    outcome.detail = "Conflicting RSVP created concurrently."
+            if mode == "all_or_nothing" and len(inserted) < len(rows):
+                return await self.abort_batch(mode, outcomes, session)
+
+            seats = Counter(row["event_uid"] for row in rows if row["uid"] in inserted)
+            if seats:
+                await session.exec(
+                    update(Event)
+                    .where(Event.uid.in_(list(seats)))
+                    .values(rsvp_count=Event.rsvp_count + case(seats, value=Event.uid))
+                )
+
+        await session.commit()
+
+        created_count = sum(outcome.status == "created" for outcome in outcomes)
+        return RSVPBatchResult(
+            mode=mode,
+            committed=True,
+            created=created_count,
+            failed=len(outcomes) - created_count,
+            items=outcomes,
+        )
+
+    async def abort_batch(
+        self,
+        mode: str,
+        outcomes: List[RSVPBatchItemResult],
+        session: AsyncSession,
+    ) -> RSVPBatchResult:
+        await session.rollback()
+
+        failed = 0
+        for outcome in outcomes:
+            if outcome.status == "created":
+                outcome.status = "aborted"
+                outcome.rsvp_uid = None
+            else:
+                failed += 1
+
+        return RSVPBatchResult(
+            mode=mode, committed=False, created=0, failed=failed, items=outcomes
+        )
+
+    def parse_uid(self, value) -> uuid.UUID:
+        if isinstance(value, uuid.UUID):
+            return value
+        try:
+            return uuid.UUID(str(value))
+        except ValueError:
+            raise ValueError(f"Invalid uid {value}")
 
     async def is_user_rsvp(
         self, event_uid: str, user_uid: str, session: AsyncSession
@@ -59,15 +587,131 @@ class RSVPService:
         )
         return result.first() is not None
 
-    async def cancel_rsvp(self, rsvp_uid: str, session: AsyncSession):
-        rsvp_to_cancel = await self.get_rsvp(rsvp_uid, session)
-        if rsvp_to_cancel:
-            await session.delete(rsvp_to_cancel)
-            await session.commit()
-            return rsvp_to_cancel
-        else:
+    async def cancel_rsvp(
+        self, rsvp_uid: str, session: AsyncSession
+    ) -> Tuple[RSVP, Optional[RSVP]]:
+        rsvp_uid = self.parse_uid(rsvp_uid)
+
+        # Lock the event before looking at its queue. A concurrent join then
+        # either committed already and is promoted here, or waits and finds
+        # the event full again.
+        result = await session.exec(
+            select(Event.uid, Event.flash_sale, Event.capacity, Event.rsvp_count)
+            .join(RSVP, RSVP.event_uid == Event.uid)
+            .where(RSVP.uid == rsvp_uid)
+            .with_for_update(of=Event)
+        )
+        event = result.first()
+        if event is None:
+            await session.rollback()
             raise ValueError(f"RSVP with uid {rsvp_uid} not found")
+        if event.flash_sale:
+            # The freed seat would have to go back to the Redis counter
+            await session.rollback()
+            raise ValueError(
+                f"Cancellations are closed during the flash sale of event {event.uid}."
+            )
+        event_uid = event.uid
+
+        # Delete the RSVP and hand its seat to the head of the waitlist in the
+        # same statement. The seat only goes back to the pool when nobody waits.
+        cancelled = (
+            delete(RSVP)
+            .where(RSVP.uid == rsvp_uid)
+            .returning(RSVP.uid, RSVP.event_uid, RSVP.user_uid, RSVP.rsvp_date)
+            .cte("cancelled")
+        )
+        head = (
+            select(WaitlistEntry.uid)
+            .where(
+                WaitlistEntry.event_uid == event_uid,
+                ~exists().where(
+                    RSVP.event_uid == WaitlistEntry.event_uid,
+                    RSVP.user_uid == WaitlistEntry.user_uid,
+                ),
+            )
+            .order_by(WaitlistEntry.position)
+            .limit(1)
+            .scalar_subquery()
+        )
+        # Promote only into a seat that is really free, capacity may have been
+        # lowered below the seats already taken
+        seat_free = event.rsvp_count - 1 < event.capacity
+        dequeued = (
+            delete(WaitlistEntry)
+            .where(
+                WaitlistEntry.uid == head,
+                exists(select(cancelled.c.uid)),
+                literal(seat_free),
+            )
+            .returning(WaitlistEntry.user_uid)
+            .cte("dequeued")
+        )
+        promoted_date = datetime.now()
+        promoted = (
+            pg.insert(RSVP)
+            .from_select(
+                ["uid", "user_uid", "event_uid", "rsvp_date"],
+                select(
+                    literal(uuid.uuid4(), pg.UUID),
+                    dequeued.c.user_uid,
+                    literal(event_uid, pg.UUID),
+                    literal(promoted_date, pg.TIMESTAMP),
+                ),
+            )
+            .on_conflict_do_nothing(constraint="uq_rsvps_event_user")
+            .returning(RSVP.uid, RSVP.user_uid)
+            .cte("promoted")
+        )
+        # Touches the event either way, its RSVP list changed, and only frees
+        # the seat when nobody was promoted into it
+        release = (
+            update(Event)
+            .where(Event.uid == event_uid, exists(select(cancelled.c.uid)))
+            .values(
+                rsvp_count=Event.rsvp_count
+                - case((exists(select(promoted.c.uid)), 0), else_=1)
+            )
+            .returning(Event.uid)
+            .cte("release")
+        )
+        statement = select(
+            cancelled.c.uid,
+            cancelled.c.event_uid,
+            cancelled.c.user_uid,
+            cancelled.c.rsvp_date,
+            select(promoted.c.uid).scalar_subquery().label("promoted_uid"),
+            select(promoted.c.user_uid).scalar_subquery().label("promoted_user_uid"),
+            select(dequeued.c.user_uid).scalar_subquery().label("dequeued_user_uid"),
+        ).add_cte(release)
+
+        result = await session.exec(statement)
+        row = result.first()
+
+        if row is None:
+            await session.rollback()
+            raise ValueError(f"RSVP with uid {rsvp_uid} not found")
+
+        await self.commit_waitlist(event_uid, session, removed=row.dequeued_user_uid)
+
+        cancelled_rsvp = RSVP(
+            uid=row.uid,
+            event_uid=row.event_uid,
+            user_uid=row.user_uid,
+            rsvp_date=row.rsvp_date,
+        )
+        promoted_rsvp = None
+        if row.promoted_uid is not None:
+            promoted_rsvp = RSVP(
+                uid=row.promoted_uid,
+                event_uid=event_uid,
+                user_uid=row.promoted_user_uid,
+                rsvp_date=promoted_date,
+            )
+        return cancelled_rsvp, promoted_rsvp
 
     async def get_event_rsvp_count(self, event_uid: str, session: AsyncSession) -> int:
-        result = await session.exec(select(RSVP).where(RSVP.event_uid == event_uid))
-        return len(result.all())  # Use count() to get the number of rows
+        result = await session.exec(
+            select(func.count()).select_from(RSVP).where(RSVP.event_uid == event_uid)
+        )
+        return result.one()
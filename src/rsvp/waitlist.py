@@ -0,0 +1,84 @@
+import logging
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from src.config import Config
+from src.db.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+# Member that marks a set as complete. Its score 0 sorts it first, so the
+# ZRANK of a user is their 1-based place in the queue.
+SENTINEL = "-"
+
+# Writers only touch a set that a rebuild created. KEYS: set. ARGV: score,
+# member pairs.
+ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('ZADD', KEYS[1], unpack(ARGV))
+return 1
+"""
+
+
+# Rank index of the waitlists: one Redis sorted set per event, scored by the
+# ticket position, answers "how many wait before me" with ZRANK in O(log n).
+# Postgres stays the source of truth. Writers change the set after their
+# commit and drop it whenever it may have diverged, the next lookup rebuilds
+# it. The TTL bounds how long a set missed by a failed drop can lie.
+class WaitlistIndex:
+    def __init__(self, manager, ttl: int) -> None:
+        self.manager = manager
+        self.ttl = ttl
+        self.add_script = manager.register_script(ADD_SCRIPT)
+
+    def key(self, event_uid) -> str:
+        return f"waitlist:{{{event_uid}}}"
+
+    async def rank(self, event_uid, user_uid) -> Tuple[bool, Optional[int]]:
+        # (built, position), position is None for users not in the queue
+        async with self.manager.client.pipeline(transaction=False) as pipe:
+            pipe.exists(self.key(event_uid))
+            pipe.zrank(self.key(event_uid), str(user_uid))
+            built, rank = await pipe.execute()
+        return bool(built), rank or None
+
+    async def rebuild(
+        self, event_uid, entries: Iterable[Tuple[uuid.UUID, int]]
+    ) -> None:
+        # Swapped in whole, readers never see a half built set
+        key = self.key(event_uid)
+        members = {SENTINEL: 0}
+        members.update({str(user_uid): position for user_uid, position in entries})
+        async with self.manager.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            items = list(members.items())
+            for start in range(0, len(items), 1000):
+                pipe.zadd(key, dict(items[start : start + 1000]))
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def add(self, event_uid, user_uid, position: int) -> None:
+        await self.add_script(
+            keys=[self.key(event_uid)], args=[position, str(user_uid)]
+        )
+
+    async def remove(self, event_uid, user_uids: List) -> None:
+        if user_uids:
+            await self.manager.client.zrem(
+                self.key(event_uid), *(str(user_uid) for user_uid in user_uids)
+            )
+
+    async def drop(self, event_uid) -> None:
+        try:
+            await self.manager.client.delete(self.key(event_uid))
+        except RedisError as error:
+            logger.warning(
+                "Could not drop the waitlist index of %s: %s", event_uid, error
+            )
+
+
+waitlist_index = WaitlistIndex(redis_manager, ttl=Config.WAITLIST_INDEX_TTL)